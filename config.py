@@ -11,5 +11,95 @@ EMAIL_SERVER = os.getenv('EMAIL_SERVER')
 EMAIL_SERVER_PORT = int(os.getenv('EMAIL_SERVER_PORT', '993'))
 EMAIL_USE_SSL = os.getenv('EMAIL_USE_SSL', 'True').lower() == 'true'
 
+# 邮件拉取配置
+# 批量获取邮件头时每条 FETCH 命令包含的邮件数，设为0则逐封获取
+EMAIL_HEADER_BATCH_SIZE = int(os.getenv('EMAIL_HEADER_BATCH_SIZE', '200'))
+# 匹配规则的邮件积累到多少封时先下载处理，再继续获取后面的邮件头，待处理邮件很多时内存不随之增长
+EMAIL_SCAN_WINDOW = int(os.getenv('EMAIL_SCAN_WINDOW', '500'))
+# 根据规则的发件人生成服务器端 SEARCH 条件，只获取可能匹配规则的邮件
+EMAIL_SERVER_SIDE_FILTER = os.getenv('EMAIL_SERVER_SIDE_FILTER', 'True').lower() == 'true'
+# 基于UID的增量同步，持久化 UIDVALIDITY/UIDNEXT/HIGHESTMODSEQ 和邮件头缓存
+EMAIL_INCREMENTAL_SYNC = os.getenv('EMAIL_INCREMENTAL_SYNC', 'True').lower() == 'true'
+EMAIL_SYNC_STATE_PATH = os.getenv('EMAIL_SYNC_STATE_PATH', os.path.join('cache', 'mailbox_sync.json'))
+# 增量同步的邮件头缓存（SQLite），按UID分批读写
+EMAIL_HEADER_CACHE_PATH = os.getenv('EMAIL_HEADER_CACHE_PATH', os.path.join('cache', 'mailbox_headers.db'))
+# 根据 BODYSTRUCTURE 只下载匹配规则的附件段落，而不是完整邮件
+EMAIL_PARTIAL_FETCH = os.getenv('EMAIL_PARTIAL_FETCH', 'True').lower() == 'true'
+# 服务器声明 COMPRESS=DEFLATE 时压缩会话数据，减少邮件头和附件传输的流量
+EMAIL_COMPRESS = os.getenv('EMAIL_COMPRESS', 'True').lower() == 'true'
+# 重连时复用 TLS 会话（会话 ID 或会话票据），跳过完整握手
+EMAIL_TLS_RESUME = os.getenv('EMAIL_TLS_RESUME', 'True').lower() == 'true'
+# 使用异步 IMAP 连接流水线下载附件段落，多条获取命令同时在途，不逐条等待往返
+EMAIL_ASYNC_PIPELINE = os.getenv('EMAIL_ASYNC_PIPELINE', 'False').lower() == 'true'
+# 流水线下载时同时在途的段落获取命令数
+EMAIL_PIPELINE_DEPTH = int(os.getenv('EMAIL_PIPELINE_DEPTH', '8'))
+# 处理完成后设置的标志，默认 \Seen；设为自定义关键字（如 $Processed）时按 UNKEYWORD 搜索未处理邮件
+EMAIL_PROCESSED_FLAG = os.getenv('EMAIL_PROCESSED_FLAG', '\\Seen')
+# 已处理邮件台账（SQLite），按 Message-ID 记录下载完成的邮件，重启后不会重复下载
+EMAIL_PROCESSED_LEDGER_PATH = os.getenv('EMAIL_PROCESSED_LEDGER_PATH', os.path.join('cache', 'processed.db'))
+# 移入规则归档文件夹（archive_folder）时每条 UID MOVE 命令包含的邮件数
+EMAIL_ARCHIVE_BATCH_SIZE = int(os.getenv('EMAIL_ARCHIVE_BATCH_SIZE', '500'))
+
+# 多邮箱/多文件夹配置
+# 默认账号检查的文件夹，多个用逗号分隔（非 ASCII 名称会自动编码）
+EMAIL_FOLDERS = [f.strip() for f in os.getenv('EMAIL_FOLDERS', 'INBOX').split(',') if f.strip()]
+# 其他邮箱账号的配置文件，不存在时只检查默认账号
+EMAIL_SOURCES_PATH = os.getenv('EMAIL_SOURCES_PATH', os.path.join('config', 'email_sources.yaml'))
+# 并发轮询各来源的线程数
+EMAIL_POLL_WORKERS = int(os.getenv('EMAIL_POLL_WORKERS', '4'))
+
+# 附件保存配置
+# 编码后超过该字节数的附件分段获取、边解码边写入磁盘
+ATTACHMENT_STREAM_THRESHOLD = int(os.getenv('ATTACHMENT_STREAM_THRESHOLD', str(1024 * 1024)))
+# 分段获取和分块解码的字节数
+ATTACHMENT_STREAM_CHUNK_SIZE = int(os.getenv('ATTACHMENT_STREAM_CHUNK_SIZE', str(1024 * 1024)))
+# 每批附件下载结束时在日志中报告该批下载期间的峰值RSS
+ATTACHMENT_MEMORY_REPORT = os.getenv('ATTACHMENT_MEMORY_REPORT', 'True').lower() == 'true'
+# 按内容哈希去重保存附件，相同内容只保存一份并硬链接到下载目录
+ATTACHMENT_DEDUP = os.getenv('ATTACHMENT_DEDUP', 'True').lower() == 'true'
+# 附件对象和哈希索引的存储目录，需与下载目录位于同一磁盘才能使用硬链接
+ATTACHMENT_STORE_PATH = os.getenv('ATTACHMENT_STORE_PATH', os.path.join('downloads', '.store'))
+# 分段获取的大附件写入断点文件并记录检查点，连接断开后从已提交的偏移继续下载
+ATTACHMENT_RESUME = os.getenv('ATTACHMENT_RESUME', 'True').lower() == 'true'
+# 断点文件和检查点的保存目录
+ATTACHMENT_PARTIAL_PATH = os.getenv('ATTACHMENT_PARTIAL_PATH', os.path.join('cache', 'partial'))
+# 并行下载附件的最大 IMAP 连接数，不同下载目录的邮件分给不同连接，设为1则逐封下载
+ATTACHMENT_DOWNLOAD_WORKERS = int(os.getenv('ATTACHMENT_DOWNLOAD_WORKERS', '3'))
+
+# 邮件过滤配置
+# 只检查最近几天内的邮件（SEARCH SINCE），设为0则不限制
+DAYS_LOOK_BACK = int(os.getenv('DAYS_LOOK_BACK', '0'))
+
+# 邮件监控配置
+# 启用IMAP IDLE推送模式，服务器不支持时自动回退到定时轮询
+EMAIL_IDLE_ENABLED = os.getenv('EMAIL_IDLE_ENABLED', 'True').lower() == 'true'
+# 单次IDLE的最长秒数，需小于服务器的30分钟超时
+EMAIL_IDLE_TIMEOUT = int(os.getenv('EMAIL_IDLE_TIMEOUT', '1500'))
+# IDLE会话断开后的重连等待秒数
+EMAIL_IDLE_RECONNECT_DELAY = int(os.getenv('EMAIL_IDLE_RECONNECT_DELAY', '30'))
+# 定时轮询的间隔分钟数
+EMAIL_POLL_INTERVAL = int(os.getenv('EMAIL_POLL_INTERVAL', '10'))
+# 根据各规则邮件的到达时段调整轮询间隔，每周检查次数与固定间隔相同
+EMAIL_POLL_ADAPTIVE = os.getenv('EMAIL_POLL_ADAPTIVE', 'True').lower() == 'true'
+# 自适应轮询的最小和最大间隔秒数
+EMAIL_POLL_MIN_INTERVAL = int(os.getenv('EMAIL_POLL_MIN_INTERVAL', '60'))
+EMAIL_POLL_MAX_INTERVAL = int(os.getenv('EMAIL_POLL_MAX_INTERVAL', '3600'))
+# 到达时段统计的分钟数和历史的半衰期天数
+EMAIL_POLL_SLOT_MINUTES = int(os.getenv('EMAIL_POLL_SLOT_MINUTES', '30'))
+EMAIL_POLL_HALF_LIFE_DAYS = float(os.getenv('EMAIL_POLL_HALF_LIFE_DAYS', '28'))
+# 邮件到达历史文件
+EMAIL_ARRIVAL_HISTORY_PATH = os.getenv('EMAIL_ARRIVAL_HISTORY_PATH', os.path.join('cache', 'arrival_history.json'))
+
+# 邮箱会话配置
+# 在处理周期之间保持同一个已登录的会话
+EMAIL_PERSISTENT_SESSION = os.getenv('EMAIL_PERSISTENT_SESSION', 'True').lower() == 'true'
+# 会话空闲多少秒后发送 NOOP 保活
+EMAIL_KEEPALIVE_INTERVAL = int(os.getenv('EMAIL_KEEPALIVE_INTERVAL', '300'))
+# 会话空闲多少秒后在使用前先检查连接状态
+EMAIL_HEALTH_CHECK_INTERVAL = int(os.getenv('EMAIL_HEALTH_CHECK_INTERVAL', '60'))
+# 重连最大尝试次数和首次重试等待秒数（之后按指数退避）
+EMAIL_RECONNECT_ATTEMPTS = int(os.getenv('EMAIL_RECONNECT_ATTEMPTS', '3'))
+EMAIL_RECONNECT_BACKOFF = int(os.getenv('EMAIL_RECONNECT_BACKOFF', '2'))
+
 # 创建基本目录
 os.makedirs('downloads', exist_ok=True)  # 确保下载目录存在 
\ No newline at end of file
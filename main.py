@@ -4,32 +4,91 @@ from datetime import datetime
 from services.email_processor import EmailProcessor
 from services.email_service import EmailService
 from services.rule_processor import RuleProcessor
+from services.idle_listener import IdleListener
+from services.mailbox_poller import MailboxPoller
+from services.poll_scheduler import PollScheduler
 from utils.log_handler import LogHandler
 from utils.file_handler import FileHandler
+from config import (
+    EMAIL_IDLE_ENABLED, EMAIL_POLL_INTERVAL, EMAIL_KEEPALIVE_INTERVAL,
+    EMAIL_POLL_ADAPTIVE, EMAIL_POLL_MIN_INTERVAL, EMAIL_POLL_MAX_INTERVAL,
+    EMAIL_POLL_SLOT_MINUTES, EMAIL_POLL_HALF_LIFE_DAYS, EMAIL_ARRIVAL_HISTORY_PATH
+)
 
 logger = LogHandler().get_logger('Main', file_level='DEBUG', console_level='INFO')
 
+# 运行期间共享的邮件处理器，其邮件服务在处理周期之间保持同一个会话
+_email_processor = None
+
+def get_email_processor() -> EmailProcessor:
+    """获取运行期间共享的邮件处理器，首次调用时创建
+    
+    只有一个来源时直接使用 EmailService，多个来源时使用 MailboxPoller 并发轮询。
+    """
+    global _email_processor
+    if _email_processor is None:
+        rule_processor = RuleProcessor()
+        sources = MailboxPoller.load_sources()
+        if len(sources) > 1:
+            logger.info("共 %d 个邮箱来源，将并发检查", len(sources))
+            email_service = MailboxPoller(rule_processor, sources)
+        else:
+            email_service = EmailService(rule_processor, **(sources[0] if sources else {}))
+        scheduler = PollScheduler(EMAIL_ARRIVAL_HISTORY_PATH, EMAIL_POLL_INTERVAL * 60,
+                                  EMAIL_POLL_MIN_INTERVAL, EMAIL_POLL_MAX_INTERVAL,
+                                  EMAIL_POLL_SLOT_MINUTES, EMAIL_POLL_HALF_LIFE_DAYS)
+        _email_processor = EmailProcessor(rule_processor, email_service, scheduler=scheduler)
+    return _email_processor
+
+def next_check_delay() -> float:
+    """返回距下次检查的秒数
+    
+    启用自适应轮询时由调度器根据到达历史给出，否则为固定的 EMAIL_POLL_INTERVAL。
+    """
+    if EMAIL_POLL_ADAPTIVE:
+        return get_email_processor().scheduler.report()
+    return EMAIL_POLL_INTERVAL * 60
+
 def check_emails():
     """检查未读邮件并处理"""
     try:
         logger.info("开始检查未读邮件...")
         
-        # 创建服务实例
-        rule_processor = RuleProcessor()
-        email_service = EmailService(rule_processor)
-        
-        # 创建邮件处理器
-        email_processor = EmailProcessor(rule_processor, email_service)
-        
         # 处理未读邮件
-        email_processor.process_unread_emails()
+        get_email_processor().process_unread_emails()
         
     except Exception as e:
         logger.error("执行任务时出错: %s", str(e))
-    finally:
-        # 确保断开连接
-        if 'email_service' in locals():
-            email_service.disconnect()
+
+def keepalive():
+    """在处理周期之间保持邮箱会话"""
+    if _email_processor is not None:
+        _email_processor.email_service.keepalive()
+
+def shutdown():
+    """断开共享的邮箱会话"""
+    if _email_processor is not None:
+        _email_processor.email_service.disconnect()
+
+def run_idle_mode() -> bool:
+    """以IMAP IDLE推送模式运行
+    
+    Returns:
+        bool: 正常结束返回True，服务器不支持IDLE或配置了多个邮箱来源时返回False
+    """
+    email_service = get_email_processor().email_service
+    if isinstance(email_service, MailboxPoller):
+        logger.info("配置了多个邮箱来源，不使用IDLE推送模式")
+        return False
+    
+    listener = IdleListener(EmailService(RuleProcessor(), email_service.config, email_service.folder),
+                            check_emails, on_timeout=keepalive, mailbox=email_service.folder)
+    try:
+        return listener.run()
+    except KeyboardInterrupt:
+        listener.stop()
+        logger.info("程序已停止")
+        return True
 
 def main():
     """主函数"""
@@ -41,18 +100,28 @@ def main():
             
         logger.info("邮件自动下载程序已启动...")
         
-        # 设置定时任务
-        schedule.every(10).minutes.do(check_emails)
+        # 优先使用IDLE推送模式，连接时会立即执行一次检查
+        if EMAIL_IDLE_ENABLED:
+            if run_idle_mode():
+                return
+            logger.warning("未使用IDLE推送模式，回退到定时轮询")
+        
+        # 设置保活任务，检查时间由 next_check_delay 决定
+        schedule.every(EMAIL_KEEPALIVE_INTERVAL).seconds.do(keepalive)
         logger.info("正在监控未读邮件...")
         
         # 立即执行一次
-        check_emails()
+        next_check = time.monotonic()
         
         # 持续运行定时任务
         while True:
             try:
+                if time.monotonic() >= next_check:
+                    check_emails()
+                    next_check = time.monotonic() + next_check_delay()
                 schedule.run_pending()
-                time.sleep(60)  # 每60秒检查一次是否需要执行任务
+                # 最多等待60秒，以便及时执行保活任务
+                time.sleep(max(1, min(60, next_check - time.monotonic())))
             except KeyboardInterrupt:
                 logger.info("程序已停止")
                 break
@@ -61,6 +130,8 @@ def main():
                 time.sleep(60)  # 发生错误时等待60秒后继续
     except Exception as e:
         logger.error("程序启动失败: %s", str(e))
+    finally:
+        shutdown()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,38 +1,162 @@
 from email.message import Message
-from typing import Optional
+from email.parser import BytesHeaderParser
+from typing import Optional, List
+from utils.email_decoder import EmailDecoder
+
+# 仅解析邮件头的解析器，每次 parsebytes 使用独立的内部状态，可在多线程中共用
+_HEADER_PARSER = BytesHeaderParser()
+
+# 尚未从原始邮件头解析的字段
+_UNSET = object()
+
 
 class EmailMessage:
-    """邮件消息类，用于存储邮件信息"""
-    
-    def __init__(self, subject: str, sender: str, to: str, uid: bytes):
+    """邮件消息类，用于存储邮件信息
+
+    使用 __slots__ 减少每封邮件的内存占用。从服务器获取的邮件保存原始邮件头字节，
+    主题、发件人等字段在首次访问时才解析和解码；完整邮件内容在附件保存后
+    通过 release_body 释放，待处理邮件很多时内存不随邮件正文累积。
+    """
+
+    __slots__ = ('uid', 'source', 'attachment_hashes', '_raw_header',
+                 '_subject', '_sender', '_to', '_message_id', '_date', '_full_message')
+
+    def __init__(self, subject: str, sender: str, to: str, uid: bytes,
+                 message_id: str = '', date: str = '', source: str = ''):
         """初始化邮件消息
-        
+
         Args:
             subject: 邮件主题
             sender: 发件人
             to: 收件人
             uid: 邮件唯一标识
+            message_id: 邮件 Message-ID 头
+            date: 邮件 Date 头
+            source: 邮件所在的邮箱和文件夹，如 "fanlm@h-sun.com/INBOX"
         """
-        self.subject = subject
-        self.sender = sender
-        self.to = to
         self.uid = uid
+        self.source = source
+        # 已保存附件内容的 SHA-256，用于处理台账
+        self.attachment_hashes: List[str] = []
+        self._raw_header: Optional[bytes] = None
+        self._subject = subject
+        self._sender = sender
+        self._to = to
+        self._message_id = message_id
+        self._date = date
         self._full_message: Optional[Message] = None
-        
+
+    @classmethod
+    def from_header(cls, uid: bytes, header_bytes: bytes, source: str = '') -> 'EmailMessage':
+        """由原始邮件头创建邮件消息，字段在首次访问时解析
+
+        Args:
+            uid: 邮件唯一标识
+            header_bytes: 邮件头原始内容
+            source: 邮件所在的邮箱和文件夹
+
+        Returns:
+            EmailMessage: 邮件消息
+        """
+        email_msg = cls(_UNSET, _UNSET, _UNSET, uid, _UNSET, _UNSET, source)
+        email_msg._raw_header = header_bytes
+        return email_msg
+
+    def _parse_header(self):
+        """解析原始邮件头，填充尚未设置的字段"""
+        try:
+            header = _HEADER_PARSER.parsebytes(self._raw_header or b'')
+        except Exception:
+            header = Message()
+        if self._subject is _UNSET:
+            self._subject = EmailDecoder.decode_str(header['subject'], header['from'])
+        if self._sender is _UNSET:
+            self._sender = header['from']
+        if self._to is _UNSET:
+            self._to = header['to']
+        if self._message_id is _UNSET:
+            self._message_id = str(header['message-id'] or '').strip()
+        if self._date is _UNSET:
+            self._date = str(header['date'] or '')
+
+    @property
+    def raw_header(self) -> Optional[bytes]:
+        """原始邮件头，由字段直接创建时为None"""
+        return self._raw_header
+
+    @property
+    def subject(self) -> str:
+        """邮件主题（已解码）"""
+        if self._subject is _UNSET:
+            self._parse_header()
+        return self._subject
+
+    @subject.setter
+    def subject(self, value: str):
+        self._subject = value
+
+    @property
+    def sender(self) -> str:
+        """发件人"""
+        if self._sender is _UNSET:
+            self._parse_header()
+        return self._sender
+
+    @sender.setter
+    def sender(self, value: str):
+        self._sender = value
+
+    @property
+    def to(self) -> str:
+        """收件人"""
+        if self._to is _UNSET:
+            self._parse_header()
+        return self._to
+
+    @to.setter
+    def to(self, value: str):
+        self._to = value
+
+    @property
+    def message_id(self) -> str:
+        """邮件 Message-ID 头"""
+        if self._message_id is _UNSET:
+            self._parse_header()
+        return self._message_id
+
+    @message_id.setter
+    def message_id(self, value: str):
+        self._message_id = value
+
+    @property
+    def date(self) -> str:
+        """邮件 Date 头"""
+        if self._date is _UNSET:
+            self._parse_header()
+        return self._date
+
+    @date.setter
+    def date(self, value: str):
+        self._date = value
+
     @property
     def has_full_content(self) -> bool:
         """是否已加载完整邮件内容"""
         return self._full_message is not None
-        
+
     @property
     def message(self) -> Optional[Message]:
         """获取完整邮件内容"""
         return self._full_message
-        
+
     def set_full_message(self, message: Message):
         """设置完整邮件内容
-        
+
         Args:
             message: 完整邮件内容
         """
-        self._full_message = message 
\ No newline at end of file
+        self._full_message = message
+
+    def release_body(self):
+        """附件保存后释放完整邮件内容，只保留邮件头"""
+        self._full_message = None
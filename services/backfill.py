@@ -0,0 +1,289 @@
+import os
+import time
+import email
+import mailbox
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Set, Deque
+from models.email_message import EmailMessage
+from services.email_service import EmailService
+from services.rule_processor import RuleProcessor
+from utils.log_handler import LogHandler
+from utils.processed_ledger import ProcessedLedger
+
+# 子进程中用于提取附件的邮件服务，由 _init_worker 创建，不连接服务器
+_worker_service: Optional[EmailService] = None
+
+
+def _init_worker():
+    """子进程初始化：加载规则并创建邮件服务"""
+    global _worker_service
+    _worker_service = EmailService(RuleProcessor())
+
+
+def _extract_attachments(raw: bytes, rule_name: str, service: Optional[EmailService] = None) -> List[Tuple[str, bytes]]:
+    """解析完整邮件并解码匹配规则的附件
+
+    Args:
+        raw: 邮件原始内容
+        rule_name: 主进程匹配的规则名称
+        service: 邮件服务，未提供时使用子进程的邮件服务
+
+    Returns:
+        List[Tuple[str, bytes]]: 按邮件结构顺序排列的文件名和解码后的附件内容
+    """
+    service = service or _worker_service
+    rule = next(r for r in service.rule_processor.rules if r['name'] == rule_name)
+    email_msg = EmailMessage.from_header(b'', Backfill.split_header(raw))
+    email_msg.set_full_message(email.message_from_bytes(raw))
+    return [(filename, part.get_payload(decode=True))
+            for filename, part in service.iter_wanted_parts(email_msg, rule)]
+
+
+class Backfill:
+    """从本地 mbox、Maildir 或 .eml 目录补处理历史邮件，不访问 IMAP 服务器
+
+    主要功能：
+    1. 按邮件顺序读取邮件，只解析邮件头，查询处理台账并匹配规则
+    2. 匹配规则且未处理过的邮件交给进程池解析 MIME 结构并解码附件
+    3. 按邮件顺序保存附件到规则的下载目录（与在线处理相同的保存和去重逻辑）并写入台账，
+       同名附件的覆盖结果与逐封处理一致；附件存储索引和台账只由主进程写入
+    4. 台账中已有的邮件直接跳过，重复运行或与在线处理交替运行都不会重复下载
+    5. 定期记录进度（已扫描、匹配、保存、跳过的邮件数和速度）
+
+    补处理只保存附件，不执行送货单录入ERP等后续处理。
+    """
+
+    # 每个子进程最多排队的邮件数，限制等待保存的附件占用的内存
+    QUEUE_PER_WORKER = 4
+
+    def __init__(self, rule_processor: RuleProcessor, email_service: EmailService,
+                 ledger: ProcessedLedger, workers: int = 0, progress_interval: float = 5.0):
+        """初始化补处理
+
+        Args:
+            rule_processor: 规则处理器
+            email_service: 邮件服务，用于保存附件，不会连接服务器
+            ledger: 已处理邮件台账
+            workers: 子进程数，0 表示 CPU 核数，1 表示在主进程中处理
+            progress_interval: 记录进度的间隔秒数
+        """
+        self.logger = LogHandler().get_logger('Backfill', file_level='DEBUG', console_level='INFO')
+        self.rule_processor = rule_processor
+        self.email_service = email_service
+        self.ledger = ledger
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.progress_interval = progress_interval
+        self.stats: Dict[str, Any] = {}
+        self._last_progress = 0.0
+
+    @staticmethod
+    def split_header(raw: bytes) -> bytes:
+        """返回邮件原始内容中的邮件头部分（不含空行）"""
+        ends = [i for i in (raw.find(b'\r\n\r\n'), raw.find(b'\n\n')) if i >= 0]
+        return raw[:min(ends)] if ends else raw
+
+    @staticmethod
+    def iter_messages(path: str) -> Iterator[Tuple[str, bytes]]:
+        """按顺序读取本地邮件
+
+        Args:
+            path: mbox 文件、Maildir 目录、.eml 文件或包含 .eml 文件的目录
+
+        Returns:
+            Iterator[Tuple[str, bytes]]: 邮件位置（如 "inbox.mbox#3"）和原始内容
+
+        Raises:
+            FileNotFoundError: 路径不存在时抛出
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+
+        if os.path.isdir(path):
+            if all(os.path.isdir(os.path.join(path, sub)) for sub in ('cur', 'new', 'tmp')):
+                box = mailbox.Maildir(path, factory=None, create=False)
+                # Maildir 文件名以投递时间开头，按名称排序即为投递顺序
+                for key in sorted(box.keys()):
+                    yield '%s#%s' % (path, key), box.get_bytes(key)
+                return
+            files = []
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.lower().endswith('.eml'))
+            for filepath in sorted(files):
+                with open(filepath, 'rb') as f:
+                    yield filepath, f.read()
+            return
+
+        if path.lower().endswith('.eml'):
+            with open(path, 'rb') as f:
+                yield path, f.read()
+            return
+
+        for key, raw in Backfill._iter_mbox(path):
+            yield '%s#%s' % (path, key), raw
+
+    @staticmethod
+    def _iter_mbox(path: str) -> Iterator[Tuple[int, bytes]]:
+        """逐封读取 mbox 文件
+
+        按行首的 "From " 分隔邮件，只读一遍文件，每次只在内存中保留一封邮件；
+        mailbox.mbox 需要先逐行扫描整个文件建立目录再逐封读取。
+
+        Returns:
+            Iterator[Tuple[int, bytes]]: 邮件序号（从0开始）和不含 "From " 分隔行的原始内容
+        """
+        key = -1
+        lines: List[bytes] = []
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.startswith(b'From '):
+                    if key >= 0:
+                        yield key, Backfill._strip_separator(lines)
+                    key += 1
+                    lines = []
+                elif key >= 0:
+                    lines.append(line)
+        if key >= 0:
+            yield key, Backfill._strip_separator(lines)
+
+    @staticmethod
+    def _strip_separator(lines: List[bytes]) -> bytes:
+        """去掉邮件末尾与下一个 "From " 行之间的空行"""
+        if lines and lines[-1] in (b'\n', b'\r\n'):
+            lines.pop()
+        return b''.join(lines)
+
+    def run(self, paths: List[str]) -> Dict[str, Any]:
+        """补处理一个或多个本地邮件来源
+
+        Args:
+            paths: mbox 文件、Maildir 目录或 .eml 文件/目录
+
+        Returns:
+            Dict[str, Any]: 包含 scanned、matched、skipped（台账中已有）、saved（保存了附件的邮件）、
+                no_attachment、failed、files 和 elapsed
+        """
+        self.stats = {'scanned': 0, 'matched': 0, 'skipped': 0, 'saved': 0,
+                      'no_attachment': 0, 'failed': 0, 'files': 0}
+        start = time.monotonic()
+        self._last_progress = start
+        pending: Deque[Tuple[EmailMessage, Dict[str, Any], Any]] = deque()
+        seen: Set[str] = set()
+        executor = ProcessPoolExecutor(self.workers, initializer=_init_worker) if self.workers > 1 else None
+        limit = self.workers * self.QUEUE_PER_WORKER
+
+        # 附件存储索引在记录进度时和结束时写入，不在每个附件后重写整个索引文件
+        store = self.email_service.attachment_store
+        if store is not None:
+            store.autosave = False
+
+        self.logger.info("开始补处理 %s，子进程数 %d", ', '.join(paths), self.workers if executor else 0)
+        try:
+            for path in paths:
+                for locator, raw in self.iter_messages(path):
+                    self.stats['scanned'] += 1
+                    job = self._prepare(locator, raw, seen)
+                    if job is not None:
+                        email_msg, rule = job
+                        if executor is not None:
+                            result = executor.submit(_extract_attachments, raw, rule['name'])
+                        else:
+                            result = self._extract_inline(raw, rule['name'])
+                        pending.append((email_msg, rule, result))
+                    while len(pending) > limit or (pending and executor is None):
+                        self._complete(*pending.popleft())
+                    self._report_progress(start)
+            while pending:
+                self._complete(*pending.popleft())
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            if store is not None:
+                store.flush()
+                store.autosave = True
+
+        self.stats['elapsed'] = round(time.monotonic() - start, 3)
+        self._report_progress(start, final=True)
+        return dict(self.stats)
+
+    def _prepare(self, locator: str, raw: bytes, seen: Set[str]) -> Optional[Tuple[EmailMessage, Dict[str, Any]]]:
+        """解析邮件头，判断邮件是否需要处理
+
+        Args:
+            locator: 邮件位置
+            raw: 邮件原始内容
+            seen: 本次运行已遇到的台账键，同一封邮件出现在多个来源时只处理一次
+
+        Returns:
+            Optional[Tuple[EmailMessage, Dict[str, Any]]]: 需要处理时返回邮件对象和匹配的规则
+        """
+        email_msg = EmailMessage.from_header(locator.encode('utf-8', errors='replace'),
+                                             self.split_header(raw), 'backfill:' + locator)
+        try:
+            key = ProcessedLedger.message_key(email_msg)
+            if key in seen or self.ledger.contains(key):
+                self.stats['skipped'] += 1
+                return None
+            seen.add(key)
+            rule = self.rule_processor.get_matching_rule(email_msg)
+        except Exception as e:
+            self.logger.error("解析邮件失败 [%s]: %s", locator, LogHandler.format_error(e))
+            self.stats['failed'] += 1
+            return None
+        if not rule:
+            return None
+        self.stats['matched'] += 1
+        return email_msg, rule
+
+    def _extract_inline(self, raw: bytes, rule_name: str) -> Any:
+        """在主进程中提取附件，返回值或异常与进程池的结果一样在保存时取出"""
+        future = Future()
+        try:
+            future.set_result(_extract_attachments(raw, rule_name, self.email_service))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _complete(self, email_msg: EmailMessage, rule: Dict[str, Any], result: Future):
+        """等待附件提取结果，保存附件并写入台账
+
+        Args:
+            email_msg: 邮件对象
+            rule: 匹配的规则
+            result: 附件提取结果
+        """
+        try:
+            attachments = result.result()
+        except Exception as e:
+            self.logger.error("提取附件失败 [%s]: %s", email_msg.source, LogHandler.format_error(e))
+            self.stats['failed'] += 1
+            return
+
+        files = []
+        for filename, payload in attachments:
+            save_path = self.email_service._save_attachment(rule, filename, payload, email_msg)
+            if save_path:
+                files.append(save_path)
+        if not files:
+            self.logger.debug("邮件 [%s] 没有匹配的附件", email_msg.subject)
+            self.stats['no_attachment'] += 1
+            return
+        self.ledger.record(email_msg, rule['name'], files, email_msg.attachment_hashes)
+        self.stats['saved'] += 1
+        self.stats['files'] += len(files)
+
+    def _report_progress(self, start: float, final: bool = False):
+        """按 progress_interval 记录进度"""
+        now = time.monotonic()
+        if not final and now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = now
+        if self.email_service.attachment_store is not None:
+            self.email_service.attachment_store.flush()
+        elapsed = max(now - start, 1e-9)
+        self.logger.info("%s：已扫描 %d 封（%.0f 封/秒），匹配 %d 封，保存 %d 封（%d 个附件），"
+                         "跳过已处理 %d 封，无匹配附件 %d 封，失败 %d 封",
+                         "补处理完成" if final else "补处理进度", self.stats['scanned'],
+                         self.stats['scanned'] / elapsed, self.stats['matched'], self.stats['saved'],
+                         self.stats['files'], self.stats['skipped'], self.stats['no_attachment'],
+                         self.stats['failed'])
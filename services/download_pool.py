@@ -0,0 +1,143 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Optional
+from models.email_message import EmailMessage
+from utils.log_handler import LogHandler
+
+class DownloadPool:
+    """附件并行下载，使用有限数量的已登录 IMAP 连接
+
+    主要功能：
+    1. 按规则的下载目录将待下载邮件分片，分给各连接并行下载
+    2. 同一下载目录的邮件由同一个连接按原顺序下载，同名附件的覆盖结果与逐封处理一致
+    3. 第一个连接复用邮件服务自身的会话，其余连接在需要时创建并在周期之间保持
+    4. 按输入顺序返回各邮件的下载结果，规则判断和后续处理顺序不受并行影响
+    """
+
+    def __init__(self, email_service, size: int):
+        """初始化下载连接池
+
+        Args:
+            email_service: 邮件服务实例，提供账号配置和第一个连接
+            size: 最大连接数，小于等于1时逐封下载
+        """
+        self.logger = LogHandler().get_logger('DownloadPool', file_level='DEBUG', console_level='INFO')
+        self.email_service = email_service
+        self.size = max(1, size)
+        self._workers = [email_service]
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.last_batch: Dict[str, Any] = {}
+
+    @staticmethod
+    def shard(jobs: List[Tuple[EmailMessage, Dict[str, Any]]], count: int) -> List[List[int]]:
+        """将待下载邮件按下载目录分片
+
+        同一目录的邮件放在同一分片并保持原顺序；目录按邮件数从多到少
+        依次分给当前邮件数最少的分片，结果只取决于输入，不受运行时序影响。
+
+        Args:
+            jobs: (邮件, 规则) 列表
+            count: 分片数
+
+        Returns:
+            List[List[int]]: 各分片中的 jobs 下标，去掉空分片
+        """
+        groups: Dict[str, List[int]] = {}
+        for index, (_, rule) in enumerate(jobs):
+            groups.setdefault(rule['download_path'], []).append(index)
+
+        shards: List[List[int]] = [[] for _ in range(max(1, count))]
+        for indices in sorted(groups.values(), key=len, reverse=True):
+            target = min(range(len(shards)), key=lambda i: len(shards[i]))
+            shards[target].extend(indices)
+        return [sorted(s) for s in shards if s]
+
+    def download(self, jobs: List[Tuple[EmailMessage, Dict[str, Any]]]) -> List[List[str]]:
+        """下载一批邮件中匹配规则的附件
+
+        Args:
+            jobs: (邮件, 规则) 列表，顺序即规则判断的顺序
+
+        Returns:
+            List[List[str]]: 与 jobs 一一对应的附件路径列表，下载失败的邮件为空列表
+        """
+        start = time.monotonic()
+        shards = self.shard(jobs, self.size)
+        if len(shards) <= 1:
+            results = [files for _, files in self._run_shard(self.email_service, jobs, range(len(jobs)))]
+        else:
+            self._ensure_workers(len(shards))
+            futures = [self._executor.submit(self._run_shard, worker, jobs, indices)
+                       for worker, indices in zip(self._workers, shards)]
+            results: List[List[str]] = [[] for _ in jobs]
+            for future in futures:
+                for index, files in future.result():
+                    results[index] = files
+
+        self.last_batch = {
+            'jobs': len(jobs),
+            'connections': len(shards),
+            'elapsed': round(time.monotonic() - start, 3)
+        }
+        if len(shards) > 1:
+            self.logger.info("使用 %d 个连接并行下载 %d 封邮件的附件，耗时 %.2f 秒",
+                             len(shards), len(jobs), self.last_batch['elapsed'])
+        return results
+
+    def _ensure_workers(self, count: int):
+        """创建不足的连接和线程池"""
+        while len(self._workers) < count:
+            self._workers.append(self.email_service.clone())
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='DownloadPool')
+
+    def _run_shard(self, worker, jobs: List[Tuple[EmailMessage, Dict[str, Any]]],
+                   indices) -> List[Tuple[int, List[str]]]:
+        """在一个连接上按顺序下载分片中的邮件
+
+        Args:
+            worker: 该分片使用的邮件服务
+            jobs: 全部 (邮件, 规则)
+            indices: 分片中的 jobs 下标
+
+        Returns:
+            List[Tuple[int, List[str]]]: (下标, 附件路径列表)
+        """
+        results = []
+        for index in indices:
+            email_msg, rule = jobs[index]
+            try:
+                worker.ensure_selected()
+                files = worker.download_attachments(email_msg, rule)
+            except Exception as e:
+                self.logger.error("下载附件失败 [%s]: %s", email_msg.subject, LogHandler.format_error(e))
+                files = []
+            results.append((index, files))
+        return results
+
+    def compress_stats(self) -> Dict[str, int]:
+        """返回邮件服务和各下载连接累计的压缩前后字节数"""
+        totals: Dict[str, int] = {}
+        for worker in self._workers:
+            for key, value in worker.compress_stats.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def release(self):
+        """结束一个处理周期，释放额外连接"""
+        for worker in self._workers[1:]:
+            worker.release()
+
+    def keepalive(self):
+        """保持额外连接"""
+        for worker in self._workers[1:]:
+            worker.keepalive()
+
+    def close(self):
+        """断开额外连接并停止线程池"""
+        for worker in self._workers[1:]:
+            worker.disconnect()
+        del self._workers[1:]
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
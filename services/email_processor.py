@@ -1,30 +1,38 @@
-from typing import List, Set, Dict, Any
+import itertools
+from typing import List, Set, Dict, Any, Optional
 from services.email_service import EmailService
 from services.rule_processor import RuleProcessor
 from utils.log_handler import LogHandler
+from utils.processed_ledger import ProcessedLedger
+from services.poll_scheduler import PollScheduler
+from services.priority_stage import PriorityStage
 from models.email_message import EmailMessage
 from utils.excel_processor import ExcelProcessor
 from workflows.erp_receipt import process_delivery_orders
+from config import EMAIL_PROCESSED_LEDGER_PATH, EMAIL_SCAN_WINDOW
 
 class EmailProcessor:
     """
     邮件处理器，负责处理邮件及其附件
     
     主要功能：
-    1. 处理单个邮件和批量邮件
+    1. 逐封判断未读邮件，分批下载匹配规则的邮件
     2. 下载和保存邮件附件
     3. 根据规则匹配邮件
     4. 处理Excel附件
     5. 错误处理和日志记录
     """
     
-    def __init__(self, rule_processor: RuleProcessor, email_service: EmailService):
+    def __init__(self, rule_processor: RuleProcessor, email_service: EmailService,
+                 ledger: Optional[ProcessedLedger] = None, scheduler: Optional[PollScheduler] = None):
         """
         初始化邮件处理器
         
         Args:
             rule_processor: 规则处理器实例
             email_service: 邮件服务实例
+            ledger: 已处理邮件台账，未提供时打开 EMAIL_PROCESSED_LEDGER_PATH
+            scheduler: 轮询调度器，提供时记录处理完成邮件的到达时间
             
         Raises:
             Exception: 初始化失败时抛出
@@ -33,143 +41,241 @@ class EmailProcessor:
         self.rule_processor = rule_processor
         self.email_service = email_service
         self.excel_processor = ExcelProcessor()
-        self._processed_subjects: Set[str] = set()
+        self.ledger = ledger or ProcessedLedger(EMAIL_PROCESSED_LEDGER_PATH)
+        self.scheduler = scheduler
+        # 本次运行中不匹配任何规则的邮件，不持久化，重启后会重新匹配；
+        # 下载失败或中断的邮件不记录，下个周期重试
+        self._attempted: Set[str] = set()
+        # 最近一个周期各规则类别的队列统计
+        self.last_queue: Dict[str, Dict[str, Any]] = {}
+        # 队列中积累多少封匹配规则的邮件后先下载处理，再继续获取后面的邮件头
+        self.scan_window = max(1, EMAIL_SCAN_WINDOW)
         
-    def _is_processed(self, subject: str) -> bool:
+    def _is_processed(self, key: str) -> bool:
         """
         检查邮件是否已处理
         
         Args:
-            subject: 邮件主题
+            key: 邮件在台账中的键
             
         Returns:
             bool: 如果邮件已处理返回True，否则返回False
         """
-        return subject in self._processed_subjects
+        return self.ledger.contains(key)
         
-    def _mark_as_processed(self, subject: str):
+    def _mark_as_processed(self, email_msg: EmailMessage, rule: Dict[str, Any], files: List[str]):
         """
-        将邮件标记为已处理
+        将下载完成的邮件写入台账，并记录到达时间供轮询调度使用
         
         Args:
-            subject: 邮件主题
+            email_msg: 邮件对象
+            rule: 匹配的规则
+            files: 保存的附件路径
+        """
+        self.ledger.record(email_msg, rule['name'], files, email_msg.attachment_hashes)
+        if self.scheduler is not None:
+            self.scheduler.record_arrival(rule['name'], email_msg)
+        
+    def _find_same_payload(self, email_msg: EmailMessage) -> Optional[Dict[str, Any]]:
+        """
+        查询附件内容与本邮件完全相同的已处理邮件（同一份附件换了 Message-ID 重新发送）
+        
+        Args:
+            email_msg: 已下载附件的邮件对象
+            
+        Returns:
+            Optional[Dict[str, Any]]: 最早处理的相同内容邮件的台账记录，不存在时返回None
         """
-        self._processed_subjects.add(subject)
+        if not email_msg.attachment_hashes:
+            return None
+        previous = self.ledger.find_payload(ProcessedLedger.payload_hash(email_msg.attachment_hashes))
+        if previous:
+            self.logger.info("邮件 [%s] 的附件内容与已处理邮件 [%s] 相同，不再重复处理",
+                             email_msg.subject, previous['subject'])
+        return previous
         
-    def _process_single_email(self, email_msg: EmailMessage) -> bool:
+    def _prepare_email(self, email_msg: EmailMessage) -> Optional[Dict[str, Any]]:
         """
-        处理单个邮件
+        判断邮件是否需要下载附件
         
         处理流程：
-        1. 检查邮件是否已处理
+        1. 检查邮件是否已处理（按 Message-ID 查询台账）
         2. 匹配处理规则
-        3. 下载匹配的附件
-        4. 处理Excel文件
         
         Args:
             email_msg: 邮件对象
             
         Returns:
-            bool: 处理成功返回True，否则返回False
+            Optional[Dict[str, Any]]: 需要下载时返回匹配的规则，否则返回None
         """
-        try:
-            # 检查是否已处理过
-            if self._is_processed(email_msg.subject):
-                self.logger.debug("跳过已处理邮件: %s", email_msg.subject)
-                return False
-                
-            # 标记为已处理
-            self._mark_as_processed(email_msg.subject)
+        # 检查是否已处理过；台账中已有但处理标志未提交（如程序中断）时只补设标志
+        key = ProcessedLedger.message_key(email_msg)
+        if self._is_processed(key):
+            self.logger.info("跳过已处理邮件，补设处理标志: %s", email_msg.subject)
+            self.email_service.stage_processed(email_msg)
+            return None
+        if key in self._attempted:
+            self.logger.debug("跳过本次运行已判断为不匹配规则的邮件: %s", email_msg.subject)
+            return None
+        
+        # 获取匹配的规则
+        matching_rule = self.rule_processor.get_matching_rule(email_msg)
+        if not matching_rule:
+            self.logger.debug("邮件不匹配任何规则: %s", email_msg.subject)
+            self._attempted.add(key)
+            return None
             
-            # 获取匹配的规则
-            matching_rule = self.rule_processor.get_matching_rule(email_msg)
-            if not matching_rule:
-                self.logger.debug("邮件不匹配任何规则: %s", email_msg.subject)
-                return False
-                
-            self.logger.info("处理邮件 [%s] - 匹配规则: %s", email_msg.subject, matching_rule['name'])
+        self.logger.info("处理邮件 [%s] - 匹配规则: %s", email_msg.subject, matching_rule['name'])
+        return matching_rule
+        
+    def _complete_email(self, email_msg: EmailMessage, rule: Dict[str, Any],
+                        downloaded_files: List[str]) -> bool:
+        """
+        记录附件下载结果
+        
+        Args:
+            email_msg: 邮件对象
+            rule: 匹配的规则
+            downloaded_files: 下载的附件路径
             
-            # 加载完整邮件内容
-            if not self.email_service.load_full_message(email_msg):
-                self.logger.error("无法加载邮件内容: %s", email_msg.subject)
-                return False
+        Returns:
+            bool: 下载了附件返回True，否则返回False
+        """
+        if not downloaded_files:
+            self.logger.info("邮件 [%s] 没有匹配的附件", email_msg.subject)
+            return False
             
-            # 获取附件
-            downloaded_files = self.email_service.get_attachments(email_msg, matching_rule)
-            if not downloaded_files:
-                self.logger.info("邮件 [%s] 没有匹配的附件", email_msg.subject)
-                return False
+        # 先写入台账再登记处理标志，周期结束时统一设置标志
+        self._mark_as_processed(email_msg, rule, downloaded_files)
+        self.email_service.stage_processed(email_msg)
+        self.logger.info("完成处理邮件 [%s] - 下载附件数: %d", email_msg.subject, len(downloaded_files))
+        return True
+        
+    def _stage_archive(self, email_msg: EmailMessage, rule: Dict[str, Any]):
+        """
+        规则配置了 archive_folder 时，登记在周期结束时将邮件移入归档文件夹
+        
+        Args:
+            email_msg: 邮件对象
+            rule: 匹配的规则
+        """
+        folder = rule.get('archive_folder')
+        if folder:
+            self.email_service.stage_archive(email_msg, folder)
+        
+    def _process_delivery_excel(self, rule: Dict[str, Any]) -> bool:
+        """
+        处理送货单规则下载目录中的Excel文件并录入ERP
+        
+        Args:
+            rule: 送货单规则
+            
+        Returns:
+            bool: 录入成功或没有待录入的数据（已由之前的邮件录入）返回True，失败返回False
+        """
+        excel_processor = ExcelProcessor()
+        try:
+            data_dict = excel_processor.process_excel(rule["download_path"], rule["name"])
+            if data_dict:
+                self.logger.debug("[%s] Excel数据: %s", rule["name"], data_dict)
+                self.logger.info("成功处理 [%s] 的Excel文件", rule["name"])
                 
-            # 标记为已读
-            self.email_service.mark_as_read(email_msg)
-            self.logger.info("完成处理邮件 [%s] - 下载附件数: %d", email_msg.subject, len(downloaded_files))
+                if process_delivery_orders(data_dict):
+                    self.logger.info("成功完成 [%s] 的送货单录入", rule["name"])
+                else:
+                    self.logger.error("送货单录入失败: %s", rule["name"])
+                    return False
             return True
-            
+                    
         except Exception as e:
-            self.logger.error("处理邮件出错 [%s]: %s", 
-                            email_msg.subject, LogHandler.format_error(e))
+            self.logger.error("处理Excel文件失败: %s", LogHandler.format_error(e))
             return False
             
+    def _drain_queue(self, queue: PriorityStage):
+        """按优先级分批下载队列中邮件的附件并完成处理
+        
+        Args:
+            queue: 优先级队列，处理后为空
+        """
+        while queue:
+            batch = queue.pop_batch()
+            # 并行下载附件，结果按加入队列的顺序返回
+            results = self.email_service.download_attachments_batch(
+                [(entry.email_msg, entry.rule) for entry in batch])
+
+            for entry, downloaded_files in zip(batch, results):
+                try:
+                    # 写入台账前查询，避免查到本邮件自己的记录
+                    previous = self._find_same_payload(entry.email_msg) if downloaded_files else None
+                    if not self._complete_email(entry.email_msg, entry.rule, downloaded_files):
+                        continue
+
+                    # 如果是送货单规则，处理Excel文件；录入ERP成功后才移入归档文件夹。
+                    # 附件内容已由之前的邮件录入过时不再解析和录入，直接归档
+                    if "送货单" in entry.rule["name"] and previous is None:
+                        if not self._process_delivery_excel(entry.rule):
+                            continue
+                    self._stage_archive(entry.email_msg, entry.rule)
+
+                except Exception as e:
+                    self.logger.error("处理邮件失败: %s", LogHandler.format_error(e))
+                    continue
+                finally:
+                    queue.finish(entry)
+            
     def process_unread_emails(self) -> bool:
         """
         处理所有未读邮件
         
         处理流程：
-        1. 获取所有未读邮件
-        2. 逐个处理邮件
-        3. 记录处理结果
+        1. 逐封获取未读邮件（邮件头分批获取）
+        2. 按邮件顺序逐封判断是否需要下载及匹配的规则，加入优先级队列，不匹配的邮件随即丢弃
+        3. 队列达到 scan_window 封或邮件取完时，按规则类别的优先级分批下载附件，
+           同一批通过邮件服务的连接池并行下载
+        4. 每批按邮件顺序记录结果并处理送货单，送货单先于进度表交给ERP录入；
+           附件内容与已处理邮件相同的重发邮件只记录，不再录入
+        5. 设置处理标志，将后续处理成功且规则配置了归档文件夹的邮件分批移出收件箱
         
         Returns:
             bool: 所有邮件处理成功返回True，否则返回False
         """
         try:
-            # 获取未读邮件列表
+            # 获取未读邮件，搜索失败时在取第一封时抛出
             try:
-                email_list = self.email_service.get_unread_emails()
+                emails = self.email_service.iter_unread_emails()
+                first = next(emails, None)
             except Exception as e:
                 self.logger.error("获取未读邮件失败: %s", LogHandler.format_error(e))
                 return False
 
-            if not email_list:
+            if first is None:
                 self.logger.info("没有未读邮件")
                 return True
 
-            self.logger.info("开始处理 %d 封未读邮件", len(email_list))
-
-            # 处理每封未读邮件
-            for email_msg in email_list:
+            # 逐封判断，规则判断顺序与邮件顺序一致
+            queue = PriorityStage(self.rule_processor)
+            scanned = matched = 0
+            for email_msg in itertools.chain((first,), emails):
+                scanned += 1
                 try:
-                    # 获取匹配的规则
-                    rule = self.rule_processor.get_matching_rule(email_msg)
-                    if not rule:
-                        continue
-
-                    # 下载附件
-                    if not self._process_single_email(email_msg):
-                        continue
-
-                    # 如果是送货单规则，处理Excel文件
-                    if "送货单" in rule["name"]:
-                        excel_processor = ExcelProcessor()
-                        try:
-                            data_dict = excel_processor.process_excel(rule["download_path"], rule["name"])
-                            if data_dict:
-                                print(data_dict)
-                                self.logger.info("成功处理 [%s] 的Excel文件", rule["name"])
-                                
-                                if process_delivery_orders(data_dict):
-                                    self.logger.info("成功完成 [%s] 的送货单录入", rule["name"])
-                                else:
-                                    self.logger.error("送货单录入失败: %s", rule["name"])
-                            
-                        except Exception as e:
-                            self.logger.error("处理Excel文件失败: %s", LogHandler.format_error(e))
-                            continue
-
+                    rule = self._prepare_email(email_msg)
+                    if rule:
+                        queue.push(email_msg, rule)
+                        matched += 1
                 except Exception as e:
                     self.logger.error("处理邮件失败: %s", LogHandler.format_error(e))
                     continue
+                if len(queue) >= self.scan_window:
+                    self._drain_queue(queue)
+            self._drain_queue(queue)
+            self.logger.info("共检查 %d 封未读邮件，%d 封匹配规则", scanned, matched)
+            self.last_queue = queue.report()
 
+            self.email_service.commit_processed_flags()
+            self.email_service.commit_archive_moves()
+            if self.scheduler is not None:
+                self.scheduler.save()
+            self.logger.debug("邮件服务指标: %s", self.email_service.get_metrics())
             return True
 
         except Exception as e:
@@ -177,6 +283,6 @@ class EmailProcessor:
             return False
         finally:
             try:
-                self.email_service.disconnect()
+                self.email_service.release()
             except Exception as e:
                 self.logger.error("断开邮箱连接失败: %s", LogHandler.format_error(e)) 
\ No newline at end of file
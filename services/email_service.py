@@ -1,14 +1,41 @@
+import ssl
 import imaplib
 import email
-from typing import List, Optional, Dict, Any
+import time
+import base64
+import quopri
+import hashlib
+from contextlib import nullcontext
+from datetime import date, timedelta
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple
 from models.email_message import EmailMessage
 from utils.email_decoder import EmailDecoder
 from utils.file_handler import FileHandler
 from utils.log_handler import LogHandler
+from utils.imap_helper import ImapHelper
+from utils.body_structure import BodyStructureParser
+from utils.memory_monitor import MemoryMonitor
+from utils.sync_state_store import SyncStateStore
+from utils.attachment_store import AttachmentStore
+from utils.imap_compress import CompressMixin, IMAP4Compress, IMAP4_SSLCompress
+from utils.tls_sessions import TlsSessionCache
+from utils.partial_download import PartialDownloadStore
 from services.rule_processor import RuleProcessor
+from services.mailbox_sync import MailboxSync
+from services.fetch_strategy import FetchStrategy
+from services.download_pool import DownloadPool
+from services.pipelined_downloader import PipelinedDownloader
 from config import (
     EMAIL_ADDRESS, EMAIL_PASSWORD, EMAIL_SERVER,
-    EMAIL_SERVER_PORT, EMAIL_USE_SSL
+    EMAIL_SERVER_PORT, EMAIL_USE_SSL, EMAIL_HEADER_BATCH_SIZE,
+    EMAIL_SERVER_SIDE_FILTER, DAYS_LOOK_BACK,
+    EMAIL_INCREMENTAL_SYNC, EMAIL_SYNC_STATE_PATH, EMAIL_HEADER_CACHE_PATH,
+    EMAIL_PERSISTENT_SESSION, EMAIL_KEEPALIVE_INTERVAL, EMAIL_HEALTH_CHECK_INTERVAL,
+    EMAIL_RECONNECT_ATTEMPTS, EMAIL_RECONNECT_BACKOFF, EMAIL_PARTIAL_FETCH, EMAIL_PROCESSED_FLAG,
+    ATTACHMENT_STREAM_THRESHOLD, ATTACHMENT_STREAM_CHUNK_SIZE, ATTACHMENT_MEMORY_REPORT,
+    ATTACHMENT_DEDUP, ATTACHMENT_STORE_PATH, ATTACHMENT_DOWNLOAD_WORKERS, EMAIL_COMPRESS,
+    EMAIL_ASYNC_PIPELINE, EMAIL_PIPELINE_DEPTH, EMAIL_TLS_RESUME, EMAIL_ARCHIVE_BATCH_SIZE,
+    ATTACHMENT_RESUME, ATTACHMENT_PARTIAL_PATH
 )
 import re
 import os
@@ -24,7 +51,16 @@ class EmailService:
     5. 邮件内容解码和处理
     """
 
-    def __init__(self, rule_processor: RuleProcessor):
+    # 规则匹配所需的邮件头字段，批量获取时只下载这些字段
+    HEADER_FIELDS = ('SUBJECT', 'FROM', 'TO', 'MESSAGE-ID', 'DATE')
+
+    # 部分获取响应中的段落号，如 "BODY[2] {1234}"
+    _SECTION_RE = re.compile(rb'BODY\[([0-9.]+)\]')
+
+    def __init__(self, rule_processor: RuleProcessor, account: Optional[Dict[str, Any]] = None,
+                 folder: str = 'INBOX', sync_store: Optional[SyncStateStore] = None,
+                 attachment_store: Optional[AttachmentStore] = None,
+                 tls_sessions: Optional[TlsSessionCache] = None):
         """初始化邮件服务
         
         初始化过程：
@@ -35,32 +71,80 @@ class EmailService:
         
         Args:
             rule_processor: 规则处理器实例
+            account: 邮箱账号配置，未提供的字段使用 config 中的默认账号
+            folder: 检查的文件夹
+            sync_store: 同步状态存储，多个服务实例共用同一个状态文件时需传入同一个实例
+            attachment_store: 附件内容存储，多个服务实例共用同一个索引时需传入同一个实例
+            tls_sessions: TLS 会话缓存，未提供时使用进程内共用的实例
             
         Raises:
             Exception: 初始化失败时抛出
         """
-        self.config = self._load_config()
+        self.config = self._load_config(account)
+        self.folder = folder
+        self.source = f"{self.email}/{folder}"
         self.logger = LogHandler().get_logger('EmailService', file_level='DEBUG', console_level='INFO')
         self.decoder = EmailDecoder()
         self.rule_processor = rule_processor
+        self.header_batch_size = EMAIL_HEADER_BATCH_SIZE
+        self.server_side_filter = EMAIL_SERVER_SIDE_FILTER
+        self.days_look_back = DAYS_LOOK_BACK
+        self.last_search: Dict[str, Any] = {}
+        self.incremental_sync = EMAIL_INCREMENTAL_SYNC
+        self.mailbox_sync = MailboxSync(
+            self, sync_store or SyncStateStore(EMAIL_SYNC_STATE_PATH, EMAIL_HEADER_CACHE_PATH))
+        self.partial_fetch = EMAIL_PARTIAL_FETCH
+        self.fetch_strategy = FetchStrategy(self)
+        self.processed_flag = EMAIL_PROCESSED_FLAG
+        self._pending_flags: Dict[bytes, EmailMessage] = {}
+        self.archive_batch_size = EMAIL_ARCHIVE_BATCH_SIZE
+        # 等待移入归档文件夹的邮件，按目标文件夹分组
+        self._pending_moves: Dict[str, Dict[bytes, EmailMessage]] = {}
+        self._archive_folders: set = set()
+        self.stream_threshold = ATTACHMENT_STREAM_THRESHOLD
+        self.stream_chunk_size = ATTACHMENT_STREAM_CHUNK_SIZE
+        self.memory_report = ATTACHMENT_MEMORY_REPORT
+        # 最近一批附件下载期间的峰值RSS，未启用内存报告时为空
+        self.last_memory: Dict[str, Any] = {}
+        self.attachment_store = attachment_store or (
+            AttachmentStore(ATTACHMENT_STORE_PATH) if ATTACHMENT_DEDUP else None)
+        self.partial_downloads = PartialDownloadStore(ATTACHMENT_PARTIAL_PATH) if ATTACHMENT_RESUME else None
+        self.download_pool = DownloadPool(self, ATTACHMENT_DOWNLOAD_WORKERS)
+        self.async_pipeline = EMAIL_ASYNC_PIPELINE
+        self.pipelined_downloader = PipelinedDownloader(self, EMAIL_PIPELINE_DEPTH)
+        self.persistent_session = EMAIL_PERSISTENT_SESSION
+        self.keepalive_interval = EMAIL_KEEPALIVE_INTERVAL
+        self.health_check_interval = EMAIL_HEALTH_CHECK_INTERVAL
+        self.reconnect_attempts = EMAIL_RECONNECT_ATTEMPTS
+        self.reconnect_backoff = EMAIL_RECONNECT_BACKOFF
+        self.reconnect_count = 0
+        self.compress = EMAIL_COMPRESS
+        self.compress_stats = CompressMixin.new_stats()
+        self.tls_sessions = tls_sessions or TlsSessionCache.shared(EMAIL_TLS_RESUME)
         self._imap = None
+        self._selected_folder: Optional[str] = None
+        self._last_activity = 0.0
 
-    def _load_config(self) -> dict:
+    def _load_config(self, account: Optional[Dict[str, Any]] = None) -> dict:
         """加载邮件配置
         
         从配置文件加载邮件服务器设置，包括服务器地址、端口、账号等。
         
+        Args:
+            account: 邮箱账号配置，可包含 email、password、server、port、use_ssl
+            
         Returns:
             dict: 邮件配置字典
             
         Raises:
             FileNotFoundError: 配置文件不存在时抛出
         """
-        self.email = EMAIL_ADDRESS
-        self.password = EMAIL_PASSWORD
-        self.server = EMAIL_SERVER
-        self.port = EMAIL_SERVER_PORT
-        self.use_ssl = EMAIL_USE_SSL
+        account = account or {}
+        self.email = account.get('email', EMAIL_ADDRESS)
+        self.password = account.get('password', EMAIL_PASSWORD)
+        self.server = account.get('server', EMAIL_SERVER)
+        self.port = int(account.get('port', EMAIL_SERVER_PORT))
+        self.use_ssl = account.get('use_ssl', EMAIL_USE_SSL)
         
         return {
             'email': self.email,
@@ -70,13 +154,30 @@ class EmailService:
             'use_ssl': self.use_ssl
         }
 
+    def clone(self) -> 'EmailService':
+        """创建同一账号和文件夹的服务实例
+        
+        新实例使用独立的连接，共享同步状态、附件存储和 TLS 会话缓存，并沿用本实例的下载设置。
+        
+        Returns:
+            EmailService: 新的服务实例，尚未连接
+        """
+        service = EmailService(self.rule_processor, self.config, self.folder,
+                               self.mailbox_sync.store, self.attachment_store, self.tls_sessions)
+        for name in ('partial_fetch', 'stream_threshold', 'stream_chunk_size',
+                     'memory_report', 'persistent_session', 'compress'):
+            setattr(service, name, getattr(self, name))
+        return service
+
     def connect(self) -> bool:
         """连接到邮件服务器
         
         连接过程：
         1. 创建IMAP4连接
         2. 登录邮件账号
-        3. 选择收件箱
+        3. 服务器支持时启用 COMPRESS=DEFLATE 压缩
+        
+        SSL 连接使用共用的 TLS 会话缓存，重连时请求复用上次的会话。
         
         Returns:
             bool: 连接成功返回True，否则返回False
@@ -89,10 +190,16 @@ class EmailService:
 
         try:
             if self.use_ssl:
-                self._imap = imaplib.IMAP4_SSL(self.server, self.port)
+                self._imap = IMAP4_SSLCompress(self.server, self.port, tls_sessions=self.tls_sessions)
             else:
-                self._imap = imaplib.IMAP4(self.server, self.port)
+                self._imap = IMAP4Compress(self.server, self.port)
+            self._imap.compress_stats = self.compress_stats
             self._imap.login(self.email, self.password)
+            if self.use_ssl:
+                self._imap.remember_tls_session()
+            if self.compress:
+                self._enable_compression()
+            self._last_activity = time.monotonic()
             self.logger.debug("已连接到邮箱服务器: %s", self.server)
             return True
         except Exception as e:
@@ -100,68 +207,360 @@ class EmailService:
             self.logger.error("连接邮箱服务器失败: %s", LogHandler.format_error(e))
             raise
 
+    def _enable_compression(self):
+        """服务器声明 COMPRESS=DEFLATE 时启用压缩，失败时继续使用未压缩的连接
+        
+        Raises:
+            imaplib.IMAP4.abort: 连接断开时抛出
+        """
+        try:
+            if CompressMixin.CAPABILITY not in self._imap.capabilities:
+                self._imap.refresh_capabilities()
+            if self._imap.enable_compression():
+                self.logger.debug("已启用 COMPRESS=DEFLATE 压缩")
+        except imaplib.IMAP4.abort:
+            raise
+        except Exception as e:
+            self.logger.warning("启用压缩失败，使用未压缩的连接: %s", LogHandler.format_error(e))
+
     def disconnect(self):
         """断开邮件服务器连接
         
         确保安全断开连接并清理资源。
         """
+        self.download_pool.close()
+        self.pipelined_downloader.close()
         if self._imap:
             try:
-                self._imap.close()
+                if self._imap.state == 'SELECTED':
+                    self._imap.close()
                 self._imap.logout()
                 self.logger.debug("已断开邮箱连接")
             except Exception as e:
                 self.logger.error("断开连接失败: %s", LogHandler.format_error(e))
             finally:
                 self._imap = None
+                self._selected_folder = None
+
+    def release(self):
+        """结束一个处理周期
+        
+        启用持久会话时保留连接供下个周期使用，否则断开连接。
+        """
+        self.download_pool.release()
+        self.pipelined_downloader.release()
+        if not self.persistent_session:
+            self.disconnect()
+
+    def _drop_connection(self):
+        """丢弃已失效的连接，不等待服务器响应"""
+        if self._imap is not None:
+            try:
+                self._imap.shutdown()
+            except Exception:
+                pass
+        self._imap = None
+
+    def is_alive(self) -> bool:
+        """使用 NOOP 检查连接是否可用
+        
+        Returns:
+            bool: 连接可用返回True，否则返回False
+        """
+        if self._imap is None:
+            return False
+        try:
+            typ, _ = self._imap.noop()
+            self._last_activity = time.monotonic()
+            return typ == 'OK'
+        except Exception as e:
+            self.logger.debug("连接检查失败: %s", LogHandler.format_error(e))
+            return False
+
+    def ensure_connected(self) -> bool:
+        """确保存在可用连接
+        
+        距上次活动超过 health_check_interval 秒时先用 NOOP 检查连接，
+        失效则按指数退避重新连接，并重新选择之前的文件夹。
+        
+        Returns:
+            bool: 连接可用返回True
+            
+        Raises:
+            Exception: 重试次数用尽仍无法连接时抛出
+        """
+        if self._imap is not None:
+            if time.monotonic() - self._last_activity < self.health_check_interval:
+                return True
+            if self.is_alive():
+                return True
+            self.logger.warning("邮箱连接已失效，正在重新连接")
+            self._drop_connection()
+        
+        folder = self._selected_folder
+        delay = self.reconnect_backoff
+        for attempt in range(1, self.reconnect_attempts + 1):
+            try:
+                self.connect()
+                if folder:
+                    # 之前选择过文件夹说明是断线重连
+                    self.select_folder(folder)
+                    self.reconnect_count += 1
+                    self.logger.info("已重新连接邮箱服务器: %s", self.server)
+                return True
+            except Exception as e:
+                self._drop_connection()
+                if attempt >= self.reconnect_attempts:
+                    raise
+                self.logger.warning("第 %d 次连接失败，%d 秒后重试: %s",
+                                    attempt, delay, LogHandler.format_error(e))
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+        return False
+
+    def keepalive(self):
+        """在处理周期之间保持连接
+        
+        空闲超过 keepalive_interval 秒时发送 NOOP；连接已断开则立即重连，
+        使下一个周期无需等待连接建立。未建立过连接时不做任何事。
+        """
+        self.download_pool.keepalive()
+        self.pipelined_downloader.keepalive()
+        if self._imap is None:
+            return
+        if time.monotonic() - self._last_activity < self.keepalive_interval:
+            return
+        if self.is_alive():
+            self.logger.debug("已发送保活 NOOP")
+            return
+        self.logger.warning("保活检查发现连接已断开，正在重新连接")
+        self._drop_connection()
+        try:
+            self.ensure_connected()
+        except Exception as e:
+            self.logger.error("保活重连失败: %s", LogHandler.format_error(e))
+
+    def ensure_selected(self):
+        """确保连接可用并已选择本服务的文件夹，供只下载附件的连接使用
+        
+        Raises:
+            Exception: 无法连接时抛出
+        """
+        self.ensure_connected()
+        if self._selected_folder is None:
+            self.select_folder(self.folder)
+
+    def select_folder(self, folder: str = 'INBOX'):
+        """选择文件夹并记录，重连后自动重新选择
+        
+        Args:
+            folder: 文件夹名称
+            
+        Returns:
+            tuple: imaplib select 的返回值
+        """
+        result = self._imap.select(ImapHelper.encode_mailbox(folder))
+        self._selected_folder = folder
+        self._last_activity = time.monotonic()
+        return result
+
+    def build_search_criteria(self, window: bool = True) -> str:
+        """根据规则生成 SEARCH 条件
+        
+        条件由三部分组成：
+        1. UNSEEN；处理标志为自定义关键字时为 UNKEYWORD <关键字>
+        2. 可选的 SINCE 时间窗口（DAYS_LOOK_BACK 天）
+        3. 所有规则发件人的 OR FROM 组合；存在不限制发件人的规则时省略
+        
+        Args:
+            window: 为False时省略 SINCE 时间窗口，供增量同步比较条件是否变化（窗口日期每天变化）
+        
+        Returns:
+            str: SEARCH 条件字符串，例如 'UNSEEN OR FROM "a@x.com" FROM "b@y.com"'
+        """
+        if self.processed_flag.lower() == '\\seen':
+            criteria = ['UNSEEN']
+        else:
+            criteria = ['UNKEYWORD ' + self.processed_flag]
+        
+        if window and self.days_look_back > 0:
+            since = date.today() - timedelta(days=self.days_look_back)
+            criteria.append('SINCE ' + ImapHelper.format_date(since))
+        
+        if self.server_side_filter:
+            senders = self.rule_processor.get_sender_keywords()
+            if senders:
+                terms = ['FROM "%s"' % sender.replace('\\', '\\\\').replace('"', '\\"')
+                         for sender in senders]
+                # OR 为二元运算，n 个条件需要 n-1 个前缀 OR
+                criteria.append('OR ' * (len(terms) - 1) + ' '.join(terms))
+        
+        return ' '.join(criteria)
+
+    def _search_candidate_uids(self, criteria: Optional[str] = None) -> List[bytes]:
+        """在服务器端搜索候选邮件的UID
+        
+        服务器支持 ESEARCH 时使用 RETURN (MIN MAX COUNT ALL)，
+        结果以压缩集合返回，并记录在 last_search 中。
+        
+        Args:
+            criteria: SEARCH 条件，默认使用 build_search_criteria()
+        
+        Returns:
+            List[bytes]: 候选邮件UID列表（升序）
+        """
+        criteria = criteria or self.build_search_criteria()
+        self.logger.debug("SEARCH 条件: %s", criteria)
+        
+        if 'ESEARCH' in self._imap.capabilities:
+            self._imap.uid('SEARCH', 'RETURN (MIN MAX COUNT ALL)', criteria)
+            _, esearch = self._imap.response('ESEARCH')
+            if esearch and esearch[0] is not None:
+                result = ImapHelper.parse_esearch(esearch)
+                self.last_search = {'count': result['count'], 'min': result['min'],
+                                    'max': result['max'], 'esearch': True}
+                self.logger.debug("ESEARCH 结果: %s", self.last_search)
+                return result['all']
+        
+        _, data = self._imap.uid('SEARCH', criteria)
+        uids = data[0].split() if data and data[0] else []
+        self.last_search = {'count': len(uids),
+                            'min': int(uids[0]) if uids else None,
+                            'max': int(uids[-1]) if uids else None,
+                            'esearch': False}
+        return uids
 
     def get_unread_emails(self) -> List[EmailMessage]:
         """获取所有未读邮件
         
+        只有满足 build_search_criteria 条件的邮件才会被获取邮件头。
+        启用增量同步时由 MailboxSync 复用上次同步的结果和邮件头缓存。
+        
         Returns:
             List[EmailMessage]: 未读邮件列表
             
         Raises:
             Exception: 获取邮件失败时抛出
         """
+        email_list = list(self.iter_unread_emails())
+        if email_list:
+            self.logger.info("[%s] 找到 %d 封未读邮件", self.source, len(email_list))
+        return email_list
+
+    def iter_unread_emails(self) -> Iterator[EmailMessage]:
+        """逐封返回未读邮件
+        
+        搜索完成后按 header_batch_size 分批获取邮件头，每批取完再继续下一批，
+        调用方处理完前面的邮件后再获取后面的邮件头，内存不随待处理邮件数增长。
+        启用增量同步时由 MailboxSync 复用上次同步的结果和邮件头缓存。
+        
+        Returns:
+            Iterator[EmailMessage]: 未读邮件，按UID升序
+            
+        Raises:
+            Exception: 搜索或连接失败时抛出
+        """
         try:
-            if not self.connect():
+            if not self.ensure_connected():
                 raise Exception("无法连接到邮箱服务器")
                 
-            self._imap.select('INBOX')
-            _, messages = self._imap.search(None, 'UNSEEN')
-            
-            email_list = []
-            for num in messages[0].split():
-                email_msg = self._fetch_email_header(num)
-                if email_msg:
-                    email_list.append(email_msg)
-            
-            if email_list:
-                self.logger.info("找到 %d 封未读邮件", len(email_list))
-            return email_list
+            if self.incremental_sync:
+                synced = self.mailbox_sync.sync(self.folder)
+            else:
+                self.select_folder(self.folder)
+                synced = None
+                uids = self._search_candidate_uids()
         except Exception as e:
             self.logger.error("获取未读邮件失败: %s", LogHandler.format_error(e))
             raise  # 重新抛出异常，保持原有行为
+        
+        if synced is not None:
+            for email_msg in synced:
+                email_msg.source = self.source
+                yield email_msg
+            return
+        for chunk in ImapHelper.chunked(uids, max(1, self.header_batch_size)):
+            for email_msg in self._fetch_headers(chunk):
+                email_msg.source = self.source
+                yield email_msg
+
+    def _fetch_headers(self, uids: List[bytes]) -> List[EmailMessage]:
+        """获取邮件头信息，header_batch_size 大于0时批量获取
+        
+        Args:
+            uids: 邮件UID列表
+            
+        Returns:
+            List[EmailMessage]: 邮件列表
+        """
+        if not uids:
+            return []
+        if self.header_batch_size > 0:
+            return self._fetch_email_headers_batch(uids)
+        
+        email_list = []
+        for uid in uids:
+            email_msg = self._fetch_email_header(uid)
+            if email_msg:
+                email_list.append(email_msg)
+        return email_list
 
     def _fetch_email_header(self, uid: bytes) -> Optional[EmailMessage]:
         """获取邮件头信息"""
         try:
-            _, msg_data = self._imap.fetch(uid, '(BODY.PEEK[HEADER])')
-            email_header = email.message_from_bytes(msg_data[0][1])
-            
-            email_msg = EmailMessage(
-                subject=EmailDecoder.decode_str(email_header['subject']),
-                sender=email_header['from'],
-                to=email_header['to'],
-                uid=uid
-            )
-            self.logger.debug("获取邮件头信息: %s", email_msg.subject)
-            return email_msg
+            _, msg_data = self._imap.uid('FETCH', uid, '(BODY.PEEK[HEADER])')
+            return self._build_email_message(uid, msg_data[0][1])
         except Exception as e:
             self.logger.error("获取邮件头信息时出错: %s", LogHandler.format_error(e))
             return None
 
+    def _fetch_email_headers_batch(self, uids: List[bytes]) -> List[EmailMessage]:
+        """批量获取邮件头信息
+
+        按 header_batch_size 分批，每批使用一条 UID FETCH 命令只获取
+        HEADER_FIELDS 中的字段，避免逐封往返和下载完整邮件头。
+
+        Args:
+            uids: 邮件UID列表
+
+        Returns:
+            List[EmailMessage]: 邮件列表，顺序与 uids 一致
+        """
+        query = '(UID BODY.PEEK[HEADER.FIELDS (%s)])' % ' '.join(self.HEADER_FIELDS)
+        headers: Dict[bytes, EmailMessage] = {}
+
+        for chunk in ImapHelper.chunked(uids, self.header_batch_size):
+            try:
+                _, msg_data = self._imap.uid('FETCH', ImapHelper.build_sequence_set(chunk), query)
+            except Exception as e:
+                self.logger.error("批量获取邮件头信息时出错: %s", LogHandler.format_error(e))
+                continue
+
+            for item in ImapHelper.parse_fetch_response(msg_data):
+                uid = ImapHelper.parse_uid(item['meta'])
+                if uid is None or item['literal'] is None:
+                    continue
+                email_msg = self._build_email_message(uid, item['literal'])
+                if email_msg:
+                    headers[uid] = email_msg
+
+        self.logger.debug("批量获取邮件头信息: %d/%d", len(headers), len(uids))
+        return [headers[uid] for uid in uids if uid in headers]
+
+    def _build_email_message(self, uid: bytes, header_bytes: bytes) -> Optional[EmailMessage]:
+        """由邮件头原始内容构造邮件对象，字段在首次访问时才解析和解码
+
+        Args:
+            uid: 邮件标识
+            header_bytes: 邮件头原始内容
+
+        Returns:
+            Optional[EmailMessage]: 邮件对象，内容为空时返回None
+        """
+        if not header_bytes:
+            return None
+        return EmailMessage.from_header(uid, header_bytes, self.source)
+
     def load_full_message(self, email_msg: EmailMessage) -> bool:
         """加载完整的邮件内容
         
@@ -175,36 +574,21 @@ class EmailService:
             return True
 
         try:
-            # 尝试不同的邮件获取命令
-            msg_data = None
-            fetch_methods = [
-                ('RFC822', '(RFC822)'),
-                ('BODY[]', '(BODY[])'),
-                ('BODY.PEEK[]', '(BODY.PEEK[])')
-            ]
-            
-            for method_name, method_cmd in fetch_methods:
-                try:
-                    self.logger.debug("尝试使用 %s 获取邮件", method_name)
-                    _, msg_data = self._imap.fetch(email_msg.uid, method_cmd)
-                    if msg_data and msg_data[0]:
-                        break
-                except Exception as e:
-                    self.logger.debug("%s 获取失败: %s", method_name, LogHandler.format_error(e))
-                    continue
+            self.ensure_connected()
+            
+            # 使用本连接探测确定的获取形式，首次加载时完成探测
+            try:
+                raw_email = self.fetch_strategy.fetch(email_msg.uid)
+            except imaplib.IMAP4.abort as e:
+                # 连接已断开，丢弃连接以便下次使用前重连
+                self.logger.warning("获取邮件时连接断开: %s", LogHandler.format_error(e))
+                self._drop_connection()
+                raw_email = None
 
-            if not msg_data or not msg_data[0]:
+            if not raw_email:
                 self.logger.error("获取邮件数据为空: %s", email_msg.subject)
                 return False
 
-            raw_email = msg_data[0][1] if isinstance(msg_data[0], tuple) else msg_data[0]
-            
-            # 处理数据类型
-            if isinstance(raw_email, int):
-                raw_email = str(raw_email).encode('utf-8')
-            elif not isinstance(raw_email, bytes):
-                raw_email = str(raw_email).encode('utf-8')
-
             full_message = email.message_from_bytes(raw_email)
             email_msg.set_full_message(full_message)
             self.logger.debug("已加载完整邮件内容: %s", email_msg.subject)
@@ -213,6 +597,41 @@ class EmailService:
             self.logger.error("加载邮件内容时出错: %s", LogHandler.format_error(e))
             return False
 
+    def get_metrics(self) -> Dict[str, Any]:
+        """返回邮件服务的运行指标
+        
+        Returns:
+            Dict[str, Any]: 包含以下字段：
+                - fetch_strategy: 当前连接使用的整封邮件获取形式，未探测时为None
+                - peek_honoured: 服务器是否遵守 PEEK，未知时为None
+                - reconnect_count: 断线重连次数
+                - last_search: 最近一次搜索结果统计
+                - last_sync: 最近一次增量同步统计
+                - attachment_store: 附件去重统计，未启用去重时为None
+                - last_download: 最近一批附件下载的邮件数、连接数和耗时
+                - last_memory: 最近一批附件下载的邮件数和期间的峰值RSS（peak_rss、peak_delta），
+                  未启用内存报告时为空
+                - last_pipeline: 最近一批流水线下载的邮件数、段落数、回退数、最大在途命令数和耗时
+                - compression: 当前连接是否已压缩，以及本服务和下载连接累计的
+                  压缩前（raw_*）和线路上（wire_*）收发字节数
+                - tls: TLS 握手次数、会话复用命中和未命中次数及平均握手耗时（进程内所有连接累计）
+        """
+        strategy = self.fetch_strategy.get_metrics()
+        return {
+            'fetch_strategy': strategy['strategy'],
+            'peek_honoured': strategy['peek_honoured'],
+            'reconnect_count': self.reconnect_count,
+            'last_search': dict(self.last_search),
+            'last_sync': dict(self.mailbox_sync.last_sync),
+            'attachment_store': self.attachment_store.get_metrics() if self.attachment_store else None,
+            'last_download': dict(self.download_pool.last_batch),
+            'last_memory': dict(self.last_memory),
+            'last_pipeline': dict(self.pipelined_downloader.last_batch),
+            'compression': dict(self.download_pool.compress_stats(),
+                                enabled=bool(getattr(self._imap, 'compressed', False))),
+            'tls': self.tls_sessions.get_metrics()
+        }
+
     def mark_as_read(self, email_msg: EmailMessage):
         """标记邮件为已读
         
@@ -223,11 +642,192 @@ class EmailService:
             Exception: 标记失败时抛出
         """
         try:
-            self._imap.store(email_msg.uid, '+FLAGS', '\\Seen')
+            self.ensure_connected()
+            self._imap.uid('STORE', email_msg.uid, '+FLAGS', '\\Seen')
             self.logger.info("邮件已标记为已读: %s", email_msg.subject)
         except Exception as e:
+            if isinstance(e, imaplib.IMAP4.abort):
+                self._drop_connection()
             self.logger.error("标记邮件为已读时出错: %s", LogHandler.format_error(e))
 
+    def stage_processed(self, email_msg: EmailMessage):
+        """登记处理完成的邮件，在 commit_processed_flags 时统一设置处理标志
+        
+        Args:
+            email_msg: 邮件对象
+        """
+        self._pending_flags[email_msg.uid] = email_msg
+
+    def commit_processed_flags(self) -> Dict[str, List[bytes]]:
+        """用一条 UID STORE 为所有已登记的邮件设置处理标志
+        
+        UID 集合压缩为区间形式（如 3:7,9）。根据服务器返回的 FETCH 响应
+        逐个确认标志已设置，没有确认的UID记为失败并逐个记录日志。
+        命令本身失败（如连接断开）时保留登记，下次提交时重试。
+        
+        Returns:
+            Dict[str, List[bytes]]: committed 为已设置标志的UID，failed 为失败的UID
+        """
+        result = {'committed': [], 'failed': []}
+        if not self._pending_flags:
+            return result
+        
+        uids = sorted(self._pending_flags, key=int)
+        flag = self.processed_flag
+        try:
+            self.ensure_connected()
+            typ, data = self._imap.uid('STORE', ImapHelper.build_sequence_set(uids),
+                                       '+FLAGS', '(%s)' % flag)
+        except Exception as e:
+            if isinstance(e, imaplib.IMAP4.abort):
+                self._drop_connection()
+            self.logger.error("提交处理标志失败，%d 封邮件将在下次提交时重试: %s",
+                              len(uids), LogHandler.format_error(e))
+            result['failed'] = uids
+            return result
+        
+        pending, self._pending_flags = self._pending_flags, {}
+        if typ != 'OK':
+            result['failed'] = uids
+        else:
+            confirmed = set()
+            responses = ImapHelper.parse_fetch_response(data)
+            for item in responses:
+                uid = ImapHelper.parse_uid(item['meta'])
+                if uid and flag.lower().encode() in item['meta'].lower():
+                    confirmed.add(uid)
+            # 服务器没有返回任何 FETCH 响应时无法逐个确认，以命令结果为准
+            for uid in uids:
+                if uid in confirmed or not responses:
+                    result['committed'].append(uid)
+                else:
+                    result['failed'].append(uid)
+        
+        for uid in result['failed']:
+            self.logger.error("设置处理标志失败 [UID %s]: %s", uid.decode(), pending[uid].subject)
+        self.logger.info("已为 %d 封邮件设置 %s 标志，失败 %d 封",
+                         len(result['committed']), flag, len(result['failed']))
+        return result
+
+    def stage_archive(self, email_msg: EmailMessage, folder: str):
+        """登记后续处理已完成、需要移入归档文件夹的邮件，在 commit_archive_moves 时分批移动
+        
+        Args:
+            email_msg: 邮件对象
+            folder: 归档文件夹名称，与本服务检查的文件夹相同时忽略
+        """
+        if folder == self.folder:
+            return
+        self._pending_moves.setdefault(folder, {})[email_msg.uid] = email_msg
+
+    def commit_archive_moves(self) -> Dict[str, List[bytes]]:
+        """将已登记的邮件按归档文件夹分批移出当前文件夹
+        
+        需在 commit_processed_flags 之后调用，移出的邮件带有处理标志；
+        处理标志尚未提交成功的邮件保留登记，下次提交时再移动。
+        
+        Returns:
+            Dict[str, List[bytes]]: moved 为已移动的UID，failed 为移动失败的UID
+        """
+        result = {'moved': [], 'failed': []}
+        for folder in list(self._pending_moves):
+            staged = self._pending_moves[folder]
+            ready = sorted((uid for uid in staged if uid not in self._pending_flags), key=int)
+            if not ready:
+                continue
+            moved = self.move_uids(ready, folder)
+            for key in ('moved', 'failed'):
+                result[key].extend(moved[key])
+            for uid in moved['moved']:
+                staged.pop(uid, None)
+            if not staged:
+                del self._pending_moves[folder]
+        return result
+
+    def move_uids(self, uids: List[bytes], folder: str) -> Dict[str, List[bytes]]:
+        """将当前文件夹中的邮件按 archive_batch_size 分批移动到目标文件夹
+        
+        每批用一条 UID MOVE（RFC 6851）；服务器不支持 MOVE 时改为 UID COPY 后
+        设置 \\Deleted 标志并删除：支持 UIDPLUS 时用 UID EXPUNGE 只删除本批邮件，
+        否则用 EXPUNGE（同时会删除文件夹中其他已带 \\Deleted 标志的邮件）。
+        目标文件夹不存在（TRYCREATE）时先创建。某一批失败时记录日志并继续下一批。
+        
+        Args:
+            uids: 邮件UID列表
+            folder: 目标文件夹名称
+            
+        Returns:
+            Dict[str, List[bytes]]: moved 为已移动的UID，failed 为移动失败的UID
+        """
+        result = {'moved': [], 'failed': []}
+        for batch in ImapHelper.chunked(sorted(uids, key=int), self.archive_batch_size):
+            try:
+                self.ensure_connected()
+                self._move_batch(ImapHelper.build_sequence_set(batch), folder)
+                result['moved'].extend(batch)
+            except Exception as e:
+                if isinstance(e, imaplib.IMAP4.abort):
+                    self._drop_connection()
+                self.logger.error("移动 %d 封邮件到 [%s] 失败: %s", len(batch), folder, LogHandler.format_error(e))
+                result['failed'].extend(batch)
+        if result['moved'] or result['failed']:
+            self.logger.info("已将 %d 封邮件移动到 [%s]，失败 %d 封",
+                             len(result['moved']), folder, len(result['failed']))
+        return result
+
+    def _move_batch(self, sequence_set: str, folder: str):
+        """移动一批邮件，失败时抛出异常
+        
+        Args:
+            sequence_set: UID 集合字符串
+            folder: 目标文件夹名称
+            
+        Raises:
+            imaplib.IMAP4.error: 服务器拒绝命令时抛出
+        """
+        mailbox = ImapHelper.encode_mailbox(folder)
+        capabilities = self._imap.capabilities
+        command = 'MOVE' if 'MOVE' in capabilities else 'COPY'
+        typ, data = self._imap.uid(command, sequence_set, mailbox)
+        if typ != 'OK' and folder not in self._archive_folders and b'TRYCREATE' in (data[0] or b''):
+            self.logger.info("创建归档文件夹 [%s]", folder)
+            self._imap.create(mailbox)
+            self._archive_folders.add(folder)
+            typ, data = self._imap.uid(command, sequence_set, mailbox)
+        if typ != 'OK':
+            raise imaplib.IMAP4.error("UID %s 失败: %s" % (command, data))
+        self._archive_folders.add(folder)
+        self._last_activity = time.monotonic()
+        if command == 'MOVE':
+            return
+
+        typ, data = self._imap.uid('STORE', sequence_set, '+FLAGS.SILENT', '(\\Deleted)')
+        if typ != 'OK':
+            raise imaplib.IMAP4.error("复制后设置删除标志失败: %s" % data)
+        if 'UIDPLUS' in capabilities:
+            typ, data = self._imap.uid('EXPUNGE', sequence_set)
+        else:
+            typ, data = self._imap.expunge()
+        if typ != 'OK':
+            raise imaplib.IMAP4.error("复制后删除原邮件失败: %s" % data)
+
+    def search_processed_uids(self, before: Optional[date] = None) -> List[bytes]:
+        """搜索当前文件夹中已设置处理标志的邮件
+        
+        Args:
+            before: 只返回该日期之前收到的邮件（SEARCH BEFORE），为None时不限制
+            
+        Returns:
+            List[bytes]: 邮件UID列表（升序）
+        """
+        if self.processed_flag.lower() == '\\seen':
+            criteria = 'SEEN'
+        else:
+            criteria = 'KEYWORD ' + self.processed_flag
+        if before is not None:
+            criteria += ' BEFORE ' + ImapHelper.format_date(before)
+        return sorted(self._search_candidate_uids(criteria), key=int)
+
     def _debug_print_message_structure(self, message, level=0):
         """打印邮件结构的辅助方法"""
         prefix = "  " * level
@@ -268,51 +868,472 @@ class EmailService:
         try:
             downloaded_files = []
             
-            # 遍历邮件结构
-            for part in email_msg.message.walk():
-                if not part.get('Content-Disposition'):
-                    continue
-                    
-                filename = part.get_filename()
-                if not filename:
-                    continue
+            for filename, part in self.iter_wanted_parts(email_msg, rule):
+                # 保存附件，较大的 base64/quoted-printable 附件分块解码写入
+                encoding = str(part.get('Content-Transfer-Encoding', '7bit')).strip().lower()
+                raw = part.get_payload()
+                if encoding in ('base64', 'quoted-printable') and isinstance(raw, str) \
+                        and len(raw) > self.stream_threshold:
+                    save_path = self._save_attachment_stream(
+                        rule, filename, self._iter_text_chunks(raw), encoding, email_msg)
+                else:
+                    save_path = self._save_attachment(
+                        rule, filename, part.get_payload(decode=True), email_msg)
+                if save_path:
+                    downloaded_files.append(save_path)
                     
-                # 解码文件名
-                filename = EmailDecoder.decode_filename(filename)
-                
-                # 检查是否为Excel文件
-                if not filename.lower().endswith(('.xls', '.xlsx')):
-                    self.logger.debug("跳过非Excel文件: %s", filename)
-                    continue
-                    
-                # 检查文件名是否匹配规则
-                if not self.rule_processor.match_attachment_name(rule, filename):
-                    self.logger.debug("附件名称不匹配规则: %s", filename)
-                    continue
-                    
-                # 获取保存路径
-                save_dir = rule['download_path']
-                save_path = os.path.join(save_dir, filename)
+            return downloaded_files
+            
+        except Exception as e:
+            self.logger.error("处理附件失败 [%s]: %s", 
+                            email_msg.subject, LogHandler.format_error(e))
+            return []
+
+    def iter_wanted_parts(self, email_msg: EmailMessage, rule: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+        """遍历完整邮件中匹配规则的附件段落
+        
+        Args:
+            email_msg: 已加载完整内容的邮件对象
+            rule: 匹配规则
+            
+        Returns:
+            Iterator[Tuple[str, Any]]: 解码后的文件名和附件段落
+        """
+        # 遍历邮件结构
+        for part in email_msg.message.walk():
+            if not part.get('Content-Disposition'):
+                continue
                 
-                # 确保目录存在
-                FileHandler.ensure_dir(save_dir)
+            filename = part.get_filename()
+            if not filename:
+                continue
                 
-                # 保存附件
+            # 解码文件名
+            filename = EmailDecoder.decode_filename(filename, email_msg.sender)
+            
+            if self._is_wanted_attachment(rule, filename):
+                yield filename, part
+
+    def _is_wanted_attachment(self, rule: Dict[str, Any], filename: str) -> bool:
+        """检查附件是否为匹配规则的Excel文件
+        
+        Args:
+            rule: 匹配规则
+            filename: 解码后的附件文件名
+            
+        Returns:
+            bool: 需要下载返回True，否则返回False
+        """
+        # 检查是否为Excel文件
+        if not filename.lower().endswith(('.xls', '.xlsx')):
+            self.logger.debug("跳过非Excel文件: %s", filename)
+            return False
+            
+        # 检查文件名是否匹配规则
+        if not self.rule_processor.match_attachment_name(rule, filename):
+            self.logger.debug("附件名称不匹配规则: %s", filename)
+            return False
+        return True
+
+    def _save_attachment(self, rule: Dict[str, Any], filename: str, payload: Optional[bytes],
+                         email_msg: Optional[EmailMessage] = None) -> Optional[str]:
+        """将附件内容保存到规则的下载目录
+        
+        启用去重时按内容哈希保存，相同内容已放入过该目录时返回已有的路径，不再重复写入。
+        
+        Args:
+            rule: 匹配规则
+            filename: 解码后的附件文件名
+            payload: 解码后的附件内容
+            email_msg: 附件所属邮件，记录到去重索引
+            
+        Returns:
+            Optional[str]: 保存路径，内容为空或保存失败时返回None
+        """
+        # 获取保存路径
+        save_dir = rule['download_path']
+        save_path = os.path.join(save_dir, filename)
+        
+        try:
+            # 确保目录存在
+            FileHandler.ensure_dir(save_dir)
+            
+            if not payload:
+                self.logger.warning("附件内容为空: %s", filename)
+                return None
+            if self.attachment_store:
+                stored = self.attachment_store.store_bytes(
+                    payload, save_path, self._attachment_meta(email_msg))
+                self._record_digest(email_msg, stored['sha256'])
+                if stored['duplicate']:
+                    return stored['path']
+            else:
+                FileHandler.save_file(payload, save_path)
+                self._record_digest(email_msg, hashlib.sha256(payload).hexdigest())
+            self.logger.info("已保存附件: %s (%d 字节)", filename, len(payload))
+            return save_path
+        except Exception as e:
+            self.logger.error("保存附件失败 [%s]: %s", 
+                            filename, LogHandler.format_error(e))
+            return None
+
+    def _save_attachment_stream(self, rule: Dict[str, Any], filename: str,
+                                chunks: Iterable[bytes], encoding: str,
+                                email_msg: Optional[EmailMessage] = None) -> Optional[str]:
+        """将分块的编码数据边解码边保存到规则的下载目录
+        
+        Args:
+            rule: 匹配规则
+            filename: 解码后的附件文件名
+            chunks: 编码数据分块
+            encoding: 传输编码
+            email_msg: 附件所属邮件，记录到去重索引
+            
+        Returns:
+            Optional[str]: 保存路径，内容为空或保存失败时返回None
+
+        Raises:
+            ValueError: 编码数据无法解码时抛出，调用方可改为下载完整邮件
+        """
+        save_path = os.path.join(rule['download_path'], filename)
+        try:
+            if self.attachment_store:
+                stored = self.attachment_store.store_stream(
+                    chunks, encoding, save_path, self._attachment_meta(email_msg))
+                file_size = stored['size']
+                if file_size:
+                    self._record_digest(email_msg, stored['sha256'])
+                if stored['duplicate']:
+                    return stored['path']
+            else:
+                sha = hashlib.sha256()
+                file_size = FileHandler.save_stream(chunks, save_path, encoding, hasher=sha)
+                if file_size:
+                    self._record_digest(email_msg, sha.hexdigest())
+                else:
+                    os.remove(save_path)
+            if not file_size:
+                self.logger.warning("附件内容为空: %s", filename)
+                return None
+            self.logger.info("已保存附件: %s (%d 字节)", filename, file_size)
+            return save_path
+        except ValueError as e:
+            self.logger.warning("附件内容解码失败，未保存 [%s]: %s", filename, LogHandler.format_error(e))
+            raise
+        except Exception as e:
+            self.logger.error("保存附件失败 [%s]: %s", 
+                            filename, LogHandler.format_error(e))
+            return None
+
+    @staticmethod
+    def _attachment_meta(email_msg: Optional[EmailMessage]) -> Dict[str, Any]:
+        """返回记录到去重索引的邮件信息"""
+        if email_msg is None:
+            return {}
+        return {'message_id': email_msg.message_id, 'subject': email_msg.subject,
+                'source': email_msg.source}
+
+    @staticmethod
+    def _record_digest(email_msg: Optional[EmailMessage], digest: str):
+        """记录已保存附件内容的哈希"""
+        if email_msg is not None:
+            email_msg.attachment_hashes.append(digest)
+
+    def _memory_monitor(self):
+        """启用内存报告时返回 MemoryMonitor，否则返回空上下文"""
+        return MemoryMonitor() if self.memory_report else nullcontext()
+
+    def _iter_text_chunks(self, text: str) -> Iterator[bytes]:
+        """将已在内存中的编码文本按 stream_chunk_size 分块"""
+        for i in range(0, len(text), self.stream_chunk_size):
+            yield text[i:i + self.stream_chunk_size].encode('ascii', errors='ignore')
+
+    def _iter_part_ranges(self, uid: bytes, section: str, offset: int = 0) -> Iterator[bytes]:
+        """按 stream_chunk_size 分段获取段落内容
+        
+        使用 BODY.PEEK[<section>]<offset.length>，每次只在内存中保留一段。
+        
+        Args:
+            uid: 邮件UID
+            section: 段落号
+            offset: 开始获取的字节偏移
+            
+        Returns:
+            Iterator[bytes]: 段落编码内容的分块
+        """
+        while True:
+            query = '(UID BODY.PEEK[%s]<%d.%d>)' % (section, offset, self.stream_chunk_size)
+            _, data = self._imap.uid('FETCH', uid, query)
+            chunk = None
+            for item in ImapHelper.parse_fetch_response(data):
+                if item['literal'] is not None:
+                    chunk = item['literal']
+                    break
+            if not chunk:
+                return
+            yield chunk
+            offset += len(chunk)
+            self._last_activity = time.monotonic()
+            if len(chunk) < self.stream_chunk_size:
+                return
+
+    def _download_part_resumable(self, email_msg: EmailMessage, rule: Dict[str, Any],
+                                 part: Dict[str, Any]) -> Optional[str]:
+        """分段下载一个大附件段落，连接断开后从检查点继续
+        
+        每段追加到断点文件并提交检查点；获取中连接断开时重新连接，从最后提交的偏移继续，
+        连续 reconnect_attempts 次重连后都没有进展时放弃。全部取回后核对总字节数与
+        BODYSTRUCTURE 声明的段落大小，一致时从断点文件边解码边保存并删除断点文件。
+        放弃时保留断点文件，之后再次下载同一段落（包括程序重启后）从检查点继续。
+        
+        Args:
+            email_msg: 邮件对象
+            rule: 匹配规则
+            part: 段落信息
+            
+        Returns:
+            Optional[str]: 保存路径，内容为空或保存失败时返回None
+            
+        Raises:
+            imaplib.IMAP4.abort: 连续重连都没有进展时抛出
+            ValueError: 取回的字节数与声明的段落大小不一致时抛出
+        """
+        download = self.partial_downloads.open(email_msg, part)
+        if download.offset:
+            self.logger.info("从断点继续下载附件 [%s]: 已下载 %d/%d 字节",
+                             part['filename'], download.offset, download.size)
+        retries = 0
+        resumed_from = download.offset
+        while True:
+            try:
+                self.ensure_connected()
+                for chunk in self._iter_part_ranges(email_msg.uid, part['section'], download.offset):
+                    download.append(chunk)
+                break
+            except (imaplib.IMAP4.abort, ConnectionError, TimeoutError, ssl.SSLError) as e:
+                self._drop_connection()
+                retries = 1 if download.offset > resumed_from else retries + 1
+                resumed_from = download.offset
+                if retries > self.reconnect_attempts:
+                    self.logger.warning("下载附件 [%s] 中断，已保存 %d/%d 字节，下次从断点继续",
+                                        part['filename'], download.offset, download.size)
+                    raise imaplib.IMAP4.abort(str(e))
+                self.logger.warning("下载附件 [%s] 时连接断开，重连后从 %d 字节处继续: %s",
+                                    part['filename'], download.offset, LogHandler.format_error(e))
+
+        if download.offset != download.size:
+            download.discard()
+            raise ValueError("附件 [%s] 大小不符: 声明 %d 字节，实际取回 %d 字节"
+                             % (part['filename'], download.size, download.offset))
+        try:
+            save_path = self._save_attachment_stream(
+                rule, part['filename'], download.iter_chunks(self.stream_chunk_size),
+                part['encoding'], email_msg)
+        except ValueError:
+            # 取回的内容无法解码，断点文件不再可用
+            download.discard()
+            raise
+        if save_path:
+            download.discard()
+        return save_path
+
+    def download_attachments(self, email_msg: EmailMessage, rule: Dict[str, Any]) -> List[str]:
+        """下载邮件中匹配规则的附件
+        
+        启用部分获取时先获取 BODYSTRUCTURE，只下载匹配规则的附件段落；
+        服务器不返回结构或部分获取失败时回退到下载完整邮件。
+        
+        Args:
+            email_msg: 邮件对象
+            rule: 匹配规则
+            
+        Returns:
+            List[str]: 下载的附件文件路径列表
+        """
+        email_msg.attachment_hashes = []
+        if self.partial_fetch and not email_msg.has_full_content \
+                and self.fetch_strategy.supports_body_sections:
+            downloaded_files = self._download_attachment_parts(email_msg, rule)
+            if downloaded_files is not None:
+                return downloaded_files
+            self.logger.debug("部分获取失败，回退到完整邮件下载: %s", email_msg.subject)
+            email_msg.attachment_hashes = []
+        
+        if not self.load_full_message(email_msg):
+            self.logger.error("无法加载邮件内容: %s", email_msg.subject)
+            return []
+        try:
+            return self.get_attachments(email_msg, rule)
+        finally:
+            # 附件已保存，不再保留完整邮件内容
+            email_msg.release_body()
+
+    def download_attachments_batch(self, jobs: List[Tuple[EmailMessage, Dict[str, Any]]]) -> List[List[str]]:
+        """下载一批邮件中匹配规则的附件
+        
+        启用异步流水线时在一个连接上流水线获取附件段落，无法按段落下载的邮件
+        再逐封下载；否则不同下载目录的邮件分给连接池中的多个连接并行下载。
+        结果按输入顺序返回。
+        
+        Args:
+            jobs: (邮件, 规则) 列表
+            
+        Returns:
+            List[List[str]]: 与 jobs 一一对应的附件路径列表
+        """
+        if not jobs:
+            return []
+        unseen = self._unseen_before_download(jobs)
+        # RSS 是整个进程的，多个连接和保存线程并行时无法归到单个附件，只按批采样
+        with self._memory_monitor() as monitor:
+            downloaded = self._download_batch(jobs)
+        self._restore_unseen(unseen, any(downloaded))
+        if monitor is not None:
+            self.last_memory = {'messages': len(jobs), 'peak_rss': monitor.peak_rss,
+                                'peak_delta': monitor.peak_delta}
+            self.logger.info("本批下载 %d 封邮件的附件，峰值RSS %.1f MB，增量 %.1f MB",
+                             len(jobs), monitor.peak_rss / 1048576, monitor.peak_delta / 1048576)
+        return downloaded
+
+    def _unseen_before_download(self, jobs: List[Tuple[EmailMessage, Dict[str, Any]]]) -> List[bytes]:
+        """服务器未确认遵守 PEEK 时，返回本批中下载前未读的邮件"""
+        try:
+            self.ensure_selected()
+            return self.fetch_strategy.unseen_uids([email_msg.uid for email_msg, _ in jobs])
+        except Exception as e:
+            self.logger.warning("查询邮件标志失败，无法检查 PEEK: %s", LogHandler.format_error(e))
+            return []
+
+    def _restore_unseen(self, uids: List[bytes], fetched: bool):
+        """恢复下载时被不遵守 PEEK 的服务器标记为已读的邮件"""
+        if not uids:
+            return
+        try:
+            self.ensure_selected()
+            self.fetch_strategy.restore_unseen(uids, fetched)
+        except Exception as e:
+            self.logger.warning("恢复邮件未读状态失败: %s", LogHandler.format_error(e))
+
+    def _download_batch(self, jobs: List[Tuple[EmailMessage, Dict[str, Any]]]) -> List[List[str]]:
+        """下载一批邮件中匹配规则的附件，见 download_attachments_batch"""
+        if not (self.async_pipeline and self.partial_fetch):
+            return self.download_pool.download(jobs)
+        
+        self.ensure_selected()
+        if not self.fetch_strategy.supports_body_sections:
+            return self.download_pool.download(jobs)
+        pending = [i for i, (email_msg, _) in enumerate(jobs) if not email_msg.has_full_content]
+        results: List[Optional[List[str]]] = [None] * len(jobs)
+        for index, files in zip(pending, self.pipelined_downloader.download([jobs[i] for i in pending])):
+            results[index] = files
+        downloaded = []
+        for (email_msg, rule), files in zip(jobs, results):
+            if files is None:
                 try:
-                    payload = part.get_payload(decode=True)
-                    if payload:
-                        FileHandler.save_file(payload, save_path)
-                        downloaded_files.append(save_path)
-                        self.logger.info("已保存附件: %s", filename)
-                    else:
-                        self.logger.warning("附件内容为空: %s", filename)
+                    files = self.download_attachments(email_msg, rule)
                 except Exception as e:
-                    self.logger.error("保存附件失败 [%s]: %s", 
-                                    filename, LogHandler.format_error(e))
-                    
-            return downloaded_files
+                    self.logger.error("下载附件失败 [%s]: %s", email_msg.subject, LogHandler.format_error(e))
+                    files = []
+            downloaded.append(files)
+        return downloaded
+
+    def _download_attachment_parts(self, email_msg: EmailMessage,
+                                   rule: Dict[str, Any]) -> Optional[List[str]]:
+        """根据 BODYSTRUCTURE 只下载匹配规则的附件段落
+        
+        Args:
+            email_msg: 邮件对象
+            rule: 匹配规则
+            
+        Returns:
+            Optional[List[str]]: 下载的附件文件路径列表；需要回退到完整下载时返回None，
+                大附件下载中断并保留了断点时返回空列表（不回退，下次从断点继续）
+        """
+        interrupted = None
+        try:
+            self.ensure_connected()
+            _, data = self._imap.uid('FETCH', email_msg.uid, '(UID BODYSTRUCTURE)')
+            structure = BodyStructureParser.find_structure(data)
+            if not structure:
+                return None
+            
+            parts = []
+            for part in BodyStructureParser.iter_parts(structure):
+                if not part['disposition'] or not part['filename']:
+                    continue
+                if self._is_wanted_attachment(rule, part['filename']):
+                    parts.append(part)
+            if not parts:
+                return []
             
+            self.logger.debug("部分获取附件段落: %s",
+                              ', '.join('%s(%d)' % (p['section'], p['size']) for p in parts))
+            
+            # 小段落一次取回，超过阈值的段落分段获取并边解码边写入
+            small_parts = [p for p in parts if p['size'] <= self.stream_threshold]
+            sections = {}
+            if small_parts:
+                query = '(UID %s)' % ' '.join('BODY.PEEK[%s]' % p['section'] for p in small_parts)
+                _, data = self._imap.uid('FETCH', email_msg.uid, query)
+                for item in ImapHelper.parse_fetch_response(data):
+                    for prefix, literal in item['literals']:
+                        match = self._SECTION_RE.search(prefix)
+                        if match:
+                            sections[match.group(1).decode()] = literal
+                data = None
+            
+            downloaded_files = []
+            for part in parts:
+                if part['size'] > self.stream_threshold and self.partial_downloads is not None:
+                    interrupted = part
+                    save_path = self._download_part_resumable(email_msg, rule, part)
+                    interrupted = None
+                    if save_path:
+                        downloaded_files.append(save_path)
+                    continue
+                if part['size'] > self.stream_threshold:
+                    save_path = self._save_attachment_stream(
+                        rule, part['filename'],
+                        self._iter_part_ranges(email_msg.uid, part['section']),
+                        part['encoding'], email_msg)
+                    if save_path:
+                        downloaded_files.append(save_path)
+                    continue
+                
+                payload = sections.pop(part['section'], None)
+                if payload is None:
+                    self.logger.warning("未获取到附件段落 [%s]: %s", part['section'], part['filename'])
+                    continue
+                save_path = self._save_attachment(
+                    rule, part['filename'], self._decode_part(payload, part['encoding']), email_msg)
+                if save_path:
+                    downloaded_files.append(save_path)
+            return downloaded_files
+        except imaplib.IMAP4.abort as e:
+            self._drop_connection()
+            if interrupted is not None:
+                # 已下载的内容保存在断点文件中，不回退到重新下载完整邮件
+                self.logger.error("附件 [%s] 下载中断: %s", interrupted['filename'], LogHandler.format_error(e))
+                return []
+            self.logger.warning("部分获取时连接断开: %s", LogHandler.format_error(e))
+            return None
         except Exception as e:
-            self.logger.error("处理附件失败 [%s]: %s", 
-                            email_msg.subject, LogHandler.format_error(e))
-            return [] 
\ No newline at end of file
+            self.logger.debug("部分获取附件失败 [%s]: %s", email_msg.subject, LogHandler.format_error(e))
+            return None
+
+    @staticmethod
+    def _decode_part(payload: bytes, encoding: str) -> bytes:
+        """按传输编码解码段落内容
+        
+        Args:
+            payload: 段落原始内容
+            encoding: 传输编码（base64、quoted-printable、7bit 等）
+            
+        Returns:
+            bytes: 解码后的内容
+        """
+        if encoding == 'base64':
+            return base64.b64decode(payload)
+        if encoding == 'quoted-printable':
+            return quopri.decodestring(payload)
+        return payload 
\ No newline at end of file
@@ -0,0 +1,196 @@
+import imaplib
+from typing import List, Dict, Any, Optional, Tuple
+from utils.imap_helper import ImapHelper
+from utils.log_handler import LogHandler
+
+class FetchStrategy:
+    """整封邮件获取策略
+
+    主要功能：
+    1. 每个连接只探测一次服务器支持的整封邮件 FETCH 形式
+    2. 根据 CAPABILITY 排除服务器不支持的形式（非 IMAP4rev1 服务器没有 BODY[]）
+    3. 以第一封要加载的邮件作为测试获取，记住第一个成功的形式
+    4. 检查服务器是否遵守 PEEK（获取后不设置 \\Seen）
+    5. 之后的获取直接使用已确定的形式，不再逐个尝试
+    6. 服务器不遵守或尚未确认遵守 PEEK 时，记录下载前未读的邮件，下载后恢复其未读状态
+    """
+
+    # (名称, FETCH 数据项)，按优先级排列；PEEK 形式不会隐式标记已读
+    CANDIDATES: Tuple[Tuple[str, str], ...] = (
+        ('BODY.PEEK[]', 'BODY.PEEK[]'),
+        ('BODY[]', 'BODY[]'),
+        ('RFC822', 'RFC822'),
+    )
+
+    def __init__(self, email_service):
+        """初始化获取策略
+
+        Args:
+            email_service: 邮件服务实例，提供当前 IMAP 连接
+        """
+        self.logger = LogHandler().get_logger('FetchStrategy', file_level='DEBUG', console_level='INFO')
+        self.email_service = email_service
+        self.name: Optional[str] = None
+        self.peek_honoured: Optional[bool] = None
+        self.probe_count = 0
+        self._imap = None
+
+    def _current(self):
+        """返回当前连接，连接变化时清除已探测的结果"""
+        imap = self.email_service._imap
+        if imap is not self._imap:
+            self._imap = imap
+            self.name = None
+            self.peek_honoured = None
+        return imap
+
+    @property
+    def supports_body_sections(self) -> bool:
+        """服务器是否支持 BODY[<section>] 形式（IMAP4rev1）"""
+        imap = self._current()
+        return imap is not None and 'IMAP4REV1' in imap.capabilities
+
+    def candidates(self) -> List[Tuple[str, str]]:
+        """按优先级返回服务器可能支持的获取形式"""
+        if self.supports_body_sections:
+            return list(self.CANDIDATES)
+        return [c for c in self.CANDIDATES if not c[0].startswith('BODY')]
+
+    def fetch(self, uid: bytes) -> Optional[bytes]:
+        """获取整封邮件的原始内容
+
+        已确定策略时只发送一次 UID FETCH；否则依次尝试候选形式，
+        记住第一个返回邮件内容的形式。
+
+        Args:
+            uid: 邮件UID
+
+        Returns:
+            Optional[bytes]: 邮件原始内容，所有形式都失败时返回None
+
+        Raises:
+            imaplib.IMAP4.abort: 连接断开时抛出
+        """
+        imap = self._current()
+        if self.name is not None:
+            item = dict(self.CANDIDATES)[self.name]
+            return self._fetch_item(imap, uid, item)
+
+        for name, item in self.candidates():
+            try:
+                self.logger.debug("探测获取形式 %s", name)
+                was_seen = 'PEEK' in name and self._is_seen(imap, uid)
+                raw = self._fetch_item(imap, uid, item)
+            except imaplib.IMAP4.abort:
+                raise
+            except Exception as e:
+                self.logger.debug("%s 获取失败: %s", name, LogHandler.format_error(e))
+                continue
+            if raw is None:
+                continue
+
+            self.name = name
+            self.probe_count += 1
+            if 'PEEK' in name and not was_seen:
+                self._check_peek(imap, uid)
+            self.logger.info("邮件获取策略: %s (PEEK生效: %s)", self.name, self.peek_honoured)
+            return raw
+        return None
+
+    @staticmethod
+    def _fetch_item(imap, uid: bytes, item: str) -> Optional[bytes]:
+        """发送一次 UID FETCH 并取出字面量内容"""
+        typ, data = imap.uid('FETCH', uid, '(%s)' % item)
+        if typ != 'OK':
+            return None
+        for response in ImapHelper.parse_fetch_response(data):
+            if response['literal']:
+                return response['literal']
+        return None
+
+    @staticmethod
+    def _is_seen(imap, uid: bytes) -> bool:
+        """查询邮件当前是否带有 \\Seen 标志"""
+        _, data = imap.uid('FETCH', uid, '(FLAGS)')
+        return any(b'\\Seen' in (item if isinstance(item, bytes) else item[0])
+                   for item in data or [] if item)
+
+    def _check_peek(self, imap, uid: bytes):
+        """检查测试获取后原本未读的邮件是否被设置了 \\Seen
+
+        出现 \\Seen 说明服务器没有遵守 PEEK，此时恢复该邮件的未读状态，
+        避免探测本身改变邮件状态。
+        """
+        try:
+            seen = self._is_seen(imap, uid)
+            self.peek_honoured = not seen
+            if seen:
+                self.logger.warning("服务器未遵守 BODY.PEEK[]，加载邮件会将其标记为已读")
+                imap.uid('STORE', uid, '-FLAGS', '(\\Seen)')
+        except imaplib.IMAP4.abort:
+            raise
+        except Exception as e:
+            self.logger.debug("检查 PEEK 失败: %s", LogHandler.format_error(e))
+
+    def unseen_uids(self, uids: List[bytes]) -> List[bytes]:
+        """返回下载后需要检查是否被标记已读的邮件
+
+        已确认服务器遵守 PEEK 时不查询，直接返回空列表。
+
+        Args:
+            uids: 将要获取内容的邮件UID
+
+        Returns:
+            List[bytes]: 其中当前未设置 \\Seen 的邮件UID
+        """
+        imap = self._current()
+        if self.peek_honoured or not uids or imap is None:
+            return []
+        flags = self._fetch_flags(imap, uids)
+        return [uid for uid in uids if uid in flags and b'\\Seen' not in flags[uid]]
+
+    def restore_unseen(self, uids: List[bytes], fetched: bool = True):
+        """恢复获取内容后被服务器标记为已读的邮件的未读状态
+
+        Args:
+            uids: unseen_uids 返回的下载前未读的邮件UID
+            fetched: 是否确实获取过其中邮件的内容，为False时没有邮件被标记也不能说明服务器遵守 PEEK
+        """
+        imap = self._current()
+        if not uids or imap is None:
+            return
+        flags = self._fetch_flags(imap, uids)
+        marked = [uid for uid in uids if b'\\Seen' in flags.get(uid, b'')]
+        if not marked:
+            if self.peek_honoured is None and fetched:
+                self.peek_honoured = True
+            return
+        if self.peek_honoured is not False:
+            self.logger.warning("服务器未遵守 PEEK，获取邮件内容后将恢复其未读状态")
+            self.peek_honoured = False
+        imap.uid('STORE', ImapHelper.build_sequence_set(marked), '-FLAGS', '(\\Seen)')
+        self.logger.debug("已恢复 %d 封邮件的未读状态", len(marked))
+
+    @staticmethod
+    def _fetch_flags(imap, uids: List[bytes]) -> Dict[bytes, bytes]:
+        """批量查询邮件的标志，返回 UID 到 FLAGS 响应文本的映射"""
+        _, data = imap.uid('FETCH', ImapHelper.build_sequence_set(uids), '(UID FLAGS)')
+        flags = {}
+        for item in ImapHelper.parse_fetch_response(data):
+            uid = ImapHelper.parse_uid(item['meta'])
+            if uid is not None:
+                flags[uid] = item['meta']
+        return flags
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """返回当前策略信息
+
+        Returns:
+            Dict[str, Any]: 包含 strategy、peek_honoured 和 probe_count
+        """
+        self._current()
+        return {
+            'strategy': self.name,
+            'peek_honoured': self.peek_honoured,
+            'probe_count': self.probe_count
+        }
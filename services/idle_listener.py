@@ -0,0 +1,304 @@
+import re
+import time
+import select
+import socket
+import imaplib
+from typing import Callable, Optional, Iterator, List
+from threading import Event
+from services.email_service import EmailService
+from utils.log_handler import LogHandler
+from config import EMAIL_IDLE_TIMEOUT, EMAIL_IDLE_RECONNECT_DELAY
+
+class IdleCommand:
+    """一条 IDLE 命令的收发
+
+    imaplib（Python 3.14 之前）没有 IDLE，命令的标签和 IDLE 期间的读写都集中在这里，
+    依赖的 imaplib 内部接口只有以下几项：
+    - IMAP4._new_tag()：分配标签；分配后立即从 tagged_commands 中移除，
+      imaplib 不会等待或处理这条命令的结束响应，由本类读取
+    - IMAP4.sock：IDLE 期间直接读取套接字，以便用 select 实现超时；
+      SSL 连接使用 sock.pending() 检查已解密但未读取的数据
+    - IMAP4.send()：发送原始命令行
+
+    IDLE 期间不经过 imaplib 的缓冲文件读取，imaplib 此时不能有未读完的响应，
+    结束后也不能在缓冲区留下数据，因此连接不能启用压缩（COMPRESS）。
+    """
+
+    def __init__(self, imap: imaplib.IMAP4, response_timeout: float):
+        """初始化 IDLE 命令
+
+        Args:
+            imap: 已选择邮箱的 imaplib 连接
+            response_timeout: 等待服务器命令响应的超时秒数
+        """
+        self.imap = imap
+        self.response_timeout = response_timeout
+        self.tag: Optional[bytes] = None
+        self._buffer = b''
+
+    def start(self) -> List[bytes]:
+        """发送 IDLE 并等待服务器的继续响应
+
+        服务器可以在继续响应之前发送未经请求的响应（如其他会话引起的 EXISTS、FETCH FLAGS），
+        这些响应返回给调用方处理。
+
+        Returns:
+            List[bytes]: 继续响应之前收到的未经请求响应
+
+        Raises:
+            imaplib.IMAP4.abort: 等待超时、连接断开或收到 BYE 时抛出
+            imaplib.IMAP4.error: 服务器以 NO/BAD 拒绝 IDLE 时抛出
+        """
+        self.tag = self.imap._new_tag()
+        self.imap.tagged_commands.pop(self.tag, None)
+        self._buffer = b''
+        self.imap.send(self.tag + b' IDLE\r\n')
+        untagged = []
+        while True:
+            line = self.read_line(self.response_timeout)
+            if line is None:
+                raise imaplib.IMAP4.abort("等待IDLE继续响应超时")
+            if line.startswith(b'+'):
+                return untagged
+            if line.startswith(self.tag + b' '):
+                raise imaplib.IMAP4.error("IDLE 未被服务器接受: %s"
+                                          % line.decode('utf-8', errors='replace').strip())
+            if line.startswith(b'* BYE'):
+                raise imaplib.IMAP4.abort(line.decode('utf-8', errors='replace').strip())
+            untagged.append(line)
+
+    def done(self) -> Iterator[bytes]:
+        """发送 DONE 结束 IDLE，逐行返回结束响应之前的未经请求响应
+
+        Returns:
+            Iterator[bytes]: 未经请求的响应行
+
+        Raises:
+            imaplib.IMAP4.abort: 等待结束响应超时或连接断开时抛出
+            imaplib.IMAP4.error: 服务器以 NO/BAD 结束 IDLE 时抛出
+        """
+        self.imap.send(b'DONE\r\n')
+        while True:
+            line = self.read_line(self.response_timeout)
+            if line is None:
+                raise imaplib.IMAP4.abort("等待IDLE结束响应超时")
+            if line.startswith(self.tag + b' '):
+                if not line[len(self.tag) + 1:].upper().startswith(b'OK'):
+                    raise imaplib.IMAP4.error(line.decode('utf-8', errors='replace').strip())
+                return
+            yield line
+
+    def read_line(self, timeout: float) -> Optional[bytes]:
+        """在IDLE期间从套接字读取一行
+
+        Args:
+            timeout: 最长等待秒数
+
+        Returns:
+            Optional[bytes]: 读取到的一行（含换行符），超时返回None
+
+        Raises:
+            imaplib.IMAP4.abort: 连接被关闭时抛出
+        """
+        sock = self.imap.sock
+        deadline = time.monotonic() + timeout
+        while b'\n' not in self._buffer:
+            pending = getattr(sock, 'pending', None)
+            if not (pending and pending()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                readable, _, _ = select.select([sock], [], [], remaining)
+                if not readable:
+                    return None
+            try:
+                data = sock.recv(65536)
+            except (socket.timeout, BlockingIOError):
+                continue
+            if not data:
+                raise imaplib.IMAP4.abort("服务器关闭了连接")
+            self._buffer += data
+
+        line, _, self._buffer = self._buffer.partition(b'\n')
+        return line + b'\n'
+
+
+class IdleListener:
+    """IMAP IDLE 推送监听器
+
+    主要功能：
+    1. 使用独立的邮箱会话在 INBOX 上保持 IDLE 状态
+    2. 邮件数（EXISTS）增加或 RECENT 不为0时立即触发邮件处理，
+       其他会话删除或移走邮件引起的 EXISTS 变化不触发
+    3. 在服务器超时之前重新发起 IDLE
+    4. 连接断开时自动重连
+    5. 服务器不支持 IDLE 时返回，由调用方回退到定时轮询
+    """
+
+    _UNTAGGED_RE = re.compile(rb'^\* (\d+) (EXISTS|RECENT|EXPUNGE)\b', re.IGNORECASE)
+
+    # 等待服务器命令响应的超时秒数
+    RESPONSE_TIMEOUT = 30
+
+    def __init__(self, email_service: EmailService, callback: Callable[[], None],
+                 idle_timeout: int = EMAIL_IDLE_TIMEOUT,
+                 reconnect_delay: int = EMAIL_IDLE_RECONNECT_DELAY,
+                 mailbox: str = 'INBOX',
+                 on_timeout: Optional[Callable[[], None]] = None):
+        """初始化IDLE监听器
+
+        Args:
+            email_service: 专用于IDLE的邮件服务实例，不应与处理流程共享连接
+            callback: 收到新邮件通知时调用的处理函数
+            idle_timeout: 单次IDLE的最长秒数，应小于服务器的30分钟超时
+            reconnect_delay: 连接失败后的重连等待秒数
+            mailbox: 监听的邮箱文件夹
+            on_timeout: 每次IDLE超时（无新邮件）后调用，例如为处理会话保活
+        """
+        self.logger = LogHandler().get_logger('IdleListener', file_level='DEBUG', console_level='INFO')
+        self.email_service = email_service
+        # IDLE期间直接读取套接字，不能与压缩流同时使用；IDLE会话的数据量也很小
+        self.email_service.compress = False
+        self.callback = callback
+        self.idle_timeout = idle_timeout
+        self.reconnect_delay = reconnect_delay
+        self.mailbox = mailbox
+        self.on_timeout = on_timeout
+        self._stop_event = Event()
+        # 所选邮箱当前的邮件数，由 SELECT 和 EXISTS/EXPUNGE 响应维护
+        self._exists: Optional[int] = None
+
+    def stop(self):
+        """请求停止监听，当前IDLE最迟在一个检查周期后结束"""
+        self._stop_event.set()
+
+    def supports_idle(self) -> bool:
+        """检查服务器是否支持IDLE
+
+        Returns:
+            bool: 支持返回True，否则返回False
+        """
+        imap = self.email_service._imap
+        return imap is not None and 'IDLE' in imap.capabilities
+
+    def run(self) -> bool:
+        """持续监听新邮件，直到调用 stop()
+
+        每次（重新）建立会话后都会先执行一次回调，避免遗漏断线期间到达的邮件。
+
+        Returns:
+            bool: 正常停止返回True；服务器不支持IDLE时返回False
+        """
+        while not self._stop_event.is_set():
+            try:
+                self._open_session()
+                if not self.supports_idle():
+                    self.logger.warning("邮箱服务器不支持IDLE")
+                    self._close_session()
+                    return False
+
+                self.logger.info("已进入IDLE推送模式: %s", self.mailbox)
+                self._run_callback()
+
+                while not self._stop_event.is_set():
+                    if self.wait_for_changes(self.idle_timeout):
+                        self.logger.info("收到新邮件通知")
+                        self._run_callback()
+                    elif self.on_timeout and not self._stop_event.is_set():
+                        self._run_callback(self.on_timeout)
+            except (imaplib.IMAP4.abort, imaplib.IMAP4.error, OSError) as e:
+                self.logger.warning("IDLE会话中断，%d 秒后重连: %s",
+                                    self.reconnect_delay, LogHandler.format_error(e))
+                self._close_session()
+                self._stop_event.wait(self.reconnect_delay)
+            finally:
+                if self._stop_event.is_set():
+                    self._close_session()
+        return True
+
+    def wait_for_changes(self, timeout: float) -> bool:
+        """发起一次IDLE并等待新邮件通知
+
+        收到新邮件通知或到达超时后发送 DONE 结束IDLE。
+
+        Args:
+            timeout: 最长等待秒数
+
+        Returns:
+            bool: 收到新邮件通知返回True，超时返回False
+
+        Raises:
+            imaplib.IMAP4.abort: 连接断开或服务器返回异常响应时抛出
+        """
+        command = IdleCommand(self.email_service._imap, self.RESPONSE_TIMEOUT)
+        changed = False
+        for line in command.start():
+            self.logger.debug("IDLE响应: %s", line.strip())
+            if self._is_new_mail(line):
+                changed = True
+
+        deadline = time.monotonic() + timeout
+        while not changed and not self._stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # 分段等待，以便及时响应 stop()
+            line = command.read_line(min(remaining, 1.0))
+            if line is None:
+                continue
+            self.logger.debug("IDLE响应: %s", line.strip())
+            if self._is_new_mail(line):
+                changed = True
+                break
+            if line.startswith(b'* BYE'):
+                raise imaplib.IMAP4.abort(line.decode('utf-8', errors='replace').strip())
+
+        for line in command.done():
+            if self._is_new_mail(line):
+                changed = True
+        return changed
+
+    def _is_new_mail(self, line: bytes) -> bool:
+        """根据未经请求的响应更新邮件数，判断是否有新邮件
+
+        Args:
+            line: 服务器响应行
+
+        Returns:
+            bool: EXISTS 大于已知邮件数或 RECENT 不为0时返回True
+        """
+        match = self._UNTAGGED_RE.match(line)
+        if not match:
+            return False
+        count, kind = int(match.group(1)), match.group(2).upper()
+        if kind == b'EXPUNGE':
+            if self._exists:
+                self._exists -= 1
+            return False
+        if kind == b'RECENT':
+            return count > 0
+        grew = self._exists is None or count > self._exists
+        self._exists = count
+        return grew
+
+    def _open_session(self):
+        """建立IDLE专用会话并选择邮箱"""
+        self._close_session()
+        self.email_service.connect()
+        _, data = self.email_service.select_folder(self.mailbox)
+        try:
+            self._exists = int(data[0])
+        except (TypeError, ValueError, IndexError):
+            self._exists = None
+
+    def _close_session(self):
+        """关闭IDLE专用会话"""
+        self._exists = None
+        self.email_service.disconnect()
+
+    def _run_callback(self, callback: Optional[Callable[[], None]] = None):
+        """执行回调，回调异常不影响IDLE会话"""
+        try:
+            (callback or self.callback)()
+        except Exception as e:
+            self.logger.error("处理新邮件时出错: %s", LogHandler.format_error(e))
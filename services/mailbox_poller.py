@@ -0,0 +1,249 @@
+import os
+import time
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Iterator
+from models.email_message import EmailMessage
+from services.email_service import EmailService
+from services.rule_processor import RuleProcessor
+from utils.sync_state_store import SyncStateStore
+from utils.attachment_store import AttachmentStore
+from utils.log_handler import LogHandler
+from config import (
+    EMAIL_ADDRESS, EMAIL_PASSWORD, EMAIL_FOLDERS, EMAIL_SOURCES_PATH,
+    EMAIL_POLL_WORKERS, EMAIL_SYNC_STATE_PATH, EMAIL_HEADER_CACHE_PATH,
+    ATTACHMENT_DEDUP, ATTACHMENT_STORE_PATH
+)
+
+class MailboxPoller:
+    """多邮箱、多文件夹并发轮询
+
+    主要功能：
+    1. 从配置加载邮箱账号和文件夹列表，每个（账号, 文件夹）对应一个来源
+    2. 每个来源使用独立的 EmailService 和连接，在线程池中并发获取未读邮件
+    3. 将各来源的结果按 Message-ID 去重后合并为一个列表
+    4. 对 EmailProcessor 提供与 EmailService 相同的接口，按邮件来源转发操作
+
+    同一封邮件出现在多个来源时只处理一次，处理完成后所有副本都会设置处理标志。
+    """
+
+    def __init__(self, rule_processor: RuleProcessor, sources: List[Dict[str, Any]],
+                 max_workers: int = EMAIL_POLL_WORKERS):
+        """初始化轮询器
+
+        Args:
+            rule_processor: 规则处理器实例
+            sources: 来源列表，每项包含 account（账号配置）和 folder
+            max_workers: 并发轮询的线程数
+        """
+        self.logger = LogHandler().get_logger('MailboxPoller', file_level='DEBUG', console_level='INFO')
+        sync_store = SyncStateStore(EMAIL_SYNC_STATE_PATH, EMAIL_HEADER_CACHE_PATH)
+        attachment_store = AttachmentStore(ATTACHMENT_STORE_PATH) if ATTACHMENT_DEDUP else None
+        self.services: Dict[str, EmailService] = {}
+        for source in sources:
+            service = EmailService(rule_processor, source['account'], source['folder'],
+                                   sync_store, attachment_store)
+            self.services[service.source] = service
+        self._executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(self.services))),
+                                            thread_name_prefix='MailboxPoller')
+        self._copies: Dict[int, List[EmailMessage]] = {}
+        self.last_poll: Dict[str, Any] = {}
+
+    @staticmethod
+    def load_sources() -> List[Dict[str, Any]]:
+        """加载来源配置
+
+        默认账号（EMAIL_ADDRESS）检查 EMAIL_FOLDERS 中的文件夹；
+        EMAIL_SOURCES_PATH 文件中的 accounts 列表可追加其他账号，例如：
+
+            accounts:
+              - email: "wanghq@h-sun.com"
+                password_env: "WANGHQ_PASSWORD"
+                folders: ["INBOX", "供应商"]
+
+        账号的 server、port、use_ssl 未配置时使用默认账号的设置，
+        密码从 password_env 指定的环境变量读取。
+
+        Returns:
+            List[Dict[str, Any]]: 来源列表，每项包含 account 和 folder
+
+        Raises:
+            Exception: 配置文件格式错误时抛出
+        """
+        accounts = []
+        if EMAIL_ADDRESS:
+            accounts.append(({'email': EMAIL_ADDRESS, 'password': EMAIL_PASSWORD}, EMAIL_FOLDERS))
+
+        if os.path.exists(EMAIL_SOURCES_PATH):
+            with open(EMAIL_SOURCES_PATH, 'r', encoding='utf-8') as f:
+                config = yaml.safe_load(f) or {}
+            for entry in config.get('accounts') or []:
+                account = {key: entry[key] for key in ('email', 'server', 'port', 'use_ssl')
+                           if entry.get(key) is not None}
+                if entry.get('password_env'):
+                    account['password'] = os.getenv(entry['password_env'])
+                accounts.append((account, entry.get('folders') or ['INBOX']))
+
+        sources, seen = [], set()
+        for account, folders in accounts:
+            for folder in folders:
+                key = (account.get('email'), folder)
+                if key not in seen:
+                    seen.add(key)
+                    sources.append({'account': account, 'folder': folder})
+        return sources
+
+    def get_unread_emails(self) -> List[EmailMessage]:
+        """并发获取所有来源的未读邮件
+
+        单个来源失败只记录日志，不影响其他来源。
+
+        Returns:
+            List[EmailMessage]: 按 Message-ID 去重后的邮件列表，按来源配置顺序排列
+
+        Raises:
+            Exception: 所有来源都获取失败时抛出
+        """
+        start = time.monotonic()
+        futures = {key: self._executor.submit(service.get_unread_emails)
+                   for key, service in self.services.items()}
+
+        email_list, copies, failed = [], {}, []
+        for key, future in futures.items():
+            try:
+                emails = future.result()
+            except Exception as e:
+                self.logger.error("获取未读邮件失败 [%s]: %s", key, LogHandler.format_error(e))
+                failed.append(key)
+                continue
+            for email_msg in emails:
+                dedup_key = email_msg.message_id.strip() or f"{key}#{email_msg.uid.decode()}"
+                if dedup_key in copies:
+                    copies[dedup_key].append(email_msg)
+                    continue
+                copies[dedup_key] = [email_msg]
+                email_list.append(email_msg)
+
+        if failed and len(failed) == len(self.services):
+            raise Exception("所有邮箱来源都获取失败")
+
+        # 以保留的邮件为键记录其他来源中的副本
+        self._copies = {id(group[0]): group[1:] for group in copies.values() if len(group) > 1}
+        duplicates = sum(len(group) for group in self._copies.values())
+        self.last_poll = {
+            'sources': len(self.services),
+            'failed': failed,
+            'emails': len(email_list),
+            'duplicates': duplicates,
+            'elapsed': round(time.monotonic() - start, 3)
+        }
+        if duplicates:
+            self.logger.info("合并 %d 个来源的邮件，去除重复 %d 封", len(self.services), duplicates)
+        return email_list
+
+    def iter_unread_emails(self) -> Iterator[EmailMessage]:
+        """逐封返回所有来源的未读邮件
+
+        去重需要各来源的完整结果，因此先并发获取全部邮件头，再逐封返回。
+
+        Raises:
+            Exception: 所有来源都获取失败时抛出
+        """
+        return iter(self.get_unread_emails())
+
+    def _service(self, email_msg: EmailMessage) -> EmailService:
+        """返回邮件所在来源的邮件服务"""
+        return self.services[email_msg.source]
+
+    def download_attachments_batch(self, jobs: List[Tuple[EmailMessage, Dict[str, Any]]]) -> List[List[str]]:
+        """按来源分组，各来源并发下载附件
+
+        Args:
+            jobs: (邮件, 规则) 列表
+
+        Returns:
+            List[List[str]]: 与 jobs 一一对应的附件路径列表
+        """
+        groups: Dict[str, List[int]] = {}
+        for index, (email_msg, _) in enumerate(jobs):
+            groups.setdefault(email_msg.source, []).append(index)
+
+        futures = {key: self._executor.submit(self.services[key].download_attachments_batch,
+                                              [jobs[i] for i in indices])
+                   for key, indices in groups.items()}
+        results: List[List[str]] = [[] for _ in jobs]
+        for key, future in futures.items():
+            try:
+                for index, files in zip(groups[key], future.result()):
+                    results[index] = files
+            except Exception as e:
+                self.logger.error("下载附件失败 [%s]: %s", key, LogHandler.format_error(e))
+        return results
+
+    def load_full_message(self, email_msg: EmailMessage) -> bool:
+        """从邮件所在来源加载完整邮件内容"""
+        return self._service(email_msg).load_full_message(email_msg)
+
+    def mark_as_read(self, email_msg: EmailMessage):
+        """将邮件及其在其他来源中的副本标记为已读"""
+        for copy in [email_msg] + self._copies.get(id(email_msg), []):
+            self._service(copy).mark_as_read(copy)
+
+    def stage_processed(self, email_msg: EmailMessage):
+        """登记处理完成的邮件及其在其他来源中的副本"""
+        for copy in [email_msg] + self._copies.get(id(email_msg), []):
+            self._service(copy).stage_processed(copy)
+
+    def commit_processed_flags(self) -> Dict[str, List[bytes]]:
+        """并发提交各来源的处理标志
+
+        Returns:
+            Dict[str, List[bytes]]: 各来源结果合并后的 committed 和 failed
+        """
+        result = {'committed': [], 'failed': []}
+        for source_result in self._executor.map(lambda s: s.commit_processed_flags(),
+                                                self.services.values()):
+            result['committed'].extend(source_result['committed'])
+            result['failed'].extend(source_result['failed'])
+        return result
+
+    def stage_archive(self, email_msg: EmailMessage, folder: str):
+        """登记移入归档文件夹的邮件及其在其他来源中的副本"""
+        for copy in [email_msg] + self._copies.get(id(email_msg), []):
+            self._service(copy).stage_archive(copy, folder)
+
+    def commit_archive_moves(self) -> Dict[str, List[bytes]]:
+        """并发将各来源已登记的邮件移入归档文件夹
+
+        Returns:
+            Dict[str, List[bytes]]: 各来源结果合并后的 moved 和 failed
+        """
+        result = {'moved': [], 'failed': []}
+        for source_result in self._executor.map(lambda s: s.commit_archive_moves(),
+                                                self.services.values()):
+            result['moved'].extend(source_result['moved'])
+            result['failed'].extend(source_result['failed'])
+        return result
+
+    def release(self):
+        """结束一个处理周期，释放各来源的连接"""
+        for service in self.services.values():
+            service.release()
+
+    def keepalive(self):
+        """保持各来源的连接"""
+        for service in self.services.values():
+            service.keepalive()
+
+    def disconnect(self):
+        """断开所有来源的连接并停止线程池"""
+        for service in self.services.values():
+            service.disconnect()
+        self._executor.shutdown(wait=False)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """返回最近一次轮询和各来源的运行指标"""
+        return {
+            'last_poll': dict(self.last_poll),
+            'sources': {key: service.get_metrics() for key, service in self.services.items()}
+        }
@@ -0,0 +1,202 @@
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+from models.email_message import EmailMessage
+from utils.imap_helper import ImapHelper
+from utils.sync_state_store import SyncStateStore
+from utils.log_handler import LogHandler
+
+class MailboxSync:
+    """基于UID的增量邮箱同步引擎
+
+    主要功能：
+    1. 持久化每个文件夹的 UIDVALIDITY、UIDNEXT 和 HIGHESTMODSEQ
+    2. 邮箱无变化时直接复用上次的候选邮件列表，不发送 SEARCH
+    3. 服务器支持 CONDSTORE 时只搜索已缓存或 MODSEQ 变化的邮件
+    4. 不支持 CONDSTORE 时只搜索已缓存的邮件和上次 UIDNEXT 之后的新邮件
+    5. 候选邮件按 header_batch_size 分窗逐封返回，已获取过的邮件头从本地缓存读取，
+       只对新邮件发送 UID FETCH；邮件头缓存按窗口读写，不一次载入内存
+    6. UIDVALIDITY、搜索条件（不含每天变化的 SINCE 日期）或回溯天数变化时清除状态并完整重新同步；
+       只有 SINCE 日期变化时按增量方式重新检查已缓存的邮件，移出时间窗口的邮件随之清除
+
+    不支持 CONDSTORE 时，上次同步时不满足条件、之后标志又变为满足条件的旧邮件
+    （如已读后又被标为未读）要等到下次完整同步才会发现。
+    """
+
+    def __init__(self, email_service, store: SyncStateStore):
+        """初始化同步引擎
+
+        Args:
+            email_service: 邮件服务实例，提供连接、搜索和邮件头获取
+            store: 同步状态存储
+        """
+        self.logger = LogHandler().get_logger('MailboxSync', file_level='DEBUG', console_level='INFO')
+        self.email_service = email_service
+        self.store = store
+        self.last_sync: Dict[str, Any] = {}
+        self._condstore_imap = None
+
+    def _state_key(self, folder: str) -> str:
+        """生成文件夹状态键"""
+        return f"{self.email_service.email}@{self.email_service.server}/{folder}"
+
+    def _enable_condstore(self):
+        """在选择文件夹前启用 CONDSTORE（每个连接一次）"""
+        imap = self.email_service._imap
+        if imap is self._condstore_imap:
+            return
+        if 'CONDSTORE' in imap.capabilities and 'ENABLE' in imap.capabilities and imap.state == 'AUTH':
+            try:
+                imap.enable('CONDSTORE')
+                self._condstore_imap = imap
+            except Exception as e:
+                self.logger.debug("启用 CONDSTORE 失败: %s", LogHandler.format_error(e))
+
+    def _response_int(self, code: str) -> Optional[int]:
+        """读取 SELECT 返回的数值型响应码"""
+        _, data = self.email_service._imap.response(code)
+        try:
+            return int(data[0]) if data and data[0] is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def sync(self, folder: str = 'INBOX') -> Iterator[EmailMessage]:
+        """同步文件夹并逐封返回候选邮件
+
+        选择文件夹和搜索在调用时完成，失败时直接抛出；邮件头在迭代时按窗口获取，
+        迭代结束后才保存同步状态，中途停止时下次仍从上次的状态同步。
+
+        Args:
+            folder: 文件夹名称
+
+        Returns:
+            Iterator[EmailMessage]: 满足搜索条件的邮件（按UID升序）
+        """
+        self._enable_condstore()
+        self.email_service.select_folder(folder)
+        uidvalidity = self._response_int('UIDVALIDITY')
+        uidnext = self._response_int('UIDNEXT')
+        highestmodseq = self._response_int('HIGHESTMODSEQ')
+
+        key = self._state_key(folder)
+        criteria = self.email_service.build_search_criteria()
+        # 缓存键不含 SINCE 日期，否则每天第一次同步都会变成完整同步
+        signature = self.email_service.build_search_criteria(window=False)
+        look_back = self.email_service.days_look_back
+        state = self.store.get(key)
+
+        if state and state.get('uidvalidity') != uidvalidity:
+            self.logger.info("文件夹 [%s] UIDVALIDITY 已变化 (%s -> %s)，重新完整同步",
+                             folder, state.get('uidvalidity'), uidvalidity)
+            state = {}
+        elif state and (state.get('criteria') != signature or state.get('look_back') != look_back):
+            self.logger.debug("文件夹 [%s] 搜索条件已变化，重新完整同步", folder)
+            state = {}
+        if not state:
+            # UIDVALIDITY 变化后同一UID可能是另一封邮件，缓存的邮件头不能再用
+            self.store.clear_headers(key)
+
+        cached_uids = [uid.encode() for uid in state.get('unread', [])]
+        # SINCE 日期变化后需要重新检查已缓存的邮件
+        window_moved = state.get('search') != criteria
+        unchanged = (state and not window_moved and uidnext is not None and highestmodseq is not None
+                     and uidnext == state.get('uidnext')
+                     and highestmodseq == state.get('highestmodseq'))
+
+        if unchanged:
+            mode = 'unchanged'
+            uids = cached_uids
+        elif state and highestmodseq is not None and state.get('highestmodseq') is not None:
+            # 候选集 = 满足条件且（已缓存 或 上次同步后有变化）的邮件
+            mode = 'incremental'
+            changed = 'MODSEQ %d' % (state['highestmodseq'] + 1)
+            if cached_uids:
+                changed = 'OR UID %s %s' % (ImapHelper.build_sequence_set(cached_uids), changed)
+            uids = self.email_service._search_candidate_uids(f"{criteria} {changed}")
+        elif state and uidnext is not None and state.get('uidnext') is not None:
+            # 不支持 CONDSTORE：候选集 = 满足条件且（已缓存 或 UID 不小于上次的 UIDNEXT）的邮件
+            uids, mode = self._search_new_uids(criteria, cached_uids, state['uidnext'], uidnext)
+        else:
+            mode = 'full'
+            uids = self.email_service._search_candidate_uids(criteria)
+
+        self.last_sync = {'mode': mode, 'candidates': len(uids), 'cached': 0, 'fetched': 0}
+        # 只保留当前候选邮件，已读或已删除的邮件随之清除
+        new_state = {
+            'uidvalidity': uidvalidity,
+            'uidnext': uidnext,
+            'highestmodseq': highestmodseq,
+            'criteria': signature,
+            'look_back': look_back,
+            'search': criteria,
+            'unread': [uid.decode() for uid in uids]
+        }
+        return self._iter_windows(folder, key, uids, new_state)
+
+    def _iter_windows(self, folder: str, key: str, uids: List[bytes],
+                      new_state: Dict[str, Any]) -> Iterator[EmailMessage]:
+        """按 header_batch_size 分窗获取邮件头并逐封返回，全部返回后保存同步状态
+
+        Args:
+            folder: 文件夹名称
+            key: 文件夹状态键
+            uids: 候选邮件UID（升序）
+            new_state: 迭代结束后保存的同步状态
+        """
+        for window in ImapHelper.chunked(uids, max(1, self.email_service.header_batch_size)):
+            headers = self.store.get_headers(key, window)
+            missing = [uid for uid in window if uid not in headers]
+            fetched = {}
+            for email_msg in self.email_service._fetch_headers(missing):
+                fetched[email_msg.uid] = email_msg
+            if fetched:
+                self.store.put_headers(key, {uid: self._header_fields(email_msg)
+                                             for uid, email_msg in fetched.items()})
+            self.last_sync['cached'] += len(window) - len(missing)
+            self.last_sync['fetched'] += len(missing)
+
+            for uid in window:
+                if uid in fetched:
+                    yield fetched[uid]
+                elif uid in headers:
+                    yield EmailMessage(uid=uid, **headers[uid])
+
+        self.store.prune_headers(key, uids)
+        self.store.put(key, new_state)
+        self.logger.debug("文件夹 [%s] 同步完成: %s", folder, self.last_sync)
+
+    @staticmethod
+    def _header_fields(email_msg: EmailMessage) -> Dict[str, str]:
+        """提取缓存的邮件头字段
+
+        原始邮件头含无法解码的字节时，发件人等字段是 email.header.Header 对象，
+        转换为字符串后才能写入缓存。
+        """
+        return {name: str(value) if value is not None else ''
+                for name, value in (('subject', email_msg.subject),
+                                    ('sender', email_msg.sender),
+                                    ('to', email_msg.to),
+                                    ('message_id', email_msg.message_id),
+                                    ('date', email_msg.date))}
+
+    def _search_new_uids(self, criteria: str, cached_uids: List[bytes], last_uidnext: int,
+                         uidnext: int) -> Tuple[List[bytes], str]:
+        """不支持 CONDSTORE 时搜索已缓存的邮件和上次 UIDNEXT 之后的新邮件
+
+        Args:
+            criteria: SEARCH 条件
+            cached_uids: 上次同步的候选邮件UID
+            last_uidnext: 上次同步时的 UIDNEXT
+            uidnext: 本次 SELECT 返回的 UIDNEXT
+
+        Returns:
+            Tuple[List[bytes], str]: 候选邮件UID（升序）和同步方式
+        """
+        ranges = [ImapHelper.build_sequence_set(cached_uids)] if cached_uids else []
+        if uidnext != last_uidnext:
+            ranges.append('%d:*' % last_uidnext)
+        if not ranges:
+            # 没有新邮件也没有需要复核的缓存邮件
+            return [], 'unchanged'
+        uids = self.email_service._search_candidate_uids(f"{criteria} UID {','.join(ranges)}")
+        # n:* 在没有更大的 UID 时会匹配最大的那封旧邮件，需要排除
+        cached = set(cached_uids)
+        return [uid for uid in uids if uid in cached or int(uid) >= last_uidnext], 'uidnext'
@@ -0,0 +1,268 @@
+import time
+import asyncio
+import tempfile
+from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Optional, Union
+from models.email_message import EmailMessage
+from utils.async_imap import AsyncImapClient, AsyncImapError
+from utils.body_structure import BodyStructureParser
+from utils.imap_helper import ImapHelper
+from utils.log_handler import LogHandler
+
+class PipelinedDownloader:
+    """在一个异步 IMAP 连接上流水线下载附件段落
+
+    主要功能：
+    1. 一次发出整批邮件的 BODYSTRUCTURE 获取命令，不逐封等待往返
+    2. 附件段落的获取命令保持最多 depth 条在途，字面量按块写入临时文件
+    3. 段落接收完成后在单独的线程中解码保存，与后续段落的网络传输重叠
+    4. 按命令顺序保存，同名附件的覆盖结果与逐封下载一致
+
+    事件循环运行在后台线程中，连接在周期之间保持；
+    已在事件循环中的调用方可以直接 await download_async。
+    无法解析结构或下载中断的邮件返回None，由调用方按原方式下载。
+    """
+
+    def __init__(self, email_service, depth: int):
+        """初始化流水线下载器
+
+        Args:
+            email_service: 邮件服务实例，提供账号配置、规则判断和附件保存
+            depth: 同时在途的段落获取命令数
+        """
+        self.logger = LogHandler().get_logger('PipelinedDownloader', file_level='DEBUG', console_level='INFO')
+        self.email_service = email_service
+        self.depth = max(1, depth)
+        self.last_batch: Dict[str, Any] = {}
+        self._client: Optional[AsyncImapClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[Thread] = None
+        self._saver: Optional[ThreadPoolExecutor] = None
+        self._lock = Lock()
+
+    def download(self, jobs: List[Tuple[EmailMessage, Dict[str, Any]]]) -> List[Optional[List[str]]]:
+        """在后台事件循环中下载一批邮件的附件
+
+        Args:
+            jobs: (邮件, 规则) 列表
+
+        Returns:
+            List[Optional[List[str]]]: 与 jobs 一一对应的附件路径列表，需要回退的邮件为None
+        """
+        with self._lock:
+            loop = self._ensure_loop()
+            return asyncio.run_coroutine_threadsafe(self.download_async(jobs), loop).result()
+
+    async def download_async(self, jobs: List[Tuple[EmailMessage, Dict[str, Any]]]) -> List[Optional[List[str]]]:
+        """下载一批邮件的附件
+
+        Args:
+            jobs: (邮件, 规则) 列表
+
+        Returns:
+            List[Optional[List[str]]]: 与 jobs 一一对应的附件路径列表，需要回退的邮件为None
+        """
+        start = time.monotonic()
+        results: List[Optional[List[str]]] = [None] * len(jobs)
+        parts_total = 0
+        try:
+            client = await self._ensure_client()
+            plans = await self._fetch_structures(client, jobs)
+            for index, parts in enumerate(plans):
+                if parts is not None:
+                    jobs[index][0].attachment_hashes = []
+                    results[index] = []
+            parts_total = sum(len(p) for p in plans if p)
+            await self._fetch_parts(client, jobs, plans, results)
+        except (AsyncImapError, OSError) as e:
+            self.logger.warning("流水线下载中断，剩余邮件改为逐封下载: %s", LogHandler.format_error(e))
+            await self._close_client()
+        except Exception as e:
+            self.logger.error("流水线下载失败: %s", LogHandler.format_error(e))
+
+        stats = self._client.stats if self._client else {}
+        self.last_batch = {
+            'jobs': len(jobs),
+            'parts': parts_total,
+            'fallback': sum(1 for r in results if r is None),
+            'max_in_flight': stats.get('max_in_flight', 0),
+            'elapsed': round(time.monotonic() - start, 3)
+        }
+        self.logger.info("流水线下载 %d 封邮件的 %d 个附件段落，耗时 %.2f 秒",
+                         len(jobs), parts_total, self.last_batch['elapsed'])
+        return results
+
+    async def _fetch_structures(self, client: AsyncImapClient,
+                                jobs: List[Tuple[EmailMessage, Dict[str, Any]]]) -> List[Optional[List[Dict[str, Any]]]]:
+        """一次发出所有邮件的 BODYSTRUCTURE 命令，返回各邮件需要下载的段落
+
+        Returns:
+            List[Optional[List[Dict[str, Any]]]]: 各邮件匹配规则的附件段落，无法解析结构时为None
+        """
+        responses = await asyncio.gather(
+            *(client.uid('FETCH', email_msg.uid.decode(), '(UID BODYSTRUCTURE)') for email_msg, _ in jobs))
+        plans = []
+        for (email_msg, rule), (_, data) in zip(jobs, responses):
+            structure = BodyStructureParser.find_structure(data)
+            if not structure:
+                plans.append(None)
+                continue
+            plans.append([part for part in BodyStructureParser.iter_parts(structure)
+                          if part['disposition'] and part['filename']
+                          and self.email_service._is_wanted_attachment(rule, part['filename'])])
+        return plans
+
+    async def _fetch_parts(self, client: AsyncImapClient, jobs: List[Tuple[EmailMessage, Dict[str, Any]]],
+                           plans: List[Optional[List[Dict[str, Any]]]], results: List[Optional[List[str]]]):
+        """流水线获取附件段落，并按命令顺序交给保存线程
+
+        发送端在在途命令达到 depth 时等待；接收端按顺序等待每条命令完成，
+        提交保存后释放一个名额，保存与后续段落的传输同时进行。
+        全部段落保存完成的邮件才写入 results，中断时其余邮件保持为None。
+        """
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.depth)
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def produce():
+            for index, parts in enumerate(plans):
+                for part in parts or ():
+                    await slots.acquire()
+                    spool = tempfile.SpooledTemporaryFile(max_size=self.email_service.stream_threshold)
+                    task = asyncio.ensure_future(client.uid(
+                        'FETCH', jobs[index][0].uid.decode(), '(BODY.PEEK[%s])' % part['section'],
+                        literal_sink=lambda _, chunk, spool=spool: spool.write(chunk)))
+                    await queue.put((index, part, spool, task))
+            await queue.put(None)
+
+        saves: Dict[int, List[asyncio.Future]] = {}
+        for index, parts in enumerate(plans):
+            if parts:
+                results[index] = None
+                saves[index] = []
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                entry = await queue.get()
+                if entry is None:
+                    break
+                index, part, spool, task = entry
+                try:
+                    await task
+                except BaseException:
+                    spool.close()
+                    raise
+                finally:
+                    slots.release()
+                saves[index].append(loop.run_in_executor(self._saver, self._save_part, jobs[index], part, spool))
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+            while not queue.empty():
+                entry = queue.get_nowait()
+                if entry is not None:
+                    entry[2].close()
+                    entry[3].cancel()
+            # 已提交的保存照常完成，只有全部段落都已保存的邮件计为完成
+            for index, futures in saves.items():
+                paths = await asyncio.gather(*futures)
+                if any(path is False for path in paths):
+                    # 有段落无法解码，改为下载完整邮件
+                    results[index] = None
+                elif len(futures) == len(plans[index]):
+                    results[index] = [path for path in paths if path]
+
+    def _save_part(self, job: Tuple[EmailMessage, Dict[str, Any]], part: Dict[str, Any], spool) -> Union[str, bool, None]:
+        """在保存线程中解码并保存一个段落，内容无法解码时返回False"""
+        email_msg, rule = job
+        service = self.email_service
+        try:
+            spool.seek(0)
+            if part['size'] <= service.stream_threshold:
+                payload = service._decode_part(spool.read(), part['encoding'])
+                return service._save_attachment(rule, part['filename'], payload, email_msg)
+            chunks = iter(lambda: spool.read(service.stream_chunk_size), b'')
+            return service._save_attachment_stream(rule, part['filename'], chunks, part['encoding'], email_msg)
+        except ValueError as e:
+            self.logger.warning("附件段落解码失败 [%s]: %s", part['filename'], LogHandler.format_error(e))
+            return False
+        except Exception as e:
+            self.logger.error("保存附件段落失败 [%s]: %s", part['filename'], LogHandler.format_error(e))
+            return None
+        finally:
+            spool.close()
+
+    async def _ensure_client(self) -> AsyncImapClient:
+        """返回已登录并选择文件夹的连接，断开时重新建立"""
+        if self._client is not None and self._client.connected:
+            return self._client
+        service = self.email_service
+        client = AsyncImapClient(service.server, service.port, service.use_ssl, service.tls_sessions.context)
+        await client.connect()
+        await client.login(service.email, service.password)
+        await client.select(ImapHelper.encode_mailbox(service.folder))
+        self._client = client
+        self.logger.debug("流水线连接已建立: %s", service.source)
+        return client
+
+    async def _close_client(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """启动后台事件循环和保存线程"""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._thread = Thread(target=self._loop.run_forever, name='PipelinedDownloader', daemon=True)
+            self._thread.start()
+        if self._saver is None:
+            self._saver = ThreadPoolExecutor(max_workers=1, thread_name_prefix='PipelinedSaver')
+        return self._loop
+
+    def _run(self, coro):
+        """在后台事件循环中执行协程，事件循环未启动时直接关闭协程"""
+        if self._loop is None:
+            coro.close()
+            return None
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _noop(self):
+        if self._client is not None and self._client.connected:
+            try:
+                await self._client.command('NOOP')
+            except AsyncImapError as e:
+                self.logger.debug("流水线连接保活失败: %s", LogHandler.format_error(e))
+                await self._close_client()
+
+    async def _logout(self):
+        if self._client is not None:
+            await self._client.logout()
+            self._client = None
+
+    def release(self):
+        """结束一个处理周期，未启用持久会话时断开连接"""
+        if not self.email_service.persistent_session:
+            with self._lock:
+                self._run(self._logout())
+
+    def keepalive(self):
+        """保持流水线连接"""
+        with self._lock:
+            self._run(self._noop())
+
+    def close(self):
+        """断开连接并停止事件循环和保存线程"""
+        with self._lock:
+            self._run(self._logout())
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(timeout=5)
+                self._loop.close()
+                self._loop = None
+                self._thread = None
+            if self._saver is not None:
+                self._saver.shutdown(wait=True)
+                self._saver = None
@@ -0,0 +1,297 @@
+import os
+import json
+import math
+import time
+from collections import deque
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from typing import List, Dict, Any, Optional, Deque
+from models.email_message import EmailMessage
+from utils.log_handler import LogHandler
+
+class PollScheduler:
+    """根据各规则邮件的到达规律调整轮询间隔
+
+    主要功能：
+    1. 按规则记录邮件到达时间（邮件头 Date），统计到一周内的各个时段（星期 × 时段）
+    2. 到达较多的时段缩短轮询间隔，没有邮件的时段放宽间隔，均限制在最小和最大间隔之间
+    3. 报告预计平均检测延迟（邮件到达到被检查到的时间）和实际测得的检测延迟
+
+    间隔与时段到达率的平方根成反比：在每周轮询次数与固定间隔相同的前提下，
+    这种分配使按到达量加权的平均检测延迟（间隔的一半）最小。
+    每个时段带有少量先验到达率，没有历史时各时段间隔都等于基础间隔；
+    历史按半衰期衰减，供应商的发信习惯变化后间隔随之调整。
+
+    历史以 JSON 文件保存，写入时先写临时文件再替换，避免中途退出导致文件损坏。
+    """
+
+    WEEK = 7 * 86400
+    # 每个时段每周的先验到达数
+    PRIOR_RATE = 0.05
+    # 相邻时段的平滑权重，减少到达时间落在时段边界附近造成的抖动
+    SMOOTHING = (0.25, 0.5, 0.25)
+    # 保留的实测检测延迟样本数
+    LATENCY_SAMPLES = 200
+    # 超过该秒数的检测延迟视为积压或发件人时钟错误，不计入实测值
+    MAX_LATENCY = 86400
+
+    def __init__(self, path: str, base_interval: float, min_interval: float, max_interval: float,
+                 slot_minutes: int = 30, half_life_days: float = 28):
+        """初始化轮询调度器
+
+        Args:
+            path: 到达历史文件路径
+            base_interval: 基础轮询间隔（秒），决定每周的轮询次数
+            min_interval: 最小轮询间隔（秒）
+            max_interval: 最大轮询间隔（秒）
+            slot_minutes: 统计时段的分钟数，需能整除一天
+            half_life_days: 到达历史的半衰期（天）
+        """
+        self.logger = LogHandler().get_logger('PollScheduler', file_level='DEBUG', console_level='INFO')
+        self.path = path
+        self.base_interval = float(base_interval)
+        self.min_interval = float(min(min_interval, max_interval))
+        self.max_interval = float(max(min_interval, max_interval))
+        self.slot_seconds = max(1, int(slot_minutes)) * 60
+        self.slots = self.WEEK // self.slot_seconds
+        self.half_life = half_life_days * 86400
+        self.latencies: Deque[float] = deque(maxlen=self.LATENCY_SAMPLES)
+        self._lock = Lock()
+        self._dirty = False
+        self._intervals: Optional[List[float]] = None
+        self._intervals_at = 0.0
+        self._state = self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        """从文件加载到达历史
+
+        Returns:
+            Dict[str, Any]: 历史状态，文件不存在、损坏或时段长度变化时返回新的状态
+        """
+        now = time.time()
+        empty = {'slot_seconds': self.slot_seconds, 'started': now, 'updated': now, 'rules': {}}
+        if not os.path.exists(self.path):
+            return empty
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except Exception as e:
+            self.logger.warning("加载到达历史失败，将重新统计: %s", LogHandler.format_error(e))
+            return empty
+        if state.get('slot_seconds') != self.slot_seconds:
+            self.logger.warning("统计时段长度已变化，到达历史将重新统计")
+            return empty
+        return state
+
+    def save(self):
+        """有新的到达记录时写入文件"""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._state, f)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except Exception as e:
+                self.logger.error("保存到达历史失败 [%s]: %s", self.path, LogHandler.format_error(e))
+
+    @staticmethod
+    def arrival_time(email_msg: EmailMessage) -> Optional[float]:
+        """解析邮件头 Date 得到到达时间
+
+        Returns:
+            Optional[float]: Unix 时间戳，缺失或无法解析时返回None
+        """
+        try:
+            arrived = parsedate_to_datetime(email_msg.date)
+        except (TypeError, ValueError, IndexError):
+            return None
+        if arrived is None:
+            return None
+        return arrived.timestamp()
+
+    def slot_of(self, timestamp: float) -> int:
+        """返回时间戳所在的时段（本地时间，从周一 0 点起）"""
+        moment = datetime.fromtimestamp(timestamp)
+        seconds = moment.weekday() * 86400 + moment.hour * 3600 + moment.minute * 60 + moment.second
+        return int(seconds // self.slot_seconds) % self.slots
+
+    def record_arrival(self, rule_name: str, email_msg: EmailMessage, now: Optional[float] = None):
+        """记录一封处理完成的邮件
+
+        到达时间早于当前的记录按半衰期折算权重；同时记录检测延迟。
+
+        Args:
+            rule_name: 匹配的规则名称
+            email_msg: 邮件对象
+            now: 检查到邮件的时间，默认为当前时间
+        """
+        now = time.time() if now is None else now
+        arrived = self.arrival_time(email_msg)
+        if arrived is None:
+            self.logger.debug("邮件没有可用的 Date，不计入到达历史: %s", email_msg.subject)
+            return
+        latency = now - arrived
+        if 0 <= latency <= self.MAX_LATENCY:
+            self.latencies.append(latency)
+        arrived = min(arrived, now)
+
+        with self._lock:
+            self._decay(now)
+            counts = self._state['rules'].setdefault(rule_name, [0.0] * self.slots)
+            counts[self.slot_of(arrived)] += 0.5 ** ((now - arrived) / self.half_life)
+            self._state['started'] = min(self._state['started'], arrived)
+            self._intervals = None
+            self._dirty = True
+
+    def _decay(self, now: float):
+        """按距上次更新的时间衰减全部计数"""
+        elapsed = now - self._state['updated']
+        if elapsed <= 0:
+            return
+        factor = 0.5 ** (elapsed / self.half_life)
+        for counts in self._state['rules'].values():
+            for i, value in enumerate(counts):
+                counts[i] = value * factor
+        self._state['updated'] = now
+
+    def _observed_weeks(self, now: float) -> float:
+        """按半衰期折算的有效统计周数，至少为1"""
+        age = max(0.0, now - self._state['started'])
+        effective = self.half_life / math.log(2) * (1 - 0.5 ** (age / self.half_life))
+        return max(1.0, effective / self.WEEK)
+
+    def _smoothed(self, counts: List[float]) -> List[float]:
+        """对时段计数做循环平滑"""
+        left, center, right = self.SMOOTHING
+        n = len(counts)
+        return [left * counts[i - 1] + center * counts[i] + right * counts[(i + 1) % n] for i in range(n)]
+
+    def rule_rates(self, now: Optional[float] = None) -> Dict[str, List[float]]:
+        """返回各规则每个时段每周的到达数（已平滑，不含先验）"""
+        now = time.time() if now is None else now
+        with self._lock:
+            weeks = self._observed_weeks(now)
+            factor = 0.5 ** (max(0.0, now - self._state['updated']) / self.half_life)
+            return {name: [value * factor / weeks for value in self._smoothed(counts)]
+                    for name, counts in self._state['rules'].items()}
+
+    def intervals(self, now: Optional[float] = None) -> List[float]:
+        """返回各时段的轮询间隔（秒）
+
+        间隔 = C / sqrt(到达率)，C 使每周轮询次数等于基础间隔下的次数，再限制在最小和最大间隔之间。
+        """
+        now = time.time() if now is None else now
+        if self._intervals is not None and abs(now - self._intervals_at) < self.slot_seconds:
+            return self._intervals
+        totals = [self.PRIOR_RATE] * self.slots
+        for rates in self.rule_rates(now).values():
+            for i, rate in enumerate(rates):
+                totals[i] += rate
+        roots = [math.sqrt(rate) for rate in totals]
+        scale = self.slot_seconds * sum(roots) * self.base_interval / self.WEEK
+        self._intervals = [min(self.max_interval, max(self.min_interval, scale / root)) for root in roots]
+        self._intervals_at = now
+        return self._intervals
+
+    def next_interval(self, now: Optional[float] = None) -> float:
+        """返回距下次检查的秒数
+
+        取当前时段的间隔；若间隔内会进入间隔更短的时段，则在该时段开始后按其间隔检查。
+
+        Args:
+            now: 当前时间，默认为当前时间
+
+        Returns:
+            float: 秒数，不小于最小间隔
+        """
+        now = time.time() if now is None else now
+        intervals = self.intervals(now)
+        slot = self.slot_of(now)
+        delay = intervals[slot]
+        boundary = self._slot_start(now) + self.slot_seconds
+        while boundary < now + delay:
+            slot = (slot + 1) % self.slots
+            delay = min(delay, boundary - now + intervals[slot])
+            boundary += self.slot_seconds
+        return max(self.min_interval, delay)
+
+    def _slot_start(self, timestamp: float) -> float:
+        """返回时间戳所在时段的开始时间"""
+        moment = datetime.fromtimestamp(timestamp)
+        seconds = moment.hour * 3600 + moment.minute * 60 + moment.second + moment.microsecond / 1e6
+        return timestamp - seconds % self.slot_seconds
+
+    def expected_latency(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """按到达历史估算平均检测延迟
+
+        到达时刻在轮询间隔内均匀分布时，平均检测延迟为间隔的一半，按各时段的到达量加权。
+
+        Returns:
+            Dict[str, Any]: 包含 overall（全部规则）、rules（各规则）、fixed（固定基础间隔时的值）、
+                polls_per_week 和 fixed_polls_per_week；没有历史时 overall 为None
+        """
+        intervals = self.intervals(now)
+        rates = self.rule_rates(now)
+
+        def weighted(values: List[float]) -> Optional[float]:
+            total = sum(values)
+            if total <= 0:
+                return None
+            return sum(v * i / 2 for v, i in zip(values, intervals)) / total
+
+        combined = [sum(column) for column in zip(*rates.values())] if rates else []
+        return {
+            'overall': weighted(combined) if combined else None,
+            'rules': {name: weighted(values) for name, values in rates.items()},
+            'fixed': self.base_interval / 2,
+            'polls_per_week': round(sum(self.slot_seconds / i for i in intervals)),
+            'fixed_polls_per_week': round(self.WEEK / self.base_interval)
+        }
+
+    def observed_latency(self) -> Dict[str, Any]:
+        """返回最近实测的检测延迟（邮件头 Date 到检查到邮件的秒数）
+
+        Returns:
+            Dict[str, Any]: 包含 samples、p50、p95，没有样本时 p50 和 p95 为None
+        """
+        values = sorted(self.latencies)
+        if not values:
+            return {'samples': 0, 'p50': None, 'p95': None}
+        return {'samples': len(values),
+                'p50': values[int(0.5 * (len(values) - 1))],
+                'p95': values[int(0.95 * (len(values) - 1))]}
+
+    def get_metrics(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """返回调度指标
+
+        Returns:
+            Dict[str, Any]: 包含 next_interval、expected（见 expected_latency）和 observed（见 observed_latency）
+        """
+        return {
+            'next_interval': round(self.next_interval(now)),
+            'expected': self.expected_latency(now),
+            'observed': self.observed_latency()
+        }
+
+    def report(self, now: Optional[float] = None) -> float:
+        """记录调度报告并返回距下次检查的秒数"""
+        delay = self.next_interval(now)
+        expected = self.expected_latency(now)
+        observed = self.observed_latency()
+        if expected['overall'] is None:
+            self.logger.info("下次检查在 %.0f 秒后（尚无到达历史，使用基础间隔）", delay)
+        else:
+            self.logger.info("下次检查在 %.0f 秒后；预计平均检测延迟 %.0f 秒（固定间隔 %.0f 秒），"
+                             "每周检查 %d 次（固定间隔 %d 次）", delay, expected['overall'], expected['fixed'],
+                             expected['polls_per_week'], expected['fixed_polls_per_week'])
+        if observed['samples']:
+            self.logger.info("实测检测延迟 p50 %.0f 秒，p95 %.0f 秒（%d 封）",
+                             observed['p50'], observed['p95'], observed['samples'])
+        return delay
@@ -0,0 +1,127 @@
+import time
+import heapq
+import itertools
+from typing import List, Dict, Any, Optional
+from models.email_message import EmailMessage
+from services.rule_processor import RuleProcessor
+from utils.log_handler import LogHandler
+
+class QueueEntry:
+    """优先级队列中的一封待下载邮件"""
+
+    __slots__ = ('email_msg', 'rule', 'class_name', 'priority', 'enqueued_at', 'started_at')
+
+    def __init__(self, email_msg: EmailMessage, rule: Dict[str, Any], class_name: str, priority: int):
+        self.email_msg = email_msg
+        self.rule = rule
+        self.class_name = class_name
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+
+
+class PriorityStage:
+    """规则匹配与附件下载之间的优先级队列
+
+    主要功能：
+    1. 按规则类别的 priority 排序，送货单等高优先级邮件先下载并交给后续处理
+    2. 同一优先级内保持邮件原顺序，同名附件的覆盖结果与逐封处理一致
+    3. 统计各类别的排队等待时间（匹配到开始下载）和交付时间（匹配到处理完成）
+    4. 交付时间超过类别期限（deadline）时记录警告
+    """
+
+    def __init__(self, rule_processor: RuleProcessor):
+        """初始化优先级队列
+
+        Args:
+            rule_processor: 规则处理器，提供规则类别
+        """
+        self.logger = LogHandler().get_logger('PriorityStage', file_level='DEBUG', console_level='INFO')
+        self.rule_processor = rule_processor
+        self._heap: List[Any] = []
+        self._counter = itertools.count()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, email_msg: EmailMessage, rule: Dict[str, Any]) -> QueueEntry:
+        """将匹配规则的邮件加入队列
+
+        Args:
+            email_msg: 邮件对象
+            rule: 匹配的规则
+
+        Returns:
+            QueueEntry: 队列项
+        """
+        class_name = self.rule_processor.get_rule_class(rule)
+        priority = self.rule_processor.rule_classes[class_name]['priority']
+        entry = QueueEntry(email_msg, rule, class_name, priority)
+        heapq.heappush(self._heap, (priority, next(self._counter), entry))
+        return entry
+
+    def pop_batch(self) -> List[QueueEntry]:
+        """取出当前最高优先级的全部邮件，按加入顺序返回
+
+        Returns:
+            List[QueueEntry]: 同一优先级的队列项，队列为空时返回空列表
+        """
+        if not self._heap:
+            return []
+        priority = self._heap[0][0]
+        batch = []
+        while self._heap and self._heap[0][0] == priority:
+            batch.append(heapq.heappop(self._heap)[2])
+        now = time.monotonic()
+        for entry in batch:
+            entry.started_at = now
+            stats = self._class_stats(entry.class_name)
+            wait = now - entry.enqueued_at
+            stats['waits'].append(wait)
+        return batch
+
+    def finish(self, entry: QueueEntry):
+        """记录邮件处理完成（包括送货单交给ERP录入），检查是否超过类别期限
+
+        Args:
+            entry: pop_batch 返回的队列项
+        """
+        elapsed = time.monotonic() - entry.enqueued_at
+        stats = self._class_stats(entry.class_name)
+        stats['handoffs'].append(elapsed)
+        deadline = self.rule_processor.rule_classes[entry.class_name]['deadline']
+        if deadline and elapsed > deadline:
+            stats['missed'] += 1
+            self.logger.warning("邮件 [%s] 超过 %s 类期限: %.1f 秒 > %.0f 秒",
+                                entry.email_msg.subject, entry.class_name, elapsed, deadline)
+
+    def _class_stats(self, class_name: str) -> Dict[str, Any]:
+        return self._stats.setdefault(class_name, {'waits': [], 'handoffs': [], 'missed': 0})
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """返回各类别的队列统计，并写入日志
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 类别名称到以下字段的映射：
+                count、wait_avg、wait_max（排队等待秒数）、handoff_max（交付秒数）、deadline、missed
+        """
+        report = {}
+        for class_name, stats in sorted(self._stats.items(),
+                                        key=lambda item: self.rule_processor.rule_classes[item[0]]['priority']):
+            waits = stats['waits']
+            if not waits:
+                continue
+            report[class_name] = {
+                'count': len(waits),
+                'wait_avg': round(sum(waits) / len(waits), 3),
+                'wait_max': round(max(waits), 3),
+                'handoff_max': round(max(stats['handoffs']), 3) if stats['handoffs'] else None,
+                'deadline': self.rule_processor.rule_classes[class_name]['deadline'],
+                'missed': stats['missed']
+            }
+            self.logger.info("队列 [%s] %d 封，平均等待 %.2f 秒，最长等待 %.2f 秒，最长交付 %.2f 秒，超期 %d 封",
+                             class_name, len(waits), report[class_name]['wait_avg'],
+                             report[class_name]['wait_max'], report[class_name]['handoff_max'] or 0,
+                             stats['missed'])
+        return report
@@ -1,6 +1,8 @@
 import re
 import yaml
-from typing import List, Dict, Any, Optional, Pattern
+from email.utils import parseaddr
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Pattern, Tuple
 from models.email_message import EmailMessage
 from utils.log_handler import LogHandler
 import os
@@ -13,8 +15,20 @@ class RuleProcessor:
     2. 编译和管理正则表达式模式
     3. 匹配邮件主题、发件人、收件人
     4. 匹配附件名称
+    5. 确定规则所属类别（处理优先级和期限）
+    6. 加载时按发件人地址和域名建立规则索引，每封邮件只检查可能匹配的规则
     """
 
+    # 配置文件未定义 classes 时使用的规则类别
+    DEFAULT_CLASSES = {
+        'shipping': {'priority': 0, 'deadline': 120, 'name_contains': '送货单'},
+        'wip': {'priority': 10, 'deadline': 1800}
+    }
+    # 未指定类别且名称不匹配任何类别时归入的类别
+    DEFAULT_CLASS = 'wip'
+    # 缓存候选规则的发件人数
+    CANDIDATE_CACHE_SIZE = 4096
+
     def __init__(self):
         """初始化规则处理器
         
@@ -29,10 +43,17 @@ class RuleProcessor:
         """
         self.rules = self._load_rules()
         self.logger = LogHandler().get_logger('RuleProcessor', file_level='DEBUG', console_level='INFO')
+        self.rule_classes = self._load_classes()
         self._compiled_patterns: Dict[str, List[Pattern]] = {}
+        # 发件人地址或域名 -> 规则下标
+        self._sender_index: Dict[str, Tuple[int, ...]] = {}
+        # 不限制发件人或发件人关键词不是地址/域名的规则下标，每封邮件都要检查
+        self._catch_all: Tuple[int, ...] = ()
+        self._candidates = lru_cache(maxsize=self.CANDIDATE_CACHE_SIZE)(self._lookup_candidates)
         
         try:
             self._compile_patterns()
+            self._build_index()
             self.logger.debug("已加载规则文件: %s", "config/email_rules.yaml")
         except Exception as e:
             self.logger.error("初始化规则处理器失败: %s", LogHandler.format_error(e))
@@ -58,6 +79,49 @@ class RuleProcessor:
             self.logger.error("加载规则配置失败: %s", LogHandler.format_error(e))
             return {}
 
+    def _load_classes(self) -> Dict[str, Dict[str, Any]]:
+        """加载规则类别配置
+        
+        Returns:
+            Dict[str, Dict[str, Any]]: 类别名称到 priority、deadline、name_contains 的映射，
+                配置文件未定义时返回 DEFAULT_CLASSES
+        """
+        try:
+            config_path = os.path.join("config", "email_rules.yaml")
+            with open(config_path, 'r', encoding='utf-8') as f:
+                classes = (yaml.safe_load(f) or {}).get('classes')
+        except Exception as e:
+            self.logger.error("加载规则类别配置失败: %s", LogHandler.format_error(e))
+            classes = None
+        if not classes:
+            classes = self.DEFAULT_CLASSES
+        return {name: {'priority': int(spec.get('priority', 0)),
+                       'deadline': float(spec.get('deadline', 0)),
+                       'name_contains': spec.get('name_contains')}
+                for name, spec in classes.items()}
+
+    def get_rule_class(self, rule: Dict[str, Any]) -> str:
+        """获取规则所属类别
+        
+        优先使用规则的 class 字段；未指定时按各类别的 name_contains 匹配规则名称，
+        都不匹配时归入 DEFAULT_CLASS。
+        
+        Args:
+            rule: 规则配置字典
+            
+        Returns:
+            str: 类别名称
+        """
+        name = rule.get('class')
+        if name in self.rule_classes:
+            return name
+        for class_name, spec in self.rule_classes.items():
+            if spec.get('name_contains') and spec['name_contains'] in rule['name']:
+                return class_name
+        if self.DEFAULT_CLASS in self.rule_classes:
+            return self.DEFAULT_CLASS
+        return max(self.rule_classes, key=lambda c: self.rule_classes[c]['priority'])
+
     def _compile_patterns(self):
         """预编译所有正则表达式模式
         
@@ -71,6 +135,72 @@ class RuleProcessor:
                 'attachment': [self._compile_pattern(p) for p in rule['attachment_name_pattern']]
             }
 
+    @staticmethod
+    def _sender_index_key(keyword: str) -> Optional[str]:
+        """返回发件人关键词的索引键
+        
+        完整邮箱地址（如 czmk4@hisemi.com.cn）按小写地址索引，域名（如 hisemi.com.cn 或
+        @hisemi.com.cn）按小写域名索引；其他关键词（如显示名片段）无法索引。
+        
+        Args:
+            keyword: 发件人关键词
+            
+        Returns:
+            Optional[str]: 索引键，无法索引时返回None
+        """
+        keyword = keyword.strip().lower()
+        if not keyword or any(ch in keyword for ch in ' <>",;'):
+            return None
+        local, at, domain = keyword.rpartition('@')
+        if '.' not in domain or domain.startswith('.') or domain.endswith('.'):
+            return None
+        if at and local:
+            return keyword
+        return domain
+
+    def _build_index(self):
+        """按发件人建立规则索引
+        
+        每个可索引的发件人关键词把规则登记到对应地址或域名下；不限制发件人的规则，
+        以及有不可索引关键词的规则归入 catch-all，每封邮件都检查。
+        """
+        index: Dict[str, List[int]] = {}
+        catch_all = []
+        for position, rule in enumerate(self.rules):
+            keys = [self._sender_index_key(k) for k in rule['sender_contains'] or []]
+            if not keys or None in keys:
+                catch_all.append(position)
+                continue
+            for key in keys:
+                if position not in index.setdefault(key, []):
+                    index[key].append(position)
+        self._sender_index = {key: tuple(positions) for key, positions in index.items()}
+        self._catch_all = tuple(catch_all)
+        self._candidates.cache_clear()
+        self.logger.debug("已建立规则索引: %d 个发件人地址或域名，%d 条规则每封邮件都检查",
+                          len(self._sender_index), len(self._catch_all))
+
+    def _lookup_candidates(self, sender: str) -> Tuple[int, ...]:
+        """返回发件人可能匹配的规则下标（按规则顺序）
+        
+        依次查找发件人的小写地址、域名及其上级域名（mail.hisemi.com.cn -> hisemi.com.cn -> com.cn），
+        再加上 catch-all 的规则。
+        
+        Args:
+            sender: 发件人（From 头）
+            
+        Returns:
+            Tuple[int, ...]: 规则下标
+        """
+        address = parseaddr(sender)[1].lower()
+        positions = set(self._catch_all)
+        if '@' in address:
+            positions.update(self._sender_index.get(address, ()))
+            labels = address.rpartition('@')[2].split('.')
+            for i in range(len(labels) - 1):
+                positions.update(self._sender_index.get('.'.join(labels[i:]), ()))
+        return tuple(sorted(positions))
+
     def _compile_pattern(self, pattern: str) -> Pattern:
         """编译单个正则表达式模式
         
@@ -153,7 +283,7 @@ class RuleProcessor:
     def get_matching_rule(self, email_msg: EmailMessage) -> Optional[Dict[str, Any]]:
         """获取匹配的规则配置
         
-        检查邮件是否匹配任一规则，返回第一个匹配的规则。
+        通过发件人索引只检查可能匹配的规则，返回规则文件中第一个匹配的规则。
         
         Args:
             email_msg: 邮件对象
@@ -161,7 +291,8 @@ class RuleProcessor:
         Returns:
             Optional[Dict[str, Any]]: 匹配的规则配置，如果没有匹配则返回None
         """
-        for rule in self.rules:
+        for position in self._candidates(str(email_msg.sender or '')):
+            rule = self.rules[position]
             if self._check_single_rule(rule, email_msg):
                 self.logger.debug("邮件 [%s] 匹配规则: %s", email_msg.subject, rule['name'])
                 return rule
@@ -191,6 +322,26 @@ class RuleProcessor:
             
         return True
 
+    def get_sender_keywords(self) -> Optional[List[str]]:
+        """获取所有规则的发件人关键词
+        
+        用于生成服务器端 SEARCH 条件。只要有一条规则没有限制发件人，
+        就无法在服务器端按发件人过滤。
+        
+        Returns:
+            Optional[List[str]]: 去重后的发件人关键词列表（小写），
+                存在不限制发件人的规则时返回None
+        """
+        keywords = []
+        for rule in self.rules:
+            if not rule['sender_contains']:
+                return None
+            for keyword in rule['sender_contains']:
+                keyword = keyword.strip().lower()
+                if keyword and keyword not in keywords:
+                    keywords.append(keyword)
+        return keywords
+
     def match_attachment_name(self, rule: Dict[str, Any], filename: str) -> bool:
         """检查附件名称是否匹配规则的模式
         
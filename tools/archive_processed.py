@@ -0,0 +1,91 @@
+"""已处理邮件归档
+
+将检查的文件夹中已设置处理标志（EMAIL_PROCESSED_FLAG）的邮件按匹配规则的 archive_folder
+分批移入归档文件夹，使收件箱只保留未处理的邮件，SEARCH 和完整同步的耗时不随历史邮件增长。
+每条 UID MOVE 包含 --batch-size 封邮件；服务器不支持 MOVE 时改为 UID COPY 后删除原邮件。
+
+用法：
+    python tools/archive_processed.py --dry-run
+    python tools/archive_processed.py --older-than 30 --batch-size 2000
+    python tools/archive_processed.py --folder INBOX --to 已处理
+"""
+import sys
+import os
+import argparse
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+# 将项目根目录添加到Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.email_service import EmailService
+from services.rule_processor import RuleProcessor
+from utils.imap_helper import ImapHelper
+from config import EMAIL_ARCHIVE_BATCH_SIZE
+
+
+def archive(service: EmailService, before: Optional[date] = None, default_folder: Optional[str] = None,
+            dry_run: bool = False) -> Dict[str, int]:
+    """将已处理邮件移入规则的归档文件夹
+
+    按 batch_size 封一组获取邮件头、匹配规则并移动，内存占用不随邮件数增长。
+
+    Args:
+        service: 已设置 archive_batch_size 的邮件服务，使用其检查的文件夹
+        before: 只移动该日期之前收到的邮件，为None时不限制
+        default_folder: 不匹配规则或规则未配置 archive_folder 的邮件移入的文件夹，为None时保留
+        dry_run: 只统计不移动
+
+    Returns:
+        Dict[str, int]: 包含 processed（已处理邮件数）、moved、failed 和 kept（保留在原文件夹）
+    """
+    stats = {'processed': 0, 'moved': 0, 'failed': 0, 'kept': 0}
+    service.ensure_selected()
+    uids = service.search_processed_uids(before)
+    stats['processed'] = len(uids)
+    print(f"文件夹 [{service.folder}] 中已处理邮件 {len(uids)} 封")
+
+    for chunk in ImapHelper.chunked(uids, service.archive_batch_size):
+        targets: Dict[str, List[bytes]] = {}
+        for email_msg in service._fetch_headers(chunk):
+            rule = service.rule_processor.get_matching_rule(email_msg)
+            folder = (rule or {}).get('archive_folder') or default_folder
+            if folder and folder != service.folder:
+                targets.setdefault(folder, []).append(email_msg.uid)
+            else:
+                stats['kept'] += 1
+        for folder, folder_uids in targets.items():
+            if dry_run:
+                print(f"将移动 {len(folder_uids)} 封邮件到 [{folder}]")
+                stats['moved'] += len(folder_uids)
+                continue
+            result = service.move_uids(folder_uids, folder)
+            stats['moved'] += len(result['moved'])
+            stats['failed'] += len(result['failed'])
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将已处理的邮件分批移入规则的归档文件夹")
+    parser.add_argument('--folder', default='INBOX', help="检查的文件夹")
+    parser.add_argument('--older-than', type=int, default=0, help="只移动多少天之前收到的邮件，0 表示不限制")
+    parser.add_argument('--to', help="不匹配规则或规则未配置 archive_folder 的已处理邮件移入的文件夹")
+    parser.add_argument('--batch-size', type=int, default=EMAIL_ARCHIVE_BATCH_SIZE,
+                        help="每条 UID MOVE 命令包含的邮件数")
+    parser.add_argument('--dry-run', action='store_true', help="只统计各归档文件夹的邮件数，不移动")
+    args = parser.parse_args()
+
+    service = EmailService(RuleProcessor(), folder=args.folder)
+    service.archive_batch_size = args.batch_size
+    before = date.today() - timedelta(days=args.older_than) if args.older_than > 0 else None
+    try:
+        stats = archive(service, before, args.to, args.dry_run)
+    finally:
+        service.disconnect()
+    print("归档结果:", stats)
+    return 0 if not stats['failed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
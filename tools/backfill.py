@@ -0,0 +1,42 @@
+"""历史邮件补处理
+
+从本地 mbox 文件、Maildir 目录或 .eml 文件/目录读取历史邮件，按 config/email_rules.yaml 的规则
+匹配，并行解码附件后保存到规则的下载目录，写入处理台账。不访问 IMAP 服务器。
+台账中已有的邮件会跳过，可以重复运行；之后在线处理遇到这些邮件时只补设处理标志。
+
+用法：
+    python tools/backfill.py archive/2024-05.mbox
+    python tools/backfill.py ~/Maildir/.供应商 exports/ --workers 8
+"""
+import sys
+import os
+import argparse
+
+# 将项目根目录添加到Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.backfill import Backfill
+from services.email_service import EmailService
+from services.rule_processor import RuleProcessor
+from utils.processed_ledger import ProcessedLedger
+from config import EMAIL_PROCESSED_LEDGER_PATH
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从本地 mbox、Maildir 或 .eml 目录补处理历史邮件")
+    parser.add_argument('paths', nargs='+', help="mbox 文件、Maildir 目录或 .eml 文件/目录")
+    parser.add_argument('--workers', type=int, default=0, help="解码附件的子进程数，默认为 CPU 核数，1 表示不使用子进程")
+    parser.add_argument('--progress', type=float, default=5.0, help="记录进度的间隔秒数")
+    args = parser.parse_args()
+
+    rule_processor = RuleProcessor()
+    backfill = Backfill(rule_processor, EmailService(rule_processor),
+                        ProcessedLedger(EMAIL_PROCESSED_LEDGER_PATH), args.workers, args.progress)
+    stats = backfill.run(args.paths)
+    print("补处理结果:", stats)
+    return 0 if not stats['failed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""邮件头解码基准测试
+
+生成一组接近实际的邮件头（GBK/UTF-8 编码字主题、部分编码的回复主题、纯 ASCII 主题、
+未编码的 8 位 GBK 主题以及 GBK 编码的附件文件名），主题在少量模板间大量重复，
+对比改动前的 EmailDecoder 实现与当前实现（ASCII 快速路径、LRU 缓存、按发件人记住字符集）
+每个邮件头的平均解码耗时，并报告缓存命中率和两种实现结果不同的邮件头数。
+
+用法：
+    python tools/bench_decoder.py --headers 20000 --distinct 200 --repeat 5
+"""
+import sys
+import os
+import time
+import random
+import argparse
+from email import quoprimime
+from email.header import Header, decode_header
+from email.parser import BytesHeaderParser
+from typing import List, Tuple, Any
+
+# 将项目根目录添加到Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from utils.email_decoder import EmailDecoder
+
+# (发件人, 主题编码方式, 主题模板)
+VENDORS = [
+    ('华南五金 <sales@hn-hardware.cn>', 'gbk', '送货单 {n}'),
+    ('鑫达塑胶 <order@xinda.com.cn>', 'gbk', '出货明细-{n}号订单'),
+    ('Acme Supply <noreply@acme.example.com>', 'utf-8', '生产进度表 第{n}周'),
+    ('精密模具 <pmc@jingmi.cn>', 'utf-8', '【进度】模具排期 {n}'),
+    ('Buyer <buyer@partner.example.com>', 'reply', 'Re: 订单确认 PO{n}'),
+    ('Logistics <ops@logistics.example.com>', 'ascii', 'Invoice {n} for shipment'),
+    ('旧系统 <erp@legacy-vendor.cn>', 'raw-gbk', '送货通知 {n}'),
+]
+# 各供应商的邮件占比
+WEIGHTS = [30, 10, 20, 5, 10, 15, 10]
+
+
+def legacy_decode_str(text) -> str:
+    """改动前的 EmailDecoder.decode_str，用于对比"""
+    if not text:
+        return ''
+    try:
+        result = []
+        for content, charset in decode_header(text):
+            if isinstance(content, bytes):
+                try:
+                    if charset:
+                        decoded = content.decode(charset)
+                    else:
+                        for encoding in ['utf-8', 'gbk', 'gb2312', 'iso-8859-1']:
+                            try:
+                                decoded = content.decode(encoding)
+                                break
+                            except UnicodeDecodeError:
+                                continue
+                        else:
+                            decoded = content.decode('utf-8', errors='replace')
+                except Exception:
+                    decoded = str(content)
+            else:
+                decoded = str(content)
+            result.append(decoded)
+        return ''.join(result)
+    except Exception:
+        return str(text)
+
+
+def build_header(sender: str, kind: str, subject: str, index: int) -> bytes:
+    """生成一封邮件的原始邮件头"""
+    if kind == 'gbk':
+        encoded = Header(subject, 'gbk').encode()
+    elif kind == 'utf-8':
+        encoded = Header(subject, 'utf-8').encode()
+    elif kind == 'reply':
+        # 回复主题只编码非 ASCII 部分，使用 Q 编码
+        prefix, rest = subject.split(' ', 1)
+        encoded = prefix + ' ' + quoprimime.header_encode(rest.encode('utf-8'), 'utf-8')
+    else:
+        encoded = subject
+    charset = 'gbk' if kind == 'raw-gbk' else 'utf-8'
+    filename = Header('附件_%d.xlsx' % index, 'gbk').encode()
+    header = 'Subject: %s\r\nFrom: %s\r\nX-Filename: %s\r\n\r\n' % (
+        encoded, Header(sender.split(' <')[0], 'utf-8').encode() + ' <' + sender.split(' <')[1], filename)
+    return header.encode(charset)
+
+
+def build_corpus(count: int, distinct: int, seed: int) -> List[Tuple[Any, Any, Any]]:
+    """生成 (主题, 发件人, 文件名) 列表，值与 BytesHeaderParser 解析结果的类型一致"""
+    rng = random.Random(seed)
+    parser = BytesHeaderParser()
+    corpus = []
+    for _ in range(count):
+        vendor = rng.choices(range(len(VENDORS)), WEIGHTS)[0]
+        sender, kind, template = VENDORS[vendor]
+        # 编号只有 distinct 个取值，模拟供应商反复发送相同主题
+        number = rng.randrange(max(1, distinct))
+        header = parser.parsebytes(build_header(sender, kind, template.format(n=number), number))
+        corpus.append((header['subject'], header['from'], header['x-filename']))
+    return corpus
+
+
+def run(corpus, decode_subject, decode_filename) -> Tuple[float, List[str]]:
+    """解码全部邮件头，返回耗时和结果"""
+    results = []
+    start = time.perf_counter()
+    for subject, sender, filename in corpus:
+        results.append(decode_subject(subject, sender))
+        results.append(decode_filename(filename, sender))
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="邮件头解码基准测试")
+    parser.add_argument('--headers', type=int, default=20000, help="邮件数（每封解码主题和文件名）")
+    parser.add_argument('--distinct', type=int, default=200, help="每个主题模板的编号取值数")
+    parser.add_argument('--repeat', type=int, default=5, help="重复次数，取最快一次")
+    parser.add_argument('--seed', type=int, default=1, help="随机种子")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.headers, args.distinct, args.seed)
+    distinct_subjects = len({str(s) for s, _, _ in corpus})
+    print(f"邮件 {len(corpus)} 封，不同主题约 {distinct_subjects} 个")
+
+    legacy_times, current_times = [], []
+    for _ in range(args.repeat):
+        elapsed, legacy = run(corpus, lambda text, sender: legacy_decode_str(text),
+                              lambda text, sender: legacy_decode_str(text))
+        legacy_times.append(elapsed)
+        # 每次从空缓存开始，包含缓存填充的开销
+        EmailDecoder.cache_clear()
+        elapsed, current = run(corpus, EmailDecoder.decode_str, EmailDecoder.decode_filename)
+        current_times.append(elapsed)
+
+    calls = 2 * len(corpus)
+    legacy_best, current_best = min(legacy_times), min(current_times)
+    print(f"{'实现':<10}{'最快(s)':>10}{'每个邮件头(us)':>18}")
+    print(f"{'改动前':<10}{legacy_best:>10.3f}{legacy_best / calls * 1e6:>18.2f}")
+    print(f"{'当前':<10}{current_best:>10.3f}{current_best / calls * 1e6:>18.2f}")
+    print(f"加速比 {legacy_best / current_best:.1f}x")
+    print("缓存统计:", EmailDecoder.cache_info())
+    differences = sum(1 for old, new in zip(legacy, current) if old != new)
+    print(f"结果不同的邮件头 {differences} 个（改动前无法解码的未编码 8 位主题）")
+
+
+if __name__ == "__main__":
+    main()
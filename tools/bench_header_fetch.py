@@ -0,0 +1,73 @@
+"""未读邮件头获取基准测试
+
+对比逐封获取与批量获取邮件头时的 IMAP 往返次数和耗时。
+邮件服务器使用 .env 中的配置，批量大小可通过命令行参数指定。
+
+用法：
+    python tools/bench_header_fetch.py --batch-size 200 --repeat 3
+"""
+import sys
+import os
+import time
+import argparse
+
+# 将项目根目录添加到Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.email_service import EmailService
+from services.rule_processor import RuleProcessor
+
+
+class RoundTripCounter:
+    """统计 imaplib 连接发出的命令数（每条命令对应一次往返）"""
+
+    def __init__(self, imap):
+        self.count = 0
+        self._original = imap._command
+
+        def counting_command(*args, **kwargs):
+            self.count += 1
+            return self._original(*args, **kwargs)
+
+        imap._command = counting_command
+
+
+def run_once(service: EmailService, batch_size: int):
+    """执行一次未读邮件扫描
+
+    Returns:
+        tuple: (邮件数, 往返次数, 耗时秒数)
+    """
+    service.header_batch_size = batch_size
+    service.connect()
+    counter = RoundTripCounter(service._imap)
+    try:
+        start = time.perf_counter()
+        emails = service.get_unread_emails()
+        elapsed = time.perf_counter() - start
+        return len(emails), counter.count, elapsed
+    finally:
+        service.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="未读邮件头获取基准测试")
+    parser.add_argument('--batch-size', type=int, default=200, help="批量模式每批邮件数")
+    parser.add_argument('--repeat', type=int, default=3, help="每种模式重复次数")
+    args = parser.parse_args()
+
+    service = EmailService(RuleProcessor())
+    modes = [('逐封获取', 0), ('批量获取', args.batch_size)]
+
+    print(f"{'模式':<10}{'邮件数':>8}{'往返次数':>10}{'平均耗时(s)':>14}")
+    for name, batch_size in modes:
+        results = [run_once(service, batch_size) for _ in range(args.repeat)]
+        count = results[-1][0]
+        round_trips = results[-1][1]
+        avg = sum(r[2] for r in results) / len(results)
+        print(f"{name:<10}{count:>8}{round_trips:>10}{avg:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
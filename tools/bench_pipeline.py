@@ -0,0 +1,289 @@
+"""邮件处理流程基准测试
+
+在本地 IMAP 替身服务器上运行完整的 EmailProcessor.process_unread_emails 周期，
+报告吞吐量（封/秒）、IMAP 往返次数、收发字节数（压缩前和线路上）以及各阶段耗时的 p50/p95。
+
+默认生成 N 封匹配基准规则的邮件，每封带 M 个附件：第一个为匹配规则的 .xlsx，
+其余为不匹配的 .pdf；另可加入若干封不匹配任何规则的干扰邮件。
+--rules K 时生成 K 条发件人和下载目录各不相同的规则，邮件轮流分配给各规则，
+用于测试多个连接并行下载。
+使用 --eml-dir 时改为加载目录中的 .eml 文件，并使用 config/email_rules.yaml 中的规则。
+
+测试在临时目录中运行（复制 config 目录），附件和同步状态不会写入项目目录。
+
+用法：
+    python tools/bench_pipeline.py --messages 200 --attachments 3 --size 200000
+    python tools/bench_pipeline.py --messages 200 --latency 0.005 --esearch --condstore
+    python tools/bench_pipeline.py --messages 200 --latency 0.005 --rules 4 --workers 4
+    python tools/bench_pipeline.py --messages 200 --latency 0.005 --pipeline 8
+    python tools/bench_pipeline.py --eml-dir samples/ --cycles 1
+"""
+import sys
+import os
+import math
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from collections import defaultdict
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.application import MIMEApplication
+from email.header import Header
+from typing import List, Dict, Callable
+
+# 将项目根目录添加到Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.email_service import EmailService
+from services.email_processor import EmailProcessor
+from services.rule_processor import RuleProcessor
+from tools.fake_imap_server import FakeImapServer
+
+BENCH_SENDER = 'bench-sender@example.com'
+BENCH_RECEIVER = 'bench@example.com'
+
+BENCH_RULE = """  - name: "基准测试进度表{suffix}"
+    subject_contains: ["^基准测试进度表 \\\\d+$"]
+    sender_contains: ["{sender}"]
+    receiver_contains: ["{receiver}"]
+    attachment_name_pattern: ["^进度表_\\\\d+\\\\.xlsx$"]
+    download_path: "downloads/bench{suffix}"
+"""
+
+
+def bench_sender(rule_index: int) -> str:
+    """返回第 rule_index 条基准规则的发件人"""
+    return BENCH_SENDER if rule_index == 0 else BENCH_SENDER.replace('@', f'-{rule_index}@')
+
+
+def bench_rules(count: int = 1) -> str:
+    """生成 count 条基准规则的 YAML"""
+    return 'rules:\n' + ''.join(
+        BENCH_RULE.format(suffix=f'_{i}' if i else '', sender=bench_sender(i), receiver=BENCH_RECEIVER)
+        for i in range(count))
+
+
+
+class StageTimer:
+    """记录对象方法每次调用的耗时"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def wrap(self, obj, method: str, stage: str):
+        original: Callable = getattr(obj, method)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - start)
+
+        setattr(obj, method, timed)
+
+    def wrap_iter(self, obj, method: str, stage: str):
+        """记录生成器方法每次调用在生成器内部花费的时间
+
+        只累计各次取下一项的耗时，不包括调用方处理每一项的时间，生成器耗尽或被关闭时记一个样本。
+        """
+        original: Callable = getattr(obj, method)
+
+        def timed(*args, **kwargs):
+            iterator = original(*args, **kwargs)
+            spent = 0.0
+            try:
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                    finally:
+                        spent += time.perf_counter() - start
+                    yield item
+            finally:
+                iterator.close()
+                self.samples[stage].append(spent)
+
+        setattr(obj, method, timed)
+
+
+def percentile(values: List[float], p: float) -> float:
+    """返回第 p 百分位（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def build_message(index: int, attachments: int, size: int, rule_index: int = 0) -> bytes:
+    """生成一封匹配第 rule_index 条基准规则的邮件"""
+    msg = MIMEMultipart()
+    msg['Subject'] = Header(f'基准测试进度表 {index}', 'utf-8')
+    msg['From'] = bench_sender(rule_index)
+    msg['To'] = BENCH_RECEIVER
+    msg['Message-ID'] = f'<bench-{index}@example.com>'
+    msg.attach(MIMEText('基准测试邮件正文', 'plain', 'utf-8'))
+    payload = os.urandom(size)
+    for i in range(attachments):
+        if i == 0:
+            filename = f'进度表_{index}.xlsx'
+            part = MIMEApplication(payload, 'vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        else:
+            filename = f'扫描件_{index}_{i}.pdf'
+            part = MIMEApplication(payload, 'pdf')
+        part.add_header('Content-Disposition', 'attachment', filename=('utf-8', '', filename))
+        msg.attach(part)
+    return msg.as_bytes()
+
+
+def build_noise(index: int) -> bytes:
+    """生成一封不匹配任何规则的邮件"""
+    msg = MIMEText('newsletter', 'plain', 'utf-8')
+    msg['Subject'] = Header(f'通知 {index}', 'utf-8')
+    msg['From'] = f'noise{index}@example.org'
+    msg['To'] = BENCH_RECEIVER
+    msg['Message-ID'] = f'<noise-{index}@example.org>'
+    return msg.as_bytes()
+
+
+def prepare_workdir(rule_count: int) -> str:
+    """创建临时工作目录并复制配置，rule_count 大于0时写入基准规则"""
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    shutil.copytree(os.path.join(root_dir, 'config'), os.path.join(workdir, 'config'))
+    if rule_count:
+        with open(os.path.join(workdir, 'config', 'email_rules.yaml'), 'w', encoding='utf-8') as f:
+            f.write(bench_rules(rule_count))
+    return workdir
+
+
+def reset_mailbox(server: FakeImapServer):
+    """清除所有邮件的标志，使下一个周期重新处理全部邮件"""
+    for message in server.messages:
+        server.set_flags(message, set())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="邮件处理流程基准测试")
+    parser.add_argument('--messages', type=int, default=100, help="匹配规则的邮件数 N")
+    parser.add_argument('--attachments', type=int, default=2, help="每封邮件的附件数 M")
+    parser.add_argument('--size', type=int, default=100000, help="每个附件的字节数")
+    parser.add_argument('--noise', type=int, default=0, help="不匹配任何规则的干扰邮件数")
+    parser.add_argument('--rules', type=int, default=1, help="基准规则数（各自的发件人和下载目录）")
+    parser.add_argument('--workers', type=int, help="并行下载附件的连接数")
+    parser.add_argument('--pipeline', type=int, metavar='DEPTH',
+                        help="使用异步流水线下载附件，指定同时在途的命令数")
+    parser.add_argument('--eml-dir', help="改为加载该目录中的 .eml 文件")
+    parser.add_argument('--cycles', type=int, default=3, help="处理周期数")
+    parser.add_argument('--latency', type=float, default=0.0, help="每条命令注入的延迟秒数")
+    parser.add_argument('--esearch', action='store_true', help="替身服务器声明 ESEARCH")
+    parser.add_argument('--condstore', action='store_true', help="替身服务器声明 CONDSTORE")
+    parser.add_argument('--compress', action='store_true', help="替身服务器声明 COMPRESS=DEFLATE")
+    parser.add_argument('--no-partial', action='store_true', help="关闭 BODYSTRUCTURE 部分获取")
+    parser.add_argument('--batch-size', type=int, help="批量获取邮件头的每批邮件数")
+    parser.add_argument('--verbose', action='store_true', help="保留 INFO/DEBUG 日志")
+    parser.add_argument('--keep', action='store_true', help="保留临时工作目录")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    capabilities = ['IMAP4rev1', 'IDLE']
+    if args.esearch:
+        capabilities.append('ESEARCH')
+    if args.condstore:
+        capabilities.extend(['ENABLE', 'CONDSTORE'])
+    if args.compress:
+        capabilities.append('COMPRESS=DEFLATE')
+    server = FakeImapServer(capabilities=tuple(capabilities), latency=args.latency)
+    if args.eml_dir:
+        total = server.load_eml_dir(args.eml_dir)
+    else:
+        for i in range(args.messages):
+            server.deliver(build_message(i, args.attachments, args.size, i % max(1, args.rules)))
+        for i in range(args.noise):
+            server.deliver(build_noise(i))
+        total = args.messages + args.noise
+    host, port = server.start()
+
+    cwd = os.getcwd()
+    workdir = prepare_workdir(0 if args.eml_dir else max(1, args.rules))
+    os.chdir(workdir)
+    try:
+        rule_processor = RuleProcessor()
+        service = EmailService(rule_processor, {
+            'email': 'bench', 'password': 'bench', 'server': host, 'port': port, 'use_ssl': False
+        })
+        if args.no_partial:
+            service.partial_fetch = False
+        if args.batch_size is not None:
+            service.header_batch_size = args.batch_size
+        if args.workers is not None:
+            service.download_pool.size = max(1, args.workers)
+        if args.pipeline:
+            service.async_pipeline = True
+            service.pipelined_downloader.depth = args.pipeline
+        processor = EmailProcessor(rule_processor, service)
+
+        timer = StageTimer()
+        timer.wrap_iter(service, 'iter_unread_emails', 'search+headers')
+        timer.wrap(rule_processor, 'get_matching_rule', 'rule_match')
+        timer.wrap(service, 'download_attachments_batch', 'download')
+        timer.wrap(service, 'commit_processed_flags', 'commit_flags')
+        timer.wrap(processor, 'process_unread_emails', 'cycle')
+
+        rows = []
+        for cycle in range(args.cycles):
+            reset_mailbox(server)
+            processor.ledger.clear()
+            processor._attempted.clear()
+            server.reset_stats()
+            start = time.perf_counter()
+            processor.process_unread_emails()
+            elapsed = time.perf_counter() - start
+            rows.append({
+                'processed': processor.ledger.count(),
+                'elapsed': elapsed,
+                'commands': server.stats['commands'],
+                'bytes_sent': server.stats['bytes_sent'],
+                'bytes_received': server.stats['bytes_received'],
+                'wire_sent': server.stats['wire_sent'],
+                'wire_received': server.stats['wire_received'],
+                'command_names': dict(server.stats['command_names'])
+            })
+        metrics = service.get_metrics()
+        queue_stats = processor.last_queue
+        service.disconnect()
+    finally:
+        os.chdir(cwd)
+        server.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"邮件总数 {total}，周期数 {args.cycles}，注入延迟 {args.latency * 1000:.1f} ms，"
+          f"能力 {' '.join(capabilities)}")
+    print()
+    print(f"{'周期':<6}{'处理封数':>8}{'耗时(s)':>10}{'封/秒':>10}{'往返次数':>10}"
+          f"{'下行字节':>14}{'下行线路':>14}{'上行字节':>12}{'上行线路':>12}")
+    for i, row in enumerate(rows, 1):
+        rate = row['processed'] / row['elapsed'] if row['elapsed'] else 0.0
+        print(f"{i:<6}{row['processed']:>8}{row['elapsed']:>10.3f}{rate:>10.1f}{row['commands']:>10}"
+              f"{row['bytes_sent']:>14}{row['wire_sent']:>14}{row['bytes_received']:>12}{row['wire_received']:>12}")
+    print()
+    print(f"{'阶段':<16}{'次数':>8}{'p50(ms)':>12}{'p95(ms)':>12}{'合计(s)':>10}")
+    for stage in ('cycle', 'search+headers', 'rule_match', 'download', 'commit_flags'):
+        values = timer.samples.get(stage, [])
+        print(f"{stage:<16}{len(values):>8}{percentile(values, 50) * 1000:>12.2f}"
+              f"{percentile(values, 95) * 1000:>12.2f}{sum(values):>10.3f}")
+    print()
+    print("最后一个周期的命令分布:", rows[-1]['command_names'] if rows else {})
+    print("邮件服务指标:", metrics)
+    print("队列统计:", queue_stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""规则匹配基准测试
+
+生成指定条数的规则（大多数按供应商邮箱地址或域名限制发件人，少数不限制发件人）和一组邮件
+（部分来自规则中的供应商，其余来自无关发件人），对比逐条检查所有规则的线性扫描与按发件人索引
+只检查候选规则的当前实现每封邮件的平均匹配耗时，并报告两种方式结果不同的邮件数。
+
+用法：
+    python tools/bench_rules.py --rules 9,100,500 --messages 20000
+"""
+import sys
+import os
+import time
+import random
+import argparse
+from typing import List, Dict, Any, Optional, Tuple
+
+# 将项目根目录添加到Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from models.email_message import EmailMessage
+from services.rule_processor import RuleProcessor
+
+# 每多少条规则中有一条不限制发件人
+CATCH_ALL_EVERY = 50
+
+
+def build_rules(count: int) -> List[Dict[str, Any]]:
+    """生成规则，奇数供应商按域名限制发件人，偶数供应商按邮箱地址限制"""
+    rules = []
+    for i in range(count):
+        if i % CATCH_ALL_EVERY == CATCH_ALL_EVERY - 1:
+            senders = []
+        elif i % 2:
+            senders = ['vendor%d.example.cn' % i]
+        else:
+            senders = ['pmc%d@vendor%d.example.cn' % (i, i)]
+        rules.append({
+            'name': '供应商%d进度表' % i,
+            'subject_contains': ['^供应商%d 进度表 \\d+$' % i],
+            'sender_contains': senders,
+            'receiver_contains': ['buyer@h-sun.com'],
+            'attachment_name_pattern': ['^WIP_%d_\\d+\\.xlsx$' % i],
+            'download_path': 'downloads/wip/供应商%d' % i
+        })
+    return rules
+
+
+def build_messages(rule_count: int, count: int, seed: int) -> List[EmailMessage]:
+    """生成邮件，一半来自规则中的供应商，一半来自无关发件人"""
+    rng = random.Random(seed)
+    messages = []
+    for n in range(count):
+        vendor = rng.randrange(rule_count)
+        if n % 2:
+            sender = '供应商 <pmc%d@vendor%d.example.cn>' % (vendor, vendor)
+            subject = '供应商%d 进度表 %d' % (vendor, n)
+        else:
+            sender = 'News <news%d@mail%d.example.com>' % (vendor, rng.randrange(1000))
+            subject = 'Weekly digest %d' % n
+        messages.append(EmailMessage(subject, sender, 'buyer@h-sun.com', str(n).encode()))
+    return messages
+
+
+def linear_match(processor: RuleProcessor, email_msg: EmailMessage) -> Optional[Dict[str, Any]]:
+    """改动前的 get_matching_rule：按顺序检查每条规则"""
+    for rule in processor.rules:
+        if processor._check_single_rule(rule, email_msg):
+            processor.logger.debug("邮件 [%s] 匹配规则: %s", email_msg.subject, rule['name'])
+            return rule
+    processor.logger.debug("邮件 [%s] 不匹配任何规则", email_msg.subject)
+    return None
+
+
+def run(match, messages: List[EmailMessage]) -> Tuple[float, List[Optional[str]]]:
+    """匹配全部邮件，返回耗时和匹配的规则名称"""
+    start = time.perf_counter()
+    results = [match(email_msg) for email_msg in messages]
+    return time.perf_counter() - start, [rule['name'] if rule else None for rule in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="规则匹配基准测试")
+    parser.add_argument('--rules', default='9,100,500', help="规则条数，多个用逗号分隔")
+    parser.add_argument('--messages', type=int, default=20000, help="邮件数")
+    parser.add_argument('--repeat', type=int, default=3, help="重复次数，取最快一次")
+    parser.add_argument('--seed', type=int, default=1, help="随机种子")
+    args = parser.parse_args()
+
+    processor = RuleProcessor()
+    print(f"{'规则数':<8}{'线性扫描(us)':>14}{'索引(us)':>12}{'加速比':>10}{'结果不同':>10}")
+    for rule_count in [int(n) for n in args.rules.split(',') if n.strip()]:
+        processor.rules = build_rules(rule_count)
+        processor._compiled_patterns = {}
+        processor._compile_patterns()
+        processor._build_index()
+        messages = build_messages(rule_count, args.messages, args.seed)
+
+        linear_times, indexed_times = [], []
+        for _ in range(args.repeat):
+            elapsed, linear = run(lambda m: linear_match(processor, m), messages)
+            linear_times.append(elapsed)
+            # 每次从空缓存开始，包含发件人解析的开销
+            processor._candidates.cache_clear()
+            elapsed, indexed = run(processor.get_matching_rule, messages)
+            indexed_times.append(elapsed)
+
+        linear_best, indexed_best = min(linear_times), min(indexed_times)
+        differences = sum(1 for old, new in zip(linear, indexed) if old != new)
+        print(f"{rule_count:<8}{linear_best / len(messages) * 1e6:>14.2f}"
+              f"{indexed_best / len(messages) * 1e6:>12.2f}"
+              f"{linear_best / indexed_best:>9.1f}x{differences:>10}")
+
+
+if __name__ == "__main__":
+    main()
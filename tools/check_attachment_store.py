@@ -0,0 +1,83 @@
+"""附件去重存储验证脚本
+
+验证附件存储的放入标记：
+1. 放入的文件被下游移走（如归档）后，相同内容再次保存时不重新放入，重新打开存储（重启）后仍然有效
+2. 文件未被取走就被同名的其他内容覆盖（A、B、A）时，A 再次收到会重新放入
+3. A 被取走后同名的 B 放入，A 再次收到时不重新放入，下载目录中仍是 B
+
+用法：
+    python tools/check_attachment_store.py
+"""
+import sys
+import os
+import shutil
+import tempfile
+
+# 将项目根目录添加到Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from utils.attachment_store import AttachmentStore
+
+
+def read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def check_moved(workdir: str) -> bool:
+    store_root = os.path.join(workdir, 'store_moved')
+    dest = os.path.join(workdir, 'moved', 'downloads', '送货单.xlsx')
+    archive_dir = os.path.join(workdir, 'moved', 'archive')
+    os.makedirs(archive_dir)
+    payload = os.urandom(2000)
+
+    first = AttachmentStore(store_root).store_bytes(payload, dest, {'message_id': '<a-1@example.com>'})
+    shutil.move(dest, os.path.join(archive_dir, os.path.basename(dest)))
+    second = AttachmentStore(store_root).store_bytes(payload, dest, {'message_id': '<a-2@example.com>'})
+    ok = not first['duplicate'] and second['duplicate'] and not os.path.exists(dest)
+    print(f"{'OK  ' if ok else 'FAIL'} 移走后再次保存相同内容: 重复 {second['duplicate']}，"
+          f"下载目录中有文件 {os.path.exists(dest)}")
+    return ok
+
+
+def check_overwritten(workdir: str) -> bool:
+    store = AttachmentStore(os.path.join(workdir, 'store_overwritten'))
+    dest = os.path.join(workdir, 'overwritten', '华芯微WIP.xlsx')
+    a, b = os.urandom(2000), os.urandom(2000)
+
+    store.store_bytes(a, dest, {'message_id': '<a@example.com>'})
+    store.store_bytes(b, dest, {'message_id': '<b@example.com>'})
+    again = store.store_bytes(a, dest, {'message_id': '<a-again@example.com>'})
+    ok = not again['duplicate'] and read(dest) == a
+    print(f"{'OK  ' if ok else 'FAIL'} A 未被取走就被 B 覆盖后再次收到 A: 重复 {again['duplicate']}，"
+          f"下载目录中为 A {read(dest) == a}")
+    return ok
+
+
+def check_consumed_then_overwritten(workdir: str) -> bool:
+    store = AttachmentStore(os.path.join(workdir, 'store_consumed'))
+    dest = os.path.join(workdir, 'consumed', '送货单.xlsx')
+    a, b = os.urandom(2000), os.urandom(2000)
+
+    store.store_bytes(a, dest, {'message_id': '<a@example.com>'})
+    os.remove(dest)
+    store.store_bytes(b, dest, {'message_id': '<b@example.com>'})
+    again = store.store_bytes(a, dest, {'message_id': '<a-again@example.com>'})
+    ok = again['duplicate'] and read(dest) == b
+    print(f"{'OK  ' if ok else 'FAIL'} A 被取走、B 放入后再次收到 A: 重复 {again['duplicate']}，"
+          f"下载目录中为 B {read(dest) == b}")
+    return ok
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='check_store_')
+    try:
+        results = [check_moved(workdir), check_overwritten(workdir), check_consumed_then_overwritten(workdir)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
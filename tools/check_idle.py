@@ -0,0 +1,157 @@
+"""IDLE 推送模式验证脚本
+
+使用本地 IMAP 替身服务器验证 IdleListener：
+1. 新邮件通知到达后回调的唤醒延迟
+2. 超时后重新发起 IDLE
+3. 邮件数未增加的 EXISTS 和 RECENT 为0的通知不触发处理
+4. 服务器在 IDLE 的继续响应之前发送 EXISTS 时不断开会话，其中的新邮件触发处理
+5. 服务器不支持 IDLE 时返回 False 以回退到定时轮询
+
+用法：
+    python tools/check_idle.py
+"""
+import sys
+import os
+import time
+import threading
+
+# 将项目根目录添加到Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.email_service import EmailService
+from services.rule_processor import RuleProcessor
+from services.idle_listener import IdleListener
+from tools.fake_imap_server import FakeImapServer
+
+SAMPLE_MESSAGE = (
+    b"From: a13589601455@163.com\r\n"
+    b"To: fanlm@h-sun.com\r\n"
+    b"Subject: =?utf-8?b?5Y2O6Iqv5b6uV0lQ?=\r\n"
+    b"Message-ID: <check-idle@example.com>\r\n"
+    b"\r\n"
+    b"body\r\n"
+)
+
+
+def make_service(host: str, port: int) -> EmailService:
+    """创建指向替身服务器的邮件服务"""
+    service = EmailService(RuleProcessor())
+    service.server = host
+    service.port = port
+    service.use_ssl = False
+    service.email = 'tester'
+    service.password = 'secret'
+    return service
+
+
+def check_wakeup(idle_timeout: float = 2.0) -> bool:
+    server = FakeImapServer()
+    host, port = server.start()
+    calls = []
+    listener = IdleListener(make_service(host, port), lambda: calls.append(time.monotonic()),
+                            idle_timeout=idle_timeout, reconnect_delay=1)
+    thread = threading.Thread(target=listener.run, daemon=True)
+    thread.start()
+    try:
+        # 等待首次连接回调完成并进入IDLE
+        time.sleep(0.5)
+        delivered_at = time.monotonic()
+        server.deliver(SAMPLE_MESSAGE)
+        deadline = time.monotonic() + 5
+        while len(calls) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        if len(calls) < 2:
+            print("FAIL 未收到新邮件回调")
+            return False
+        print(f"OK   新邮件唤醒延迟: {(calls[1] - delivered_at) * 1000:.1f} ms")
+
+        # 等待超过 idle_timeout，确认重新发起了 IDLE
+        time.sleep(idle_timeout * 2.5)
+        idle_count = server.stats['command_names'].get('IDLE', 0)
+        ok = idle_count >= 3
+        print(f"{'OK  ' if ok else 'FAIL'} IDLE 发起次数: {idle_count}")
+        return ok
+    finally:
+        listener.stop()
+        thread.join(timeout=5)
+        server.stop()
+
+
+def check_no_new_mail() -> bool:
+    server = FakeImapServer()
+    host, port = server.start()
+    server.deliver(SAMPLE_MESSAGE)
+    calls = []
+    listener = IdleListener(make_service(host, port), lambda: calls.append(time.monotonic()),
+                            idle_timeout=5, reconnect_delay=1)
+    thread = threading.Thread(target=listener.run, daemon=True)
+    thread.start()
+    try:
+        time.sleep(0.5)
+        # 邮件数未增加的 EXISTS 和 RECENT 为0的通知不应触发处理
+        for handler in list(server._handlers):
+            if handler.selected == 'INBOX':
+                handler.notify(f"* {len(server.inbox.messages)} EXISTS")
+                handler.notify("* 0 RECENT")
+        time.sleep(1.5)
+        ok = len(calls) == 1
+        print(f"{'OK  ' if ok else 'FAIL'} 无新邮件的 EXISTS/RECENT 通知不触发处理: 回调 {len(calls) - 1} 次")
+        return ok
+    finally:
+        listener.stop()
+        thread.join(timeout=5)
+        server.stop()
+
+
+def check_untagged_before_continuation() -> bool:
+    server = FakeImapServer()
+    server.exists_before_idle = True
+    host, port = server.start()
+    calls = []
+
+    def callback():
+        calls.append(time.monotonic())
+        # 首次处理期间到达的新邮件，其 EXISTS 在下一次 IDLE 的继续响应之前发送
+        if len(calls) == 1:
+            time.sleep(0.5)
+            server.deliver(SAMPLE_MESSAGE)
+            time.sleep(0.5)
+
+    listener = IdleListener(make_service(host, port), callback, idle_timeout=1, reconnect_delay=30)
+    thread = threading.Thread(target=listener.run, daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(calls) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(2.5)
+        logins = server.stats['command_names'].get('LOGIN', 0)
+        ok = len(calls) == 2 and logins == 1
+        print(f"{'OK  ' if ok else 'FAIL'} 继续响应之前的 EXISTS: 回调 {len(calls)} 次，登录 {logins} 次")
+        return ok
+    finally:
+        listener.stop()
+        thread.join(timeout=5)
+        server.stop()
+
+
+def check_fallback() -> bool:
+    server = FakeImapServer(capabilities=('IMAP4rev1',))
+    host, port = server.start()
+    try:
+        listener = IdleListener(make_service(host, port), lambda: None, reconnect_delay=1)
+        result = listener.run()
+        print(f"{'OK  ' if result is False else 'FAIL'} 不支持IDLE时回退轮询: run() -> {result}")
+        return result is False
+    finally:
+        server.stop()
+
+
+def main():
+    results = [check_wakeup(), check_no_new_mail(), check_untagged_before_continuation(), check_fallback()]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
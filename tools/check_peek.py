@@ -0,0 +1,93 @@
+"""PEEK 验证脚本
+
+使用本地 IMAP 替身服务器验证服务器不遵守 PEEK（获取内容即标记已读）时的处理：
+处理标志为自定义关键字时，一个处理周期结束后原本未读的邮件仍为未读、原本已读的邮件仍为已读，
+邮件服务指标中 peek_honoured 为 False。分别检查按段落下载附件和下载完整邮件两种方式。
+
+用法：
+    python tools/check_peek.py
+"""
+import sys
+import os
+import shutil
+import tempfile
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+# 将项目根目录添加到Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.email_processor import EmailProcessor
+from services.email_service import EmailService
+from services.rule_processor import RuleProcessor
+from tools.fake_imap_server import FakeImapServer
+
+RULE_NAME = '山东汉旗进度表'
+PROCESSED_FLAG = '$Processed'
+
+
+def build_message(index: int) -> bytes:
+    """生成一封匹配 RULE_NAME 规则的邮件"""
+    message = MIMEMultipart()
+    message['From'] = 'a13589601455@163.com'
+    message['To'] = 'fanlm@h-sun.com'
+    message['Subject'] = '华芯微WIP'
+    message['Message-ID'] = f'<check-peek-{index}@example.com>'
+    message.attach(MIMEText('body'))
+    attachment = MIMEApplication(os.urandom(1000))
+    attachment.add_header('Content-Disposition', 'attachment', filename='华芯微WIP.xlsx')
+    message.attach(attachment)
+    return message.as_bytes()
+
+
+def check_ignore_peek(partial_fetch: bool) -> bool:
+    label = '按段落下载' if partial_fetch else '下载完整邮件'
+    rule_processor = RuleProcessor()
+    workdir = tempfile.mkdtemp(prefix='check_peek_')
+    shutil.copytree(os.path.join(root_dir, 'config'), os.path.join(workdir, 'config'))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    server = FakeImapServer()
+    server.ignore_peek = True
+    host, port = server.start()
+    try:
+        rule = next(r for r in rule_processor.rules if r['name'] == RULE_NAME)
+        rule['download_path'] = os.path.join(workdir, 'downloads')
+        server.deliver(build_message(1))
+        server.deliver(build_message(2), flags=('\\Seen',))
+        server.deliver(build_message(3))
+
+        service = EmailService(rule_processor)
+        service.server = host
+        service.port = port
+        service.use_ssl = False
+        service.email = 'tester'
+        service.password = 'secret'
+        service.processed_flag = PROCESSED_FLAG
+        service.partial_fetch = partial_fetch
+        service.attachment_store = None
+        processor = EmailProcessor(rule_processor, service)
+        processor.process_unread_emails()
+
+        flags = [sorted(message.flags) for message in server.messages]
+        expected = [[PROCESSED_FLAG], [PROCESSED_FLAG, '\\Seen'], [PROCESSED_FLAG]]
+        peek_honoured = service.get_metrics()['peek_honoured']
+        ok = flags == expected and peek_honoured is False
+        print(f"{'OK  ' if ok else 'FAIL'} 不遵守 PEEK 的服务器（{label}）: 标志 {flags}，peek_honoured {peek_honoured}")
+        service.disconnect()
+        return ok
+    finally:
+        server.stop()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    results = [check_ignore_peek(True), check_ignore_peek(False)]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""断点续传验证脚本
+
+使用本地 IMAP 替身服务器验证大附件的断点续传：
+1. 第一个处理周期中连接在下载途中断开，重连后仍无进展，放弃并保留断点文件，邮件不记入台账
+2. 第二个处理周期（同一个 EmailProcessor）重新下载该邮件，从断点文件的偏移继续，
+   只获取剩余部分，保存的附件与原内容一致
+
+用法：
+    python tools/check_resume.py
+"""
+import sys
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+# 将项目根目录添加到Python路径
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root_dir)
+
+from services.email_processor import EmailProcessor
+from services.email_service import EmailService
+from services.rule_processor import RuleProcessor
+from tools.fake_imap_server import FakeImapServer
+
+RULE_NAME = '山东汉旗进度表'
+ATTACHMENT_SIZE = 5 * 1024 * 1024
+
+
+def build_message(payload: bytes) -> bytes:
+    """生成一封匹配 RULE_NAME 规则、带一个大附件的邮件"""
+    message = MIMEMultipart()
+    message['From'] = 'a13589601455@163.com'
+    message['To'] = 'fanlm@h-sun.com'
+    message['Subject'] = '华芯微WIP'
+    message['Message-ID'] = '<check-resume@example.com>'
+    message.attach(MIMEText('body'))
+    attachment = MIMEApplication(payload)
+    attachment.add_header('Content-Disposition', 'attachment', filename='华芯微WIP.xlsx')
+    message.attach(attachment)
+    return message.as_bytes()
+
+
+def make_service(host: str, port: int, rule_processor: RuleProcessor) -> EmailService:
+    """创建指向替身服务器的邮件服务，分段获取的块较小以便在下载途中断开"""
+    service = EmailService(rule_processor)
+    service.server = host
+    service.port = port
+    service.use_ssl = False
+    service.email = 'tester'
+    service.password = 'secret'
+    service.stream_chunk_size = 256 * 1024
+    service.reconnect_attempts = 2
+    service.reconnect_backoff = 0
+    service.download_pool.size = 1
+    return service
+
+
+def check_resume() -> bool:
+    rule_processor = RuleProcessor()
+    workdir = tempfile.mkdtemp(prefix='check_resume_')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    server = FakeImapServer()
+    host, port = server.start()
+    try:
+        rule = next(r for r in rule_processor.rules if r['name'] == RULE_NAME)
+        rule['download_path'] = os.path.join(workdir, 'downloads')
+        payload = os.urandom(ATTACHMENT_SIZE)
+        raw = build_message(payload)
+        server.deliver(raw)
+
+        service = make_service(host, port, rule_processor)
+        processor = EmailProcessor(rule_processor, service)
+        offsets = []
+        open_partial = service.partial_downloads.open
+
+        def recording_open(email_msg, part):
+            download = open_partial(email_msg, part)
+            offsets.append(download.offset)
+            return download
+        service.partial_downloads.open = recording_open
+
+        # 第一个周期：第一个连接发送约 3MB 后断开，之后的连接在取回第一段前就断开，重连没有进展
+        server.drop_after = 3 * 1024 * 1024
+
+        def tighten():
+            while server.stats['drops'] == 0:
+                time.sleep(0.001)
+            server.drop_after = 50000
+        threading.Thread(target=tighten, daemon=True).start()
+        processor.process_unread_emails()
+        saved = processor.ledger.count()
+        ok = saved == 0 and len(offsets) == 1
+        print(f"{'OK  ' if ok else 'FAIL'} 第一个周期下载中断，台账记录 {saved} 封")
+        if not ok:
+            return False
+
+        # 第二个周期：连接不再断开，从断点继续
+        server.drop_after = 0
+        server.reset_stats()
+        processor.process_unread_emails()
+        resumed_from = offsets[-1] if len(offsets) > 1 else 0
+        # 只获取断点之后的内容，本周期发送的字节数少于整封邮件
+        ok = resumed_from > 0 and server.stats['bytes_sent'] < len(raw)
+        print(f"{'OK  ' if ok else 'FAIL'} 第二个周期从断点继续: 偏移 {resumed_from} 字节，"
+              f"本周期发送 {server.stats['bytes_sent']} 字节")
+
+        path = os.path.join(rule['download_path'], '华芯微WIP.xlsx')
+        intact = os.path.exists(path) and hashlib.sha256(open(path, 'rb').read()).digest() \
+            == hashlib.sha256(payload).digest()
+        print(f"{'OK  ' if intact else 'FAIL'} 附件内容与原内容一致，台账记录 {processor.ledger.count()} 封")
+        leftover = os.listdir(service.partial_downloads.directory)
+        print(f"{'OK  ' if not leftover else 'FAIL'} 保存后断点文件已删除")
+        service.disconnect()
+        return ok and intact and not leftover
+    finally:
+        server.stop()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    sys.exit(0 if check_resume() else 1)
+
+
+if __name__ == "__main__":
+    main()
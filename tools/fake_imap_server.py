@@ -0,0 +1,1262 @@
+"""本地 IMAP 替身服务器
+
+在本机启动一个 IMAP4rev1 服务器，用于在没有真实邮箱服务器时
+验证 EmailService / EmailProcessor / IdleListener 的行为和性能。
+
+支持的命令：
+    CAPABILITY NOOP LOGIN LOGOUT SELECT EXAMINE STATUS CLOSE ENABLE IDLE CREATE LIST
+    SEARCH FETCH STORE COPY EXPUNGE 及对应的 UID 形式
+    （可选）MOVE 及 UID MOVE，UIDPLUS 的 COPYUID 响应
+    （可选）ESEARCH 的 RETURN 选项、CONDSTORE 的 HIGHESTMODSEQ 和 MODSEQ 搜索
+    （可选）COMPRESS DEFLATE
+
+用法：
+    python tools/fake_imap_server.py --port 1143
+    python tools/fake_imap_server.py --port 1143 --eml-dir samples/ --latency 0.02
+    python tools/fake_imap_server.py --port 1143 --no-idle --esearch --condstore --compress
+    python tools/fake_imap_server.py --port 1143 --move --uidplus
+    python tools/fake_imap_server.py --port 1993 --certfile cert.pem --keyfile key.pem
+"""
+import os
+import re
+import sys
+import time
+import zlib
+import email
+import email.utils
+import select
+import ssl
+import socket
+import argparse
+import threading
+import socketserver
+from datetime import datetime, timezone
+from email.header import decode_header, make_header
+from email.message import Message
+from email.policy import compat32
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+           'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+_SYSTEM_FLAGS = ('\\Answered', '\\Flagged', '\\Deleted', '\\Seen', '\\Draft')
+
+
+def parse_arguments(text: str) -> List[Any]:
+    """将命令参数解析为嵌套列表
+
+    括号解析为 list，其余解析为 str；方括号内的空格不会拆分原子，
+    例如 BODY.PEEK[HEADER.FIELDS (SUBJECT FROM)]<0.100> 解析为一个元素。
+    """
+    stack: List[List[Any]] = [[]]
+    pos, length = 0, len(text)
+    while pos < length:
+        ch = text[pos]
+        if ch == ' ':
+            pos += 1
+        elif ch == '(':
+            stack.append([])
+            pos += 1
+        elif ch == ')':
+            if len(stack) > 1:
+                child = stack.pop()
+                stack[-1].append(child)
+            pos += 1
+        elif ch == '"':
+            pos += 1
+            value = []
+            while pos < length and text[pos] != '"':
+                if text[pos] == '\\' and pos + 1 < length:
+                    pos += 1
+                value.append(text[pos])
+                pos += 1
+            stack[-1].append(''.join(value))
+            pos += 1
+        else:
+            start, depth = pos, 0
+            while pos < length:
+                c = text[pos]
+                if c == '[':
+                    depth += 1
+                elif c == ']':
+                    depth -= 1
+                elif depth <= 0 and c in ' ()':
+                    break
+                pos += 1
+            stack[-1].append(text[start:pos])
+    while len(stack) > 1:
+        child = stack.pop()
+        stack[-1].append(child)
+    return stack[0]
+
+
+def quote(value: Optional[str]) -> str:
+    """生成 IMAP 字符串，None 生成 NIL"""
+    if value is None:
+        return 'NIL'
+    return '"%s"' % str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def decode_text(value: Optional[str]) -> str:
+    """解码 RFC 2047 编码的邮件头"""
+    if not value:
+        return ''
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        return str(value)
+
+
+def parse_search_date(value: str) -> datetime:
+    """解析 SEARCH 使用的日期，例如 7-Jan-2025"""
+    day, month, year = value.split('-')
+    return datetime(int(year), _MONTHS.index(month.capitalize()) + 1, int(day))
+
+
+class FakeMessage:
+    """替身服务器中的一封邮件"""
+
+    def __init__(self, uid: int, raw: bytes, flags: Tuple[str, ...] = (),
+                 internaldate: Optional[float] = None, modseq: int = 1):
+        # 统一为 CRLF 换行，与真实服务器一致
+        self.uid = uid
+        self.raw = re.sub(rb'\r?\n', b'\r\n', raw)
+        self.flags = set(flags)
+        self.internaldate = internaldate or time.time()
+        self.modseq = modseq
+        self._parsed: Optional[Message] = None
+
+    @property
+    def parsed(self) -> Message:
+        if self._parsed is None:
+            self._parsed = email.message_from_bytes(self.raw)
+        return self._parsed
+
+    @property
+    def header_bytes(self) -> bytes:
+        end = self.raw.find(b'\r\n\r\n')
+        return self.raw if end < 0 else self.raw[:end + 4]
+
+    @property
+    def text_bytes(self) -> bytes:
+        end = self.raw.find(b'\r\n\r\n')
+        return b'' if end < 0 else self.raw[end + 4:]
+
+    def has_flag(self, flag: str) -> bool:
+        return flag.lower() in (f.lower() for f in self.flags)
+
+    def header_fields(self, names: List[str], exclude: bool = False) -> bytes:
+        """返回指定（或排除指定）字段组成的邮件头，以空行结尾"""
+        wanted = {name.lower() for name in names}
+        fields, current = [], None
+        for line in self.header_bytes.split(b'\r\n'):
+            if not line:
+                continue
+            if line[:1] in (b' ', b'\t') and current is not None:
+                current.append(line)
+                continue
+            current = [line]
+            fields.append(current)
+        result = b''
+        for field in fields:
+            name = field[0].split(b':', 1)[0].strip().decode('ascii', errors='replace').lower()
+            if (name in wanted) != exclude:
+                result += b'\r\n'.join(field) + b'\r\n'
+        return result + b'\r\n'
+
+    def internaldate_text(self) -> str:
+        value = datetime.fromtimestamp(self.internaldate, timezone.utc)
+        return '%02d-%s-%d %02d:%02d:%02d +0000' % (
+            value.day, _MONTHS[value.month - 1], value.year,
+            value.hour, value.minute, value.second)
+
+
+class FakeMailbox:
+    """替身服务器中的一个文件夹"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.uidvalidity = int(time.time())
+        self.uidnext = 1
+        self.messages: List[FakeMessage] = []
+
+
+class _InflateReader:
+    """COMPRESS 启用后的读取端，从套接字读取并解压客户端数据"""
+
+    def __init__(self, sock: socket.socket, raw, owner: 'FakeImapServer'):
+        self.sock = sock
+        self.raw = raw
+        self.owner = owner
+        self.inflater = zlib.decompressobj(-15)
+        self.buffer = b''
+
+    def _fill(self) -> bool:
+        data = self.sock.recv(65536)
+        if not data:
+            return False
+        self.owner.count('wire_received', len(data))
+        self.buffer += self.inflater.decompress(data)
+        return True
+
+    def readline(self) -> bytes:
+        while b'\n' not in self.buffer:
+            if not self._fill():
+                break
+        pos = self.buffer.find(b'\n') + 1 or len(self.buffer)
+        line, self.buffer = self.buffer[:pos], self.buffer[pos:]
+        return line
+
+    def read(self, size: int) -> bytes:
+        while len(self.buffer) < size:
+            if not self._fill():
+                break
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def pending(self) -> bool:
+        """缓冲区或套接字中是否已有未读数据"""
+        return bool(self.buffer) or bool(select.select([self.sock], [], [], 0)[0])
+
+    def close(self):
+        self.raw.close()
+
+
+class _DeflateWriter:
+    """COMPRESS 启用后的写入端，每次 flush 以 Z_SYNC_FLUSH 结束一个压缩块"""
+
+    def __init__(self, raw, owner: 'FakeImapServer'):
+        self.raw = raw
+        self.owner = owner
+        self.deflater = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+
+    def write(self, data: bytes):
+        self._send(self.deflater.compress(data))
+
+    def flush(self):
+        self._send(self.deflater.flush(zlib.Z_SYNC_FLUSH))
+        self.raw.flush()
+
+    @property
+    def closed(self) -> bool:
+        return self.raw.closed
+
+    def close(self):
+        self.raw.close()
+
+    def _send(self, data: bytes):
+        if data:
+            self.owner.count('wire_sent', len(data))
+            self.raw.write(data)
+
+
+class FakeImapHandler(socketserver.StreamRequestHandler):
+    """单个客户端连接的命令处理器"""
+
+    _COMMAND_RE = re.compile(r'^(\S+)\s+(\S+)\s*(.*)$')
+    _LITERAL_RE = re.compile(rb'\{(\d+)(\+?)\}\r?\n$')
+    _SECTION_RE = re.compile(r'^(BODY(?:\.PEEK)?)\[([^\]]*)\](?:<(\d+)(?:\.(\d+))?>)?$', re.IGNORECASE)
+
+    def setup(self):
+        if self.owner.ssl_context is not None:
+            self.request = self.owner.ssl_context.wrap_socket(self.request, server_side=True)
+        super().setup()
+        # 响应按行写出，关闭 Nagle 算法以免与客户端的延迟确认叠加出 40ms 停顿
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.selected: Optional[str] = None
+        self.readonly = False
+        self.authenticated = False
+        self.condstore = False
+        self.compressed = False
+        self._pending: List[bytes] = []
+        self._lock = threading.Lock()
+        self._sent = 0
+
+    @property
+    def owner(self) -> 'FakeImapServer':
+        return self.server.owner
+
+    def handle(self):
+        server = self.owner
+        server.register(self)
+        try:
+            caps = ' '.join(server.capabilities)
+            self.send_line(f"* OK [CAPABILITY {caps}] Fake IMAP server ready")
+            while True:
+                pipelined = self.input_pending()
+                line = self.read_command()
+                if line is None:
+                    break
+                server.count('commands')
+                if not pipelined:
+                    server.apply_latency()
+                if not self.dispatch(line):
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            server.unregister(self)
+
+    def input_pending(self) -> bool:
+        """读取命令前检查客户端是否已发来下一条命令
+
+        已随前面的命令一起到达的（流水线）命令不再注入延迟，
+        延迟因此相当于客户端等待响应后再发送命令的往返时间。
+        """
+        if isinstance(self.rfile, _InflateReader):
+            return self.rfile.pending()
+        timeout = self.connection.gettimeout()
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(timeout)
+
+    def read_command(self) -> Optional[str]:
+        """读取一条命令，客户端发送的字面量替换为引号字符串"""
+        line = self.rfile.readline()
+        if not line:
+            return None
+        self.count_received(len(line))
+        text = b''
+        while True:
+            match = self._LITERAL_RE.search(line)
+            if not match:
+                text += line
+                break
+            if not match.group(2):
+                self.send_line("+ Ready for literal data")
+            literal = self.rfile.read(int(match.group(1)))
+            self.count_received(len(literal))
+            value = literal.replace(b'\\', b'\\\\').replace(b'"', b'\\"')
+            text += line[:match.start()] + b'"' + value + b'"'
+            line = self.rfile.readline()
+            self.count_received(len(line))
+        return text.decode('utf-8', errors='replace').rstrip('\r\n')
+
+    def count_received(self, size: int):
+        """统计收到的命令字节数，未压缩时同时计入线路字节数"""
+        self.owner.count('bytes_received', size)
+        if not self.compressed:
+            self.owner.count('wire_received', size)
+
+    def dispatch(self, line: str) -> bool:
+        """解析并执行一条命令
+
+        Returns:
+            bool: 连接应继续保持返回True，LOGOUT 后返回False
+        """
+        match = self._COMMAND_RE.match(line)
+        if not match:
+            self.send_line(f"* BAD Invalid command: {line}")
+            return True
+
+        tag, command, args = match.group(1), match.group(2).upper(), match.group(3)
+        use_uid = False
+        if command == 'UID':
+            parts = args.split(' ', 1)
+            command, args, use_uid = parts[0].upper(), parts[1] if len(parts) > 1 else '', True
+
+        name = f"UID {command}" if use_uid else command
+        names = self.owner.stats['command_names']
+        names[name] = names.get(name, 0) + 1
+
+        handler = getattr(self, f"cmd_{command.lower()}", None)
+        if handler is None:
+            self.send_line(f"{tag} BAD Unknown command {command}")
+            return True
+        try:
+            if use_uid:
+                return handler(tag, args, use_uid=True) is not False
+            return handler(tag, args) is not False
+        except TypeError:
+            self.send_line(f"{tag} BAD UID not supported for {command}")
+        except Exception as e:
+            self.send_line(f"{tag} BAD {type(e).__name__}: {e}")
+        return True
+
+    def send_bytes(self, data: bytes):
+        """发送原始响应数据，超过 drop_after 字节时只发送到限额处并断开连接"""
+        limit = self.owner.drop_after
+        if limit:
+            if self._sent >= limit:
+                raise ConnectionAbortedError("connection dropped")
+            if self._sent + len(data) > limit:
+                data = data[:limit - self._sent]
+                self.wfile.write(data)
+                self.wfile.flush()
+                self._sent = limit
+                self.owner.count('drops')
+                self.request.shutdown(socket.SHUT_RDWR)
+                raise ConnectionAbortedError("connection dropped")
+            self._sent += len(data)
+        self.owner.count('bytes_sent', len(data))
+        if not self.compressed:
+            self.owner.count('wire_sent', len(data))
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def send_line(self, text: str):
+        """发送一行响应"""
+        self.send_bytes(text.encode('utf-8') + b'\r\n')
+
+    def notify(self, text: str):
+        """登记一条未经请求的响应，在下次响应前或IDLE期间发送"""
+        with self._lock:
+            self._pending.append(text.encode('utf-8') + b'\r\n')
+
+    def flush_pending(self):
+        """发送所有待发送的未经请求响应"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for data in pending:
+            self.send_bytes(data)
+
+    def finish_command(self, tag: str, text: str):
+        """发送待发送的通知和带标签的完成响应"""
+        self.flush_pending()
+        self.send_line(f"{tag} {text}")
+
+    def require_selected(self, tag: str) -> Optional[FakeMailbox]:
+        """返回已选择的文件夹，未选择时发送错误响应"""
+        mailbox = self.owner.mailboxes.get(self.selected) if self.selected else None
+        if mailbox is None:
+            self.send_line(f"{tag} BAD No mailbox selected")
+        return mailbox
+
+    def resolve_set(self, mailbox: FakeMailbox, text: str, use_uid: bool) -> List[Tuple[int, FakeMessage]]:
+        """将序号或UID集合解析为 (序号, 邮件) 列表"""
+        messages = mailbox.messages
+        if not messages:
+            return []
+        top = messages[-1].uid if use_uid else len(messages)
+        wanted = set()
+        ranges = []
+        for part in text.split(','):
+            bounds = [top if b == '*' else int(b) for b in part.split(':', 1)]
+            low, high = min(bounds), max(bounds)
+            ranges.append((low, high))
+        for seq, message in enumerate(messages, 1):
+            key = message.uid if use_uid else seq
+            if any(low <= key <= high for low, high in ranges):
+                wanted.add(seq)
+        return [(seq, messages[seq - 1]) for seq in sorted(wanted)]
+
+    # ---- 基本命令 ----
+
+    def cmd_capability(self, tag: str, args: str):
+        self.send_line("* CAPABILITY " + ' '.join(self.owner.capabilities))
+        self.finish_command(tag, "OK CAPABILITY completed")
+
+    def cmd_noop(self, tag: str, args: str):
+        self.finish_command(tag, "OK NOOP completed")
+
+    def cmd_check(self, tag: str, args: str):
+        self.finish_command(tag, "OK CHECK completed")
+
+    def cmd_login(self, tag: str, args: str):
+        self.authenticated = True
+        self.finish_command(tag, "OK LOGIN completed")
+
+    def cmd_enable(self, tag: str, args: str):
+        enabled = [cap for cap in args.upper().split() if cap in self.owner.capabilities
+                   and cap in ('CONDSTORE', 'QRESYNC')]
+        if 'CONDSTORE' in enabled:
+            self.condstore = True
+        self.send_line("* ENABLED" + ''.join(' ' + cap for cap in enabled))
+        self.finish_command(tag, "OK ENABLE completed")
+
+    def cmd_compress(self, tag: str, args: str):
+        if 'COMPRESS=DEFLATE' not in self.owner.capabilities:
+            self.send_line(f"{tag} BAD Unknown command COMPRESS")
+            return
+        if args.strip().upper() != 'DEFLATE':
+            self.send_line(f"{tag} BAD Unsupported compression mechanism")
+            return
+        if self.compressed:
+            self.send_line(f"{tag} NO [COMPRESSIONACTIVE] DEFLATE active via COMPRESS")
+            return
+        self.finish_command(tag, "OK DEFLATE active")
+        self.rfile = _InflateReader(self.request, self.rfile, self.owner)
+        self.wfile = _DeflateWriter(self.wfile, self.owner)
+        self.compressed = True
+
+    def cmd_select(self, tag: str, args: str, readonly: bool = False):
+        arguments = parse_arguments(args)
+        name = arguments[0] if arguments else 'INBOX'
+        server = self.owner
+        mailbox = server.mailboxes.get(server.mailbox_key(name))
+        if mailbox is None:
+            self.selected = None
+            self.finish_command(tag, "NO Mailbox does not exist")
+            return
+        self.selected = mailbox.name
+        self.readonly = readonly
+        self.send_line(f"* {len(mailbox.messages)} EXISTS")
+        self.send_line("* 0 RECENT")
+        self.send_line("* FLAGS (%s)" % ' '.join(_SYSTEM_FLAGS))
+        self.send_line("* OK [PERMANENTFLAGS (%s \\*)] Flags permitted" % ' '.join(_SYSTEM_FLAGS))
+        self.send_line(f"* OK [UIDVALIDITY {mailbox.uidvalidity}] UIDs valid")
+        self.send_line(f"* OK [UIDNEXT {mailbox.uidnext}] Predicted next UID")
+        if 'CONDSTORE' in server.capabilities:
+            self.send_line(f"* OK [HIGHESTMODSEQ {server.highestmodseq}] Highest")
+        mode = 'READ-ONLY' if readonly else 'READ-WRITE'
+        self.finish_command(tag, f"OK [{mode}] SELECT completed")
+
+    def cmd_examine(self, tag: str, args: str):
+        self.cmd_select(tag, args, readonly=True)
+
+    def cmd_status(self, tag: str, args: str):
+        arguments = parse_arguments(args)
+        server = self.owner
+        mailbox = server.mailboxes.get(server.mailbox_key(arguments[0])) if arguments else None
+        if mailbox is None:
+            self.finish_command(tag, "NO Mailbox does not exist")
+            return
+        values = {
+            'MESSAGES': len(mailbox.messages),
+            'RECENT': 0,
+            'UIDNEXT': mailbox.uidnext,
+            'UIDVALIDITY': mailbox.uidvalidity,
+            'UNSEEN': sum(1 for m in mailbox.messages if not m.has_flag('\\Seen')),
+            'HIGHESTMODSEQ': server.highestmodseq
+        }
+        items = arguments[1] if len(arguments) > 1 and isinstance(arguments[1], list) else []
+        result = ' '.join(f"{item.upper()} {values[item.upper()]}" for item in items
+                          if item.upper() in values)
+        self.send_line(f"* STATUS {quote(arguments[0])} ({result})")
+        self.finish_command(tag, "OK STATUS completed")
+
+    def cmd_idle(self, tag: str, args: str):
+        if 'IDLE' not in self.owner.capabilities:
+            self.send_line(f"{tag} BAD Unknown command IDLE")
+            return
+        # RFC 3501 允许在继续响应之前发送未经请求的响应
+        if self.owner.exists_before_idle and self.selected in self.owner.mailboxes:
+            self.send_line(f"* {len(self.owner.mailboxes[self.selected].messages)} EXISTS")
+        self.flush_pending()
+        self.send_line("+ idling")
+        while True:
+            self.flush_pending()
+            readable, _, _ = select.select([self.request], [], [], 0.05)
+            if not readable:
+                continue
+            line = self.rfile.readline()
+            if not line:
+                return False
+            if line.strip().upper() == b'DONE':
+                break
+        self.finish_command(tag, "OK IDLE terminated")
+
+    def cmd_close(self, tag: str, args: str):
+        mailbox = self.owner.mailboxes.get(self.selected) if self.selected else None
+        if mailbox is not None and not self.readonly:
+            self.owner.expunge(mailbox)
+        self.selected = None
+        self.finish_command(tag, "OK CLOSE completed")
+
+    def cmd_logout(self, tag: str, args: str):
+        self.send_line("* BYE Fake IMAP server logging out")
+        self.send_line(f"{tag} OK LOGOUT completed")
+        return False
+
+    # ---- SEARCH ----
+
+    def cmd_search(self, tag: str, args: str, use_uid: bool = False):
+        mailbox = self.require_selected(tag)
+        if mailbox is None:
+            return
+        arguments = parse_arguments(args)
+        return_options = None
+        if len(arguments) >= 2 and str(arguments[0]).upper() == 'RETURN' \
+                and 'ESEARCH' in self.owner.capabilities:
+            return_options = [str(o).upper() for o in arguments[1]] or ['ALL']
+            arguments = arguments[2:]
+        if arguments and str(arguments[0]).upper() == 'CHARSET':
+            arguments = arguments[2:]
+
+        predicate = self._compile_search(mailbox, arguments)
+        matches = [(seq, m) for seq, m in enumerate(mailbox.messages, 1) if predicate(seq, m)]
+        numbers = [m.uid if use_uid else seq for seq, m in matches]
+
+        if return_options is None:
+            self.send_line("* SEARCH" + ''.join(f" {n}" for n in numbers))
+        else:
+            result = [f'(TAG "{tag}")'] + (['UID'] if use_uid else [])
+            if numbers and 'MIN' in return_options:
+                result.append(f"MIN {min(numbers)}")
+            if numbers and 'MAX' in return_options:
+                result.append(f"MAX {max(numbers)}")
+            if 'COUNT' in return_options:
+                result.append(f"COUNT {len(numbers)}")
+            if numbers and 'ALL' in return_options:
+                result.append("ALL " + self.owner.compress(numbers))
+            self.send_line("* ESEARCH " + ' '.join(result))
+        self.finish_command(tag, "OK SEARCH completed")
+
+    def _compile_search(self, mailbox: FakeMailbox, keys: List[Any]) -> Callable[[int, FakeMessage], bool]:
+        """将 SEARCH 条件编译为判断函数，多个条件之间为 AND"""
+        predicates = []
+        pos = 0
+        while pos < len(keys):
+            predicate, pos = self._compile_key(mailbox, keys, pos)
+            predicates.append(predicate)
+        return lambda seq, m: all(p(seq, m) for p in predicates)
+
+    def _compile_key(self, mailbox: FakeMailbox, keys: List[Any], pos: int):
+        key = keys[pos]
+        pos += 1
+        if isinstance(key, list):
+            return self._compile_search(mailbox, key), pos
+
+        name = key.upper()
+        flag_keys = {
+            'SEEN': ('\\Seen', True), 'UNSEEN': ('\\Seen', False),
+            'ANSWERED': ('\\Answered', True), 'UNANSWERED': ('\\Answered', False),
+            'DELETED': ('\\Deleted', True), 'UNDELETED': ('\\Deleted', False),
+            'FLAGGED': ('\\Flagged', True), 'UNFLAGGED': ('\\Flagged', False),
+            'DRAFT': ('\\Draft', True), 'UNDRAFT': ('\\Draft', False),
+        }
+        if name in flag_keys:
+            flag, expected = flag_keys[name]
+            return (lambda seq, m: m.has_flag(flag) == expected), pos
+        if name in ('ALL', 'OLD'):
+            return (lambda seq, m: True), pos
+        if name in ('NEW', 'RECENT'):
+            return (lambda seq, m: False), pos
+        if name in ('KEYWORD', 'UNKEYWORD'):
+            flag, expected = keys[pos], name == 'KEYWORD'
+            return (lambda seq, m: m.has_flag(flag) == expected), pos + 1
+        if name in ('FROM', 'TO', 'CC', 'BCC', 'SUBJECT'):
+            field, value = name, keys[pos].lower()
+            return (lambda seq, m: value in decode_text(m.parsed.get(field)).lower()), pos + 1
+        if name == 'HEADER':
+            field, value = keys[pos], keys[pos + 1].lower()
+            return (lambda seq, m: value in decode_text(m.parsed.get(field)).lower()), pos + 2
+        if name in ('BODY', 'TEXT'):
+            value = keys[pos].lower().encode('utf-8')
+            source = (lambda m: m.text_bytes) if name == 'BODY' else (lambda m: m.raw)
+            return (lambda seq, m: value in source(m).lower()), pos + 1
+        if name in ('SINCE', 'BEFORE', 'ON'):
+            day = parse_search_date(keys[pos]).date()
+            compare = {'SINCE': lambda d: d >= day, 'BEFORE': lambda d: d < day,
+                       'ON': lambda d: d == day}[name]
+            return (lambda seq, m: compare(datetime.fromtimestamp(m.internaldate).date())), pos + 1
+        if name in ('LARGER', 'SMALLER'):
+            size = int(keys[pos])
+            if name == 'LARGER':
+                return (lambda seq, m: len(m.raw) > size), pos + 1
+            return (lambda seq, m: len(m.raw) < size), pos + 1
+        if name == 'MODSEQ':
+            modseq = int(keys[pos])
+            return (lambda seq, m: m.modseq >= modseq), pos + 1
+        if name == 'UID':
+            selected = {id(m) for _, m in self.resolve_set(mailbox, keys[pos], True)}
+            return (lambda seq, m: id(m) in selected), pos + 1
+        if name == 'NOT':
+            inner, pos = self._compile_key(mailbox, keys, pos)
+            return (lambda seq, m: not inner(seq, m)), pos
+        if name == 'OR':
+            left, pos = self._compile_key(mailbox, keys, pos)
+            right, pos = self._compile_key(mailbox, keys, pos)
+            return (lambda seq, m: left(seq, m) or right(seq, m)), pos
+        if re.match(r'^[0-9*:,]+$', name):
+            selected = {seq for seq, _ in self.resolve_set(mailbox, name, False)}
+            return (lambda seq, m: seq in selected), pos
+        raise ValueError(f"Unsupported search key {key}")
+
+    # ---- FETCH ----
+
+    def cmd_fetch(self, tag: str, args: str, use_uid: bool = False):
+        mailbox = self.require_selected(tag)
+        if mailbox is None:
+            return
+        arguments = parse_arguments(args)
+        targets = self.resolve_set(mailbox, arguments[0], use_uid)
+        items = arguments[1] if len(arguments) > 1 else []
+        if not isinstance(items, list):
+            items = [items]
+        macros = {
+            'ALL': ['FLAGS', 'INTERNALDATE', 'RFC822.SIZE', 'ENVELOPE'],
+            'FAST': ['FLAGS', 'INTERNALDATE', 'RFC822.SIZE'],
+            'FULL': ['FLAGS', 'INTERNALDATE', 'RFC822.SIZE', 'ENVELOPE', 'BODY'],
+        }
+        if len(items) == 1 and isinstance(items[0], str) and items[0].upper() in macros:
+            items = macros[items[0].upper()]
+        if use_uid and not any(isinstance(i, str) and i.upper() == 'UID' for i in items):
+            items = ['UID'] + items
+
+        for seq, message in targets:
+            self.send_bytes(self._fetch_response(seq, message, items))
+        self.finish_command(tag, "OK FETCH completed")
+
+    def _fetch_response(self, seq: int, message: FakeMessage, items: List[Any]) -> bytes:
+        """生成一封邮件的 FETCH 响应"""
+        parts: List[bytes] = []
+        mark_seen = False
+        for item in items:
+            if isinstance(item, list):
+                continue
+            name = item.upper()
+            if name == 'UID':
+                parts.append(b'UID %d' % message.uid)
+            elif name == 'FLAGS':
+                parts.append(('FLAGS (%s)' % ' '.join(sorted(message.flags))).encode())
+            elif name == 'INTERNALDATE':
+                parts.append(('INTERNALDATE "%s"' % message.internaldate_text()).encode())
+            elif name == 'RFC822.SIZE':
+                parts.append(b'RFC822.SIZE %d' % len(message.raw))
+            elif name == 'MODSEQ':
+                parts.append(b'MODSEQ (%d)' % message.modseq)
+            elif name == 'ENVELOPE':
+                parts.append(('ENVELOPE %s' % self._envelope(message.parsed))
+                             .encode('utf-8', 'surrogateescape'))
+            elif name in ('BODY', 'BODYSTRUCTURE'):
+                structure = self._body_structure(message.parsed, name == 'BODYSTRUCTURE')
+                parts.append(('%s %s' % (name, structure)).encode('utf-8', 'surrogateescape'))
+            elif name in ('RFC822', 'RFC822.HEADER', 'RFC822.TEXT'):
+                data = {'RFC822': message.raw, 'RFC822.HEADER': message.header_bytes,
+                        'RFC822.TEXT': message.text_bytes}[name]
+                parts.append(name.encode() + b' {%d}\r\n' % len(data) + data)
+                mark_seen = mark_seen or name != 'RFC822.HEADER'
+            else:
+                match = self._SECTION_RE.match(item)
+                if not match:
+                    raise ValueError(f"Unsupported fetch item {item}")
+                data = self._section(message, match.group(2))
+                label = 'BODY[%s]' % match.group(2)
+                if match.group(3) is not None:
+                    offset = int(match.group(3))
+                    length = int(match.group(4)) if match.group(4) else len(data)
+                    data = data[offset:offset + length]
+                    label += '<%d>' % offset
+                parts.append(label.encode() + b' {%d}\r\n' % len(data) + data)
+                mark_seen = mark_seen or match.group(1).upper() == 'BODY' or (
+                    self.owner.ignore_peek and not match.group(2).upper().startswith('HEADER'))
+
+        if mark_seen and not self.readonly and not message.has_flag('\\Seen'):
+            self.owner.set_flags(message, message.flags | {'\\Seen'})
+            if not any(isinstance(i, str) and i.upper() == 'FLAGS' for i in items):
+                parts.append(('FLAGS (%s)' % ' '.join(sorted(message.flags))).encode())
+        return b'* %d FETCH (' % seq + b' '.join(parts) + b')\r\n'
+
+    def _section(self, message: FakeMessage, section: str) -> bytes:
+        """取出 BODY[<section>] 对应的内容"""
+        spec = section.upper()
+        if spec == '':
+            return message.raw
+        if spec == 'HEADER':
+            return message.header_bytes
+        if spec == 'TEXT':
+            return message.text_bytes
+        match = re.match(r'^HEADER\.FIELDS(\.NOT)?\s*\((.*)\)$', spec)
+        if match:
+            return message.header_fields(match.group(2).split(), bool(match.group(1)))
+
+        match = re.match(r'^([0-9]+(?:\.[0-9]+)*)(?:\.(MIME|HEADER|TEXT))?$', spec)
+        if not match:
+            raise ValueError(f"Unsupported section {section}")
+        suffix = match.group(2)
+        part = self._find_part(message.parsed, [int(n) for n in match.group(1).split('.')])
+        if part is None:
+            return b''
+        if suffix == 'MIME':
+            return b''.join(('%s: %s\r\n' % (k, v)).encode('utf-8', 'surrogateescape')
+                            for k, v in part.items()) + b'\r\n'
+        if suffix in ('HEADER', 'TEXT'):
+            inner = part.get_payload(0) if part.get_content_type() == 'message/rfc822' else part
+            raw = inner.as_bytes(policy=compat32.clone(linesep='\r\n'))
+            end = raw.find(b'\r\n\r\n')
+            return raw[:end + 4] if suffix == 'HEADER' else raw[end + 4:]
+        return self._part_body(part)
+
+    @staticmethod
+    def _find_part(message: Message, numbers: List[int]) -> Optional[Message]:
+        """根据段落号找到对应的 MIME 段落"""
+        part = message
+        for number in numbers:
+            if part.get_content_type() == 'message/rfc822' and part is not message:
+                part = part.get_payload(0)
+            if part.is_multipart():
+                children = part.get_payload()
+                if number < 1 or number > len(children):
+                    return None
+                part = children[number - 1]
+            elif number != 1:
+                return None
+        return part
+
+    @staticmethod
+    def _part_body(part: Message) -> bytes:
+        """返回段落的原始（未解码）内容"""
+        if part.is_multipart() or part.get_content_type() == 'message/rfc822':
+            raw = part.as_bytes(policy=compat32.clone(linesep='\r\n'))
+            if part.get_content_type() == 'message/rfc822':
+                return part.get_payload(0).as_bytes(policy=compat32.clone(linesep='\r\n'))
+            end = raw.find(b'\r\n\r\n')
+            return raw[end + 4:]
+        payload = part.get_payload(decode=False)
+        if isinstance(payload, bytes):
+            return payload
+        return payload.encode('ascii', 'surrogateescape')
+
+    def _body_structure(self, part: Message, extended: bool = True) -> str:
+        """生成段落的 BODYSTRUCTURE"""
+        if part.is_multipart():
+            children = ''.join(self._body_structure(child, extended) for child in part.get_payload())
+            result = '(%s %s' % (children, quote(part.get_content_subtype()))
+            if extended:
+                result += ' %s %s NIL NIL' % (self._params(part), self._disposition(part))
+            return result + ')'
+
+        maintype, subtype = part.get_content_maintype(), part.get_content_subtype()
+        body = self._part_body(part)
+        fields = '%s %s %s %s %s %s %d' % (
+            quote(maintype), quote(subtype), self._params(part),
+            quote(part.get('Content-ID')), quote(part.get('Content-Description')),
+            quote(part.get('Content-Transfer-Encoding', '7bit').strip()), len(body))
+        if maintype == 'message' and subtype == 'rfc822':
+            inner = part.get_payload(0)
+            fields += ' %s %s %d' % (self._envelope(inner), self._body_structure(inner, extended),
+                                     body.count(b'\n'))
+        elif maintype == 'text':
+            fields += ' %d' % body.count(b'\n')
+        if extended:
+            fields += ' NIL %s NIL NIL' % self._disposition(part)
+        return '(%s)' % fields
+
+    _PARAM_RE = re.compile(r';\s*([^=;\s]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^;]*)')
+
+    @classmethod
+    def _params(cls, part: Message, header: str = 'content-type') -> str:
+        """生成参数列表，RFC 2047 / 2231 编码的参数保持原样输出"""
+        value = part.get(header)
+        if not value:
+            return 'NIL'
+        value = re.sub(r'\r?\n[ \t]+', ' ', str(value))
+        values = []
+        for key, param in cls._PARAM_RE.findall(value):
+            param = param.strip()
+            if param.startswith('"') and param.endswith('"'):
+                param = re.sub(r'\\(.)', r'\1', param[1:-1])
+            values.append('%s %s' % (quote(key.lower()), quote(param)))
+        return '(%s)' % ' '.join(values) if values else 'NIL'
+
+    def _disposition(self, part: Message) -> str:
+        value = part.get('Content-Disposition')
+        if not value:
+            return 'NIL'
+        kind = value.split(';', 1)[0].strip()
+        return '(%s %s)' % (quote(kind), self._params(part, 'content-disposition'))
+
+    @staticmethod
+    def _envelope(message: Message) -> str:
+        """生成简化的 ENVELOPE（地址字段只包含原始文本）"""
+        def address(field):
+            value = message.get(field)
+            if not value:
+                return 'NIL'
+            name, addr = email.utils.parseaddr(value)
+            mailbox, _, host = addr.partition('@')
+            return '((%s NIL %s %s))' % (quote(name or None), quote(mailbox), quote(host))
+
+        return '(%s %s %s %s %s %s %s %s %s %s)' % (
+            quote(message.get('Date')), quote(message.get('Subject')),
+            address('From'), address('Sender') if message.get('Sender') else address('From'),
+            address('Reply-To') if message.get('Reply-To') else address('From'),
+            address('To'), address('Cc'), address('Bcc'),
+            quote(message.get('In-Reply-To')), quote(message.get('Message-ID')))
+
+    # ---- STORE / EXPUNGE ----
+
+    def cmd_store(self, tag: str, args: str, use_uid: bool = False):
+        mailbox = self.require_selected(tag)
+        if mailbox is None:
+            return
+        if self.readonly:
+            self.finish_command(tag, "NO Mailbox is read-only")
+            return
+        arguments = parse_arguments(args)
+        targets = self.resolve_set(mailbox, arguments[0], use_uid)
+        operation = arguments[1].upper()
+        flags = arguments[2] if isinstance(arguments[2], list) else arguments[2:]
+        silent = operation.endswith('.SILENT')
+        operation = operation.replace('.SILENT', '')
+
+        for seq, message in targets:
+            if operation == '+FLAGS':
+                new_flags = message.flags | set(flags)
+            elif operation == '-FLAGS':
+                removed = {f.lower() for f in flags}
+                new_flags = {f for f in message.flags if f.lower() not in removed}
+            else:
+                new_flags = set(flags)
+            self.owner.set_flags(message, new_flags)
+            if not silent:
+                uid = 'UID %d ' % message.uid if use_uid else ''
+                self.send_line('* %d FETCH (%sFLAGS (%s))' % (seq, uid, ' '.join(sorted(message.flags))))
+        self.finish_command(tag, "OK STORE completed")
+
+    def cmd_expunge(self, tag: str, args: str, use_uid: bool = False):
+        mailbox = self.require_selected(tag)
+        if mailbox is None:
+            return
+        uids = None
+        if use_uid:
+            uids = {m.uid for _, m in self.resolve_set(mailbox, args.strip(), True)}
+        for seq in self.owner.expunge(mailbox, uids):
+            self.send_line(f"* {seq} EXPUNGE")
+        self.finish_command(tag, "OK EXPUNGE completed")
+
+    def cmd_copy(self, tag: str, args: str, use_uid: bool = False, move: bool = False):
+        mailbox = self.require_selected(tag)
+        if mailbox is None:
+            return
+        if move and self.readonly:
+            self.finish_command(tag, "NO Mailbox is read-only")
+            return
+        arguments = parse_arguments(args)
+        targets = self.resolve_set(mailbox, arguments[0], use_uid)
+        server = self.owner
+        target = server.mailboxes.get(server.mailbox_key(arguments[1]))
+        if target is None:
+            self.finish_command(tag, "NO [TRYCREATE] Mailbox does not exist")
+            return
+        new_uids = server.copy_messages([m for _, m in targets], target)
+        code = ''
+        if targets and 'UIDPLUS' in server.capabilities:
+            code = '[COPYUID %d %s %s] ' % (target.uidvalidity, server.compress([m.uid for _, m in targets]),
+                                            server.compress(new_uids))
+        if move:
+            # UIDPLUS 要求 MOVE 在删除原邮件之前以未标记的 OK 返回 COPYUID
+            if code:
+                self.send_line(f"* OK {code.strip()}")
+            removed = server.expunge(mailbox, {m.uid for _, m in targets}, deleted_only=False)
+            for seq in removed:
+                self.send_line(f"* {seq} EXPUNGE")
+            self.finish_command(tag, "OK MOVE completed")
+            return
+        self.finish_command(tag, f"OK {code}COPY completed")
+
+    def cmd_move(self, tag: str, args: str, use_uid: bool = False):
+        if 'MOVE' not in self.owner.capabilities:
+            self.send_line(f"{tag} BAD Unknown command MOVE")
+            return
+        self.cmd_copy(tag, args, use_uid, move=True)
+
+    def cmd_create(self, tag: str, args: str):
+        arguments = parse_arguments(args)
+        server = self.owner
+        if server.mailbox_key(arguments[0]) in server.mailboxes:
+            self.finish_command(tag, "NO [ALREADYEXISTS] Mailbox already exists")
+            return
+        server.create_mailbox(arguments[0])
+        self.finish_command(tag, "OK CREATE completed")
+
+    def cmd_list(self, tag: str, args: str):
+        arguments = parse_arguments(args)
+        pattern = arguments[1] if len(arguments) > 1 else '*'
+        regex = re.compile('^' + re.escape(pattern).replace('\\*', '.*').replace('%', '[^/]*') + '$',
+                           re.IGNORECASE)
+        for name in sorted(self.owner.mailboxes):
+            if regex.match(name):
+                self.send_line('* LIST (\\HasNoChildren) "/" %s' % quote(name))
+        self.finish_command(tag, "OK LIST completed")
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeImapServer:
+    """本地 IMAP 替身服务器
+
+    主要功能：
+    1. 在本机端口上接受 IMAP 连接
+    2. 在内存中保存邮件，可从 .eml 目录加载
+    3. 支持 SEARCH / FETCH / STORE / COPY / MOVE / EXPUNGE 及 UID 形式，FETCH 支持段落和部分获取
+    4. 投递新邮件时向所有已选择该文件夹的连接推送 EXISTS 通知
+    5. 可关闭 IDLE 能力以验证回退逻辑，可在 IDLE 的继续响应之前发送 EXISTS，可为每条命令注入延迟
+    6. 统计命令数、压缩前和线路上的收发字节数以及各命令次数
+    7. 可使用证书接受 IMAPS 连接，支持 TLS 会话复用
+    8. 可在每个连接发送一定字节数后断开，模拟下载中途断线
+    9. 可模拟不遵守 PEEK、获取内容即标记已读的服务器
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 capabilities: Tuple[str, ...] = ('IMAP4rev1', 'IDLE'),
+                 latency: float = 0.0, ssl_context: Optional[ssl.SSLContext] = None):
+        """初始化替身服务器
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示随机端口
+            capabilities: 对外声明的能力列表，可加入 ESEARCH、CONDSTORE、ENABLE、COMPRESS=DEFLATE、MOVE、UIDPLUS
+            latency: 每条命令注入的往返延迟秒数，流水线中已到达的命令不再延迟
+            ssl_context: 服务端 SSL 上下文，提供时接受 IMAPS 连接（连接建立后即握手）
+        """
+        self.host = host
+        self.port = port
+        self.capabilities = list(capabilities)
+        self.latency = latency
+        self.ssl_context = ssl_context
+        # 每个连接发送多少字节后断开，用于验证断线重连和断点续传，0 表示不断开
+        self.drop_after = 0
+        # 为True时在 IDLE 的继续响应（+ idling）之前先发送当前邮件数的 EXISTS
+        self.exists_before_idle = False
+        # 为True时 BODY.PEEK[...] 获取邮件内容也设置 \Seen（头部字段除外），模拟不遵守 PEEK 的服务器
+        self.ignore_peek = False
+        self.mailboxes: Dict[str, FakeMailbox] = {'INBOX': FakeMailbox('INBOX')}
+        self.highestmodseq = 1
+        self._handlers: List[FakeImapHandler] = []
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Any] = {}
+        self.reset_stats()
+        self._server: Optional[_ThreadingServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def inbox(self) -> FakeMailbox:
+        return self.mailboxes['INBOX']
+
+    @property
+    def messages(self) -> List[FakeMessage]:
+        return self.inbox.messages
+
+    @property
+    def uidvalidity(self) -> int:
+        return self.inbox.uidvalidity
+
+    @property
+    def uidnext(self) -> int:
+        return self.inbox.uidnext
+
+    def start(self) -> Tuple[str, int]:
+        """在后台线程中启动服务器
+
+        Returns:
+            Tuple[str, int]: 实际监听的地址和端口
+        """
+        self._server = _ThreadingServer((self.host, self.port), FakeImapHandler)
+        self._server.owner = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.host, self.port
+
+    def stop(self):
+        """停止服务器"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def register(self, handler: FakeImapHandler):
+        with self._lock:
+            self._handlers.append(handler)
+
+    def unregister(self, handler: FakeImapHandler):
+        with self._lock:
+            if handler in self._handlers:
+                self._handlers.remove(handler)
+
+    def reset_stats(self):
+        """清零统计数据"""
+        with self._lock:
+            self.stats = {'commands': 0, 'bytes_sent': 0, 'bytes_received': 0,
+                          'wire_sent': 0, 'wire_received': 0, 'drops': 0, 'command_names': {}}
+
+    def count(self, key: str, value: int = 1):
+        with self._lock:
+            self.stats[key] += value
+
+    def apply_latency(self):
+        """按配置注入命令延迟"""
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def mailbox_key(name: str) -> str:
+        """文件夹名称，INBOX 不区分大小写"""
+        return 'INBOX' if name.upper() == 'INBOX' else name
+
+    def create_mailbox(self, name: str) -> FakeMailbox:
+        """创建文件夹（已存在时直接返回）"""
+        key = self.mailbox_key(name)
+        with self._lock:
+            if key not in self.mailboxes:
+                self.mailboxes[key] = FakeMailbox(key)
+            return self.mailboxes[key]
+
+    @staticmethod
+    def compress(numbers: List[int]) -> str:
+        """将编号列表压缩为集合字符串"""
+        numbers = sorted(numbers)
+        ranges, start, prev = [], numbers[0], numbers[0]
+        for num in numbers[1:]:
+            if num == prev + 1:
+                prev = num
+                continue
+            ranges.append(f"{start}:{prev}" if start != prev else str(start))
+            start = prev = num
+        ranges.append(f"{start}:{prev}" if start != prev else str(start))
+        return ','.join(ranges)
+
+    def set_flags(self, message: FakeMessage, flags: set):
+        """修改邮件标志，标志变化时更新 MODSEQ"""
+        with self._lock:
+            if flags != message.flags:
+                self.highestmodseq += 1
+                message.modseq = self.highestmodseq
+                message.flags = set(flags)
+
+    def expunge(self, mailbox: FakeMailbox, uids: Optional[set] = None, deleted_only: bool = True) -> List[int]:
+        """删除带 \\Deleted 标志的邮件
+
+        Args:
+            mailbox: 文件夹
+            uids: 只删除这些UID的邮件，为None时不限制
+            deleted_only: 为False时不要求 \\Deleted 标志（MOVE 删除原邮件）
+
+        Returns:
+            List[int]: 依次发送的 EXPUNGE 序号
+        """
+        removed = []
+        with self._lock:
+            seq = 1
+            kept = []
+            for message in mailbox.messages:
+                if ((not deleted_only or message.has_flag('\\Deleted'))
+                        and (uids is None or message.uid in uids)):
+                    removed.append(seq)
+                    continue
+                kept.append(message)
+                seq += 1
+            mailbox.messages = kept
+            if removed:
+                self.highestmodseq += 1
+        return removed
+
+    def copy_messages(self, messages: List[FakeMessage], target: FakeMailbox) -> List[int]:
+        """将邮件连同标志和 INTERNALDATE 复制到目标文件夹，并通知已选择目标文件夹的连接
+
+        Returns:
+            List[int]: 新邮件在目标文件夹中的UID，与 messages 一一对应
+        """
+        new_uids = []
+        with self._lock:
+            for message in messages:
+                self.highestmodseq += 1
+                target.messages.append(FakeMessage(target.uidnext, message.raw, tuple(message.flags),
+                                                   message.internaldate, self.highestmodseq))
+                new_uids.append(target.uidnext)
+                target.uidnext += 1
+            count = len(target.messages)
+            handlers = list(self._handlers)
+        if new_uids:
+            for handler in handlers:
+                if handler.selected == target.name:
+                    handler.notify(f"* {count} EXISTS")
+        return new_uids
+
+    def deliver(self, raw: bytes, flags: Tuple[str, ...] = (), mailbox: str = 'INBOX',
+                internaldate: Optional[float] = None) -> int:
+        """投递一封新邮件并通知所有已选择该文件夹的连接
+
+        Args:
+            raw: 邮件原始内容
+            flags: 初始标记
+            mailbox: 目标文件夹，不存在时自动创建
+            internaldate: 邮件的 INTERNALDATE 时间戳，默认当前时间
+
+        Returns:
+            int: 新邮件的UID
+        """
+        target = self.create_mailbox(mailbox)
+        with self._lock:
+            uid = target.uidnext
+            target.uidnext += 1
+            self.highestmodseq += 1
+            target.messages.append(FakeMessage(uid, raw, flags, internaldate, self.highestmodseq))
+            count = len(target.messages)
+            handlers = list(self._handlers)
+        for handler in handlers:
+            if handler.selected == target.name:
+                handler.notify(f"* {count} EXISTS")
+                handler.notify("* 1 RECENT")
+        return uid
+
+    def load_eml_dir(self, directory: str, mailbox: str = 'INBOX') -> int:
+        """将目录中的 .eml 文件按文件名顺序投递到文件夹
+
+        Args:
+            directory: .eml 文件目录
+            mailbox: 目标文件夹
+
+        Returns:
+            int: 投递的邮件数
+        """
+        count = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.lower().endswith('.eml'):
+                continue
+            with open(os.path.join(directory, name), 'rb') as f:
+                self.deliver(f.read(), mailbox=mailbox)
+            count += 1
+        return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 IMAP 替身服务器")
+    parser.add_argument('--host', default='127.0.0.1', help="监听地址")
+    parser.add_argument('--port', type=int, default=1143, help="监听端口")
+    parser.add_argument('--eml-dir', help="启动时加载到 INBOX 的 .eml 文件目录")
+    parser.add_argument('--no-idle', action='store_true', help="不声明 IDLE 能力")
+    parser.add_argument('--esearch', action='store_true', help="声明 ESEARCH 能力")
+    parser.add_argument('--condstore', action='store_true', help="声明 ENABLE 和 CONDSTORE 能力")
+    parser.add_argument('--compress', action='store_true', help="声明 COMPRESS=DEFLATE 能力")
+    parser.add_argument('--move', action='store_true', help="声明 MOVE 能力")
+    parser.add_argument('--uidplus', action='store_true', help="声明 UIDPLUS 能力（UID EXPUNGE 和 COPYUID）")
+    parser.add_argument('--latency', type=float, default=0.0, help="每条命令注入的往返延迟秒数")
+    parser.add_argument('--drop-after', type=int, default=0, help="每个连接发送多少字节后断开，0 表示不断开")
+    parser.add_argument('--certfile', help="证书文件，与 --keyfile 一起提供时接受 IMAPS 连接")
+    parser.add_argument('--keyfile', help="证书私钥文件")
+    args = parser.parse_args()
+
+    capabilities = ['IMAP4rev1']
+    if not args.no_idle:
+        capabilities.append('IDLE')
+    if args.esearch:
+        capabilities.append('ESEARCH')
+    if args.condstore:
+        capabilities.extend(['ENABLE', 'CONDSTORE'])
+    if args.compress:
+        capabilities.append('COMPRESS=DEFLATE')
+    if args.move:
+        capabilities.append('MOVE')
+    if args.uidplus:
+        capabilities.append('UIDPLUS')
+    ssl_context = None
+    if args.certfile:
+        ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ssl_context.load_cert_chain(args.certfile, args.keyfile)
+    server = FakeImapServer(args.host, args.port, tuple(capabilities), args.latency, ssl_context)
+    server.drop_after = args.drop_after
+    if args.eml_dir:
+        print(f"Loaded {server.load_eml_dir(args.eml_dir)} messages from {args.eml_dir}")
+    host, port = server.start()
+    print(f"Fake IMAP server listening on {host}:{port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 from .email_decoder import EmailDecoder
 from .file_handler import FileHandler
+from .imap_helper import ImapHelper
 from .window_finder import find_window_by_title, start_and_find_window
 
 __all__ = [
     'EmailDecoder', 
     'FileHandler',
+    'ImapHelper',
     'find_window_by_title',
     'start_and_find_window'
 ] 
\ No newline at end of file
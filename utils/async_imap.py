@@ -0,0 +1,334 @@
+import re
+import ssl
+import asyncio
+from collections import deque
+from typing import List, Dict, Any, Optional, Tuple, Callable, Deque
+
+# 字面量数据的接收回调：(响应前缀, 数据块)
+LiteralSink = Callable[[bytes, bytes], None]
+
+
+class AsyncImapError(Exception):
+    """命令返回 NO/BAD 时抛出"""
+
+
+class AsyncImapAbort(AsyncImapError):
+    """连接断开或协议错误时抛出，所有未完成的命令都会收到该异常"""
+
+
+class _PendingCommand:
+    """一条已发送、等待完成响应的命令"""
+
+    __slots__ = ('tag', 'name', 'future', 'sink', 'untagged')
+
+    def __init__(self, tag: str, name: str, future: asyncio.Future, sink: Optional[LiteralSink]):
+        self.tag = tag
+        self.name = name
+        self.future = future
+        self.sink = sink
+        self.untagged: Dict[str, List[Any]] = {}
+
+
+class AsyncImapClient:
+    """基于 asyncio 的流水线 IMAP 客户端
+
+    主要功能：
+    1. 在一个连接上连续发送多条带标签的命令，不等待前一条完成
+    2. 由后台读取任务按顺序解析响应，未经请求的响应归入最早未完成的命令
+    3. 字面量可按块交给回调处理（literal_sink），大附件不必整体保存在内存中
+    4. 返回值与 imaplib 相同：(类型, 数据)，FETCH 字面量为 (前缀, 内容) 元组，
+       可直接交给 ImapHelper.parse_fetch_response 等现有解析函数
+
+    IMAP 服务器按接收顺序处理流水线中的命令并返回完成响应，
+    因此未经请求的响应总是属于最早发送且尚未完成的命令。
+    """
+
+    _TAGGED_RE = re.compile(rb'^(?P<tag>[A-Z]\d+) (?P<type>[A-Z]+) ?(?P<data>.*)$')
+    _UNTAGGED_RE = re.compile(rb'^\* (?:(?P<num>\d+) )?(?P<type>[A-Z-]+)(?: (?P<data>.*))?$', re.DOTALL)
+    _LITERAL_RE = re.compile(rb'\{(\d+)\}$')
+    _CODE_RE = re.compile(rb'^\[(?P<type>[A-Z-]+)(?: (?P<data>[^\]]*))?\]')
+
+    # UID 子命令的数据所在的响应类型，与 imaplib.IMAP4.uid 一致
+    _UID_RESPONSE = {'FETCH': 'FETCH', 'STORE': 'FETCH', 'SEARCH': 'SEARCH',
+                     'COPY': 'COPY', 'MOVE': 'MOVE', 'EXPUNGE': 'EXPUNGE'}
+
+    # 单行响应的最大长度，与 imaplib 的 _MAXLINE 一致
+    MAX_LINE = 1000000
+    # 流式读取字面量时每块的字节数
+    CHUNK_SIZE = 65536
+
+    def __init__(self, host: str, port: int, use_ssl: bool = True,
+                 ssl_context: Optional[ssl.SSLContext] = None):
+        """初始化客户端
+
+        Args:
+            host: 服务器地址
+            port: 服务器端口
+            use_ssl: 是否使用 SSL 连接
+            ssl_context: SSL 上下文，未提供时使用与 imaplib.IMAP4_SSL 相同的默认设置
+        """
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.ssl_context = ssl_context
+        self.capabilities: Tuple[str, ...] = ()
+        self.state = 'LOGOUT'
+        self.stats = {'commands': 0, 'max_in_flight': 0, 'bytes_received': 0}
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._pending: Deque[_PendingCommand] = deque()
+        self._tag_counter = 0
+        self._closed_error: Optional[Exception] = None
+
+    @property
+    def connected(self) -> bool:
+        """连接是否可用"""
+        return self._writer is not None and self._closed_error is None
+
+    async def connect(self):
+        """建立连接并读取服务器问候
+
+        Raises:
+            AsyncImapAbort: 服务器拒绝连接时抛出
+            OSError: 网络错误时抛出
+        """
+        context = None
+        if self.use_ssl:
+            # 与 imaplib.IMAP4_SSL 的默认设置一致
+            context = self.ssl_context or ssl._create_stdlib_context()
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host, self.port, ssl=context, limit=self.MAX_LINE + 2)
+        self._closed_error = None
+        greeting = await self._reader.readline()
+        if not greeting.startswith((b'* OK', b'* PREAUTH')):
+            await self.close()
+            raise AsyncImapAbort(greeting.decode('utf-8', errors='replace').strip() or 'no greeting')
+        self.state = 'AUTH' if greeting.startswith(b'* PREAUTH') else 'NONAUTH'
+        self._update_capabilities(greeting)
+        self._read_task = asyncio.ensure_future(self._read_loop())
+        if not self.capabilities:
+            _, data = await self.command('CAPABILITY')
+            if data and data[-1]:
+                self.capabilities = tuple(data[-1].decode('ascii').upper().split())
+
+    async def login(self, user: str, password: str):
+        """登录
+
+        Raises:
+            AsyncImapError: 登录失败时抛出
+        """
+        result = await self.command('LOGIN', self.quote(user), self.quote(password))
+        self.state = 'AUTH'
+        return result
+
+    async def select(self, mailbox: str, readonly: bool = False):
+        """选择文件夹
+
+        Args:
+            mailbox: 已编码并按需加引号的文件夹名称（见 ImapHelper.encode_mailbox）
+            readonly: 是否以只读方式（EXAMINE）打开
+        """
+        result = await self.command('EXAMINE' if readonly else 'SELECT', mailbox)
+        self.state = 'SELECTED'
+        return result
+
+    async def uid(self, command: str, *args: str, literal_sink: Optional[LiteralSink] = None):
+        """发送 UID 命令
+
+        Args:
+            command: FETCH、SEARCH、STORE 等
+            *args: 命令参数
+            literal_sink: 提供时字面量按块交给该回调，返回数据中对应的内容为None
+
+        Returns:
+            Tuple[str, List[Any]]: 与 imaplib.IMAP4.uid 相同的 (类型, 数据)
+        """
+        command = command.upper()
+        typ, data, untagged = await self._execute('UID', (command,) + args, literal_sink)
+        response = self._UID_RESPONSE.get(command)
+        if response is None:
+            return typ, data
+        return typ, untagged.get(response, [None])
+
+    async def command(self, name: str, *args: str, literal_sink: Optional[LiteralSink] = None):
+        """发送任意命令
+
+        Returns:
+            Tuple[str, List[Any]]: (类型, 与命令同名的未经请求的响应数据，没有时为完成响应的文本)
+        """
+        typ, data, untagged = await self._execute(name.upper(), args, literal_sink)
+        return typ, untagged.get(name.upper(), data)
+
+    async def response(self, name: str, *args: str) -> Tuple[str, Dict[str, List[Any]]]:
+        """发送命令并返回全部未经请求的响应，例如 SELECT 后的 UIDVALIDITY、EXISTS"""
+        typ, _, untagged = await self._execute(name.upper(), args, None)
+        return typ, untagged
+
+    async def logout(self):
+        """登出并关闭连接"""
+        if self.connected:
+            try:
+                await self._execute('LOGOUT', (), None)
+            except AsyncImapError:
+                pass
+        await self.close()
+
+    async def close(self):
+        """关闭连接，未完成的命令收到 AsyncImapAbort"""
+        self.state = 'LOGOUT'
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+        self._fail_pending(AsyncImapAbort('connection closed'))
+        if self._writer is not None:
+            try:
+                self._writer.close()
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+            self._writer = None
+
+    @staticmethod
+    def quote(value: str) -> str:
+        """将字符串转为 IMAP 引号字符串"""
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+    async def _execute(self, name: str, args: Tuple[str, ...], sink: Optional[LiteralSink]):
+        """发送一条命令并等待其完成响应
+
+        发送后立即让出控制权，调用方可以在等待期间继续发送其他命令。
+
+        Returns:
+            Tuple[str, List[bytes], Dict[str, List[Any]]]: (类型, 完成响应文本, 未经请求的响应)
+
+        Raises:
+            AsyncImapError: 命令返回 NO/BAD 时抛出
+            AsyncImapAbort: 连接断开时抛出
+        """
+        if not self.connected:
+            raise AsyncImapAbort(str(self._closed_error or 'not connected'))
+        self._tag_counter += 1
+        tag = 'A%d' % self._tag_counter
+        pending = _PendingCommand(tag, name, asyncio.get_running_loop().create_future(), sink)
+        self._pending.append(pending)
+        self.stats['commands'] += 1
+        self.stats['max_in_flight'] = max(self.stats['max_in_flight'], len(self._pending))
+        line = ' '.join((tag, name) + tuple(args)) + '\r\n'
+        self._writer.write(line.encode('utf-8'))
+        await self._writer.drain()
+        typ, data = await pending.future
+        if typ != 'OK':
+            raise AsyncImapError('%s command error: %s %s' % (name, typ, data[0].decode('utf-8', 'replace')))
+        return typ, data, pending.untagged
+
+    async def _read_loop(self):
+        """按顺序读取并分发服务器响应"""
+        try:
+            while True:
+                line = await self._readline()
+                if line.startswith(b'* '):
+                    await self._handle_untagged(line)
+                elif line.startswith(b'+'):
+                    # 本客户端不发送字面量，忽略继续请求
+                    continue
+                else:
+                    self._handle_tagged(line)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._closed_error = e
+            self._fail_pending(e if isinstance(e, AsyncImapAbort) else AsyncImapAbort(str(e)))
+
+    async def _readline(self) -> bytes:
+        """读取一行，去掉行尾的 CRLF"""
+        try:
+            line = await self._reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as e:
+            raise AsyncImapAbort('socket error: EOF') from e
+        except asyncio.LimitOverrunError as e:
+            raise AsyncImapAbort('got more than %d bytes' % self.MAX_LINE) from e
+        self.stats['bytes_received'] += len(line)
+        return line.rstrip(b'\r\n')
+
+    async def _handle_untagged(self, line: bytes):
+        """解析一条未经请求的响应（可能含多个字面量），记入最早未完成的命令"""
+        match = self._UNTAGGED_RE.match(line)
+        if not match:
+            return
+        typ = match.group('type').decode('ascii')
+        data = match.group('data') or b''
+        if match.group('num'):
+            data = match.group('num') + (b' ' + data if data else b'')
+        target = self._pending[0] if self._pending else None
+        items = []
+        while True:
+            literal = self._LITERAL_RE.search(data)
+            if not literal:
+                break
+            size = int(literal.group(1))
+            if target is not None and target.sink is not None:
+                await self._stream_literal(data, size, target.sink)
+                items.append((data, None))
+            else:
+                items.append((data, await self._read_exact(size)))
+            data = await self._readline()
+        items.append(data)
+
+        if typ in ('OK', 'NO', 'BAD'):
+            code = self._CODE_RE.match(data)
+            if code and target is not None:
+                target.untagged.setdefault(code.group('type').decode('ascii'), []).append(code.group('data'))
+        if target is not None:
+            target.untagged.setdefault(typ, []).extend(items)
+
+    async def _read_exact(self, size: int) -> bytes:
+        try:
+            data = await self._reader.readexactly(size)
+        except asyncio.IncompleteReadError as e:
+            raise AsyncImapAbort('socket error: EOF') from e
+        self.stats['bytes_received'] += size
+        return data
+
+    async def _stream_literal(self, prefix: bytes, size: int, sink: LiteralSink):
+        """按块读取字面量并交给回调"""
+        remaining = size
+        while remaining > 0:
+            chunk = await self._reader.read(min(remaining, self.CHUNK_SIZE))
+            if not chunk:
+                raise AsyncImapAbort('socket error: EOF')
+            remaining -= len(chunk)
+            self.stats['bytes_received'] += len(chunk)
+            sink(prefix, chunk)
+
+    def _handle_tagged(self, line: bytes):
+        """处理完成响应，完成对应的命令"""
+        match = self._TAGGED_RE.match(line)
+        if not match:
+            raise AsyncImapAbort('unexpected response: %r' % line[:100])
+        tag = match.group('tag').decode('ascii')
+        if not self._pending or self._pending[0].tag != tag:
+            raise AsyncImapAbort('unexpected tagged response: %s' % tag)
+        pending = self._pending.popleft()
+        typ = match.group('type').decode('ascii')
+        data = match.group('data')
+        code = self._CODE_RE.match(data)
+        if code:
+            pending.untagged.setdefault(code.group('type').decode('ascii'), []).append(code.group('data'))
+        if code and code.group('type') == b'CAPABILITY':
+            self._update_capabilities(line)
+        if not pending.future.done():
+            pending.future.set_result((typ, [data]))
+
+    def _update_capabilities(self, line: bytes):
+        """从响应码 [CAPABILITY ...] 更新能力列表"""
+        match = re.search(rb'\[CAPABILITY ([^\]]*)\]', line)
+        if match:
+            self.capabilities = tuple(match.group(1).decode('ascii').upper().split())
+
+    def _fail_pending(self, error: Exception):
+        """让所有未完成的命令收到异常"""
+        while self._pending:
+            pending = self._pending.popleft()
+            if not pending.future.done():
+                pending.future.set_exception(error)
@@ -0,0 +1,298 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from datetime import datetime
+from threading import Lock
+from typing import Dict, Any, Optional, Iterable
+from utils.file_handler import FileHandler
+from utils.log_handler import LogHandler
+
+class AttachmentStore:
+    """按内容寻址的附件存储，相同内容的附件只保存一份
+
+    主要功能：
+    1. 以解码后内容的 SHA-256 为键，将附件保存为 objects/<前两位>/<哈希> 对象文件
+    2. 通过硬链接把对象放入规则的下载目录，文件系统不支持硬链接时回退为复制
+    3. 索引记录每个哈希首次出现的邮件、时间以及已放入的下载目录
+    4. 同一内容已放入过同一下载目录时不再重复放入，文件被下游移走（如归档）后仍然有效，
+       下游不会重复归档和解析；只有文件未被取走就被同名的其他内容覆盖时，之后收到才重新放入
+
+    索引以 JSON 文件保存，写入时先写临时文件再替换，避免中途退出导致文件损坏。
+    """
+
+    def __init__(self, root: str):
+        """初始化附件存储
+
+        Args:
+            root: 存储根目录，需与下载目录位于同一文件系统才能使用硬链接
+        """
+        self.logger = LogHandler().get_logger('AttachmentStore', file_level='DEBUG', console_level='INFO')
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.index_path = os.path.join(root, 'index.json')
+        self._lock = Lock()
+        self._index: Dict[str, Dict[str, Any]] = self._load()
+        # 为False时新放入的附件只更新内存中的索引，由 flush 写入文件（批量补处理时使用）
+        self.autosave = True
+        self._dirty = False
+        self.stats = {'stored': 0, 'linked': 0, 'duplicates': 0, 'bytes_saved': 0}
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """从文件加载索引
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 哈希到索引项的映射，文件不存在或损坏时返回空字典
+        """
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            self.logger.warning("加载附件索引失败，将重新建立: %s", LogHandler.format_error(e))
+            return {}
+
+    def _save(self):
+        """将索引写入文件"""
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            self.logger.error("保存附件索引失败 [%s]: %s", self.index_path, LogHandler.format_error(e))
+
+    def flush(self):
+        """将 autosave 关闭期间的索引变化写入文件"""
+        with self._lock:
+            if self._dirty:
+                self._save()
+                self._dirty = False
+
+    def object_path(self, digest: str) -> str:
+        """返回哈希对应的对象文件路径"""
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def lookup(self, digest: str) -> Optional[Dict[str, Any]]:
+        """查询哈希的索引项
+
+        Args:
+            digest: 附件内容的 SHA-256 十六进制摘要
+
+        Returns:
+            Optional[Dict[str, Any]]: 索引项副本，未保存过时返回None
+        """
+        with self._lock:
+            entry = self._index.get(digest)
+            return dict(entry) if entry else None
+
+    def digest_file(self, filepath: str) -> Optional[str]:
+        """计算文件内容的 SHA-256，供下游判断附件是否已处理过
+
+        Args:
+            filepath: 文件路径
+
+        Returns:
+            Optional[str]: 十六进制摘要，读取失败时返回None
+        """
+        try:
+            sha = hashlib.sha256()
+            with open(filepath, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(block)
+            return sha.hexdigest()
+        except OSError as e:
+            self.logger.error("计算文件哈希失败 [%s]: %s", filepath, LogHandler.format_error(e))
+            return None
+
+    def store_bytes(self, payload: bytes, dest_path: str, meta: Dict[str, Any]) -> Dict[str, Any]:
+        """保存内存中的附件内容并放入下载目录
+
+        Args:
+            payload: 解码后的附件内容
+            dest_path: 下载目录中的目标路径
+            meta: 首次出现时记录的邮件信息（message_id、subject、source 等）
+
+        Returns:
+            Dict[str, Any]: 包含 path、sha256、size 和 duplicate
+
+        Raises:
+            OSError: 文件保存失败时抛出
+        """
+        digest = hashlib.sha256(payload).hexdigest()
+        if not os.path.exists(self.object_path(digest)):
+            tmp_path = self._staging_path()
+            FileHandler.save_file(payload, tmp_path)
+            return self._commit(tmp_path, digest, len(payload), dest_path, meta)
+        return self._commit(None, digest, len(payload), dest_path, meta)
+
+    def store_stream(self, chunks: Iterable[bytes], encoding: str,
+                     dest_path: str, meta: Dict[str, Any]) -> Dict[str, Any]:
+        """边解码边保存分块输入的附件并放入下载目录
+
+        内容先写入存储目录下的临时文件，同时计算哈希，内存占用与分块大小相当。
+
+        Args:
+            chunks: 编码数据分块
+            encoding: 传输编码
+            dest_path: 下载目录中的目标路径
+            meta: 首次出现时记录的邮件信息
+
+        Returns:
+            Dict[str, Any]: 包含 path、sha256、size 和 duplicate，内容为空时 size 为0、path 为None
+
+        Raises:
+            OSError: 文件保存失败时抛出
+            ValueError: 编码数据无法解码时抛出
+        """
+        tmp_path = self._staging_path()
+        sha = hashlib.sha256()
+        try:
+            size = FileHandler.save_stream(chunks, tmp_path, encoding, hasher=sha)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if not size:
+            os.remove(tmp_path)
+            return {'path': None, 'sha256': None, 'size': 0, 'duplicate': False}
+        return self._commit(tmp_path, sha.hexdigest(), size, dest_path, meta)
+
+    def _staging_path(self) -> str:
+        """在存储目录下分配一个临时文件路径，保证与对象文件位于同一文件系统"""
+        staging_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(staging_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=staging_dir, suffix='.part')
+        os.close(fd)
+        return path
+
+    def _commit(self, tmp_path: Optional[str], digest: str, size: int,
+                dest_path: str, meta: Dict[str, Any]) -> Dict[str, Any]:
+        """将临时文件登记为对象，并按需放入下载目录
+
+        Args:
+            tmp_path: 已写好的临时文件，对象已存在时为None或被丢弃
+            digest: 内容哈希
+            size: 内容字节数
+            dest_path: 下载目录中的目标路径
+            meta: 首次出现时记录的邮件信息
+
+        Returns:
+            Dict[str, Any]: 包含 path、sha256、size 和 duplicate
+        """
+        obj_path = self.object_path(digest)
+        dest_dir = os.path.normpath(os.path.dirname(dest_path))
+        with self._lock:
+            new_object = tmp_path is not None and not os.path.exists(obj_path)
+            if new_object:
+                FileHandler.ensure_dir(os.path.dirname(obj_path))
+                os.replace(tmp_path, obj_path)
+                self.stats['stored'] += 1
+            else:
+                if tmp_path is not None:
+                    os.remove(tmp_path)
+                self.stats['bytes_saved'] += size
+
+            entry = self._index.get(digest)
+            if entry is None:
+                entry = self._index[digest] = {
+                    'size': size,
+                    'first_seen': datetime.now().isoformat(timespec='seconds'),
+                    'message_id': meta.get('message_id', ''),
+                    'subject': meta.get('subject', ''),
+                    'source': meta.get('source', ''),
+                    'filename': os.path.basename(dest_path),
+                    'paths': {}
+                }
+
+            # paths 是持久的放入标记：同一内容放入过该下载目录后不再重复放入，
+            # 即使文件已被下游移走；标记只在文件未被取走就被其他内容覆盖时撤销
+            previous = entry['paths'].get(dest_dir)
+            if previous is not None:
+                self.stats['duplicates'] += 1
+                self.logger.info("附件内容已放入过 %s（首次出现于 %s），跳过",
+                                 previous, entry['first_seen'])
+                return {'path': previous, 'sha256': digest, 'size': size, 'duplicate': True}
+
+            self._revoke_overwritten(dest_dir, dest_path)
+            self._place(obj_path, dest_path)
+            entry['paths'][dest_dir] = dest_path
+            if self.autosave:
+                self._save()
+            else:
+                self._dirty = True
+        return {'path': dest_path, 'sha256': digest, 'size': size, 'duplicate': False}
+
+    def _revoke_overwritten(self, dest_dir: str, dest_path: str):
+        """目标文件仍在下载目录时，撤销其内容在该目录的放入标记
+
+        文件还没被下游取走就要被同名的其他内容覆盖，原内容之后再次收到时需要重新放入。
+        调用方需持有锁。
+
+        Args:
+            dest_dir: 规范化的下载目录
+            dest_path: 即将放入的目标路径
+        """
+        if not os.path.exists(dest_path):
+            return
+        for digest, entry in self._index.items():
+            if entry['paths'].get(dest_dir) == dest_path and \
+                    self._holds_object(dest_path, self.object_path(digest), digest):
+                del entry['paths'][dest_dir]
+                self.logger.debug("未被取走的 %s 将被覆盖，撤销其放入标记", dest_path)
+                return
+
+    def _holds_object(self, path: str, obj_path: str, digest: str) -> bool:
+        """判断下载目录中的文件是否仍是对象的内容
+
+        硬链接放入的文件与对象是同一 inode，直接比较；复制放入或 inode 不同时，
+        大小相同才重新计算哈希比较。
+
+        Args:
+            path: 之前放入的文件路径
+            obj_path: 对象文件路径
+            digest: 对象内容的哈希
+
+        Returns:
+            bool: 文件存在且内容与对象相同时返回True
+        """
+        try:
+            placed = os.stat(path)
+            stored = os.stat(obj_path)
+        except OSError:
+            return False
+        if os.path.samestat(placed, stored):
+            return True
+        if placed.st_size != stored.st_size:
+            return False
+        return self.digest_file(path) == digest
+
+    def _place(self, obj_path: str, dest_path: str):
+        """通过硬链接把对象放入下载目录，不支持硬链接时复制
+
+        目标文件已存在时先在同目录创建链接再替换，避免留下不完整的文件。
+        """
+        FileHandler.ensure_dir(os.path.dirname(dest_path))
+        tmp_path = dest_path + '.link'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(obj_path, tmp_path)
+            self.stats['linked'] += 1
+        except OSError as e:
+            self.logger.debug("创建硬链接失败，改为复制 [%s]: %s", dest_path, LogHandler.format_error(e))
+            shutil.copyfile(obj_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """返回存储统计
+
+        Returns:
+            Dict[str, Any]: 包含 objects（索引中的哈希数）、stored（新保存的对象数）、
+                linked（硬链接次数）、duplicates（跳过的重复附件数）和 bytes_saved
+        """
+        with self._lock:
+            return dict(self.stats, objects=len(self._index))
@@ -0,0 +1,229 @@
+import re
+from urllib.parse import unquote_to_bytes
+from typing import List, Dict, Any, Optional
+from utils.email_decoder import EmailDecoder
+
+class BodyStructureParser:
+    """BODYSTRUCTURE 响应解析工具类
+
+    主要功能：
+    1. 将 imaplib 返回的 FETCH 响应（含字面量）解析为嵌套列表
+    2. 从嵌套列表中提取每个叶子段落的段落号、类型、编码、大小和文件名
+    3. 解码 RFC 2047 / RFC 2231 编码的附件文件名
+    """
+
+    _LITERAL_RE = re.compile(rb'\{(\d+)\}\s*$')
+
+    @classmethod
+    def parse_response(cls, data: List[Any]) -> List[Any]:
+        """将 FETCH 响应解析为嵌套列表
+
+        字符串和原子解析为 str，NIL 解析为 None，括号解析为 list。
+
+        Args:
+            data: imaplib fetch 返回的数据列表
+
+        Returns:
+            List[Any]: 顶层元素列表，例如 ['1', ['UID', '5', 'BODYSTRUCTURE', [...]]]
+        """
+        tokens = []
+        for item in data or []:
+            if isinstance(item, tuple):
+                prefix, literal = item[0], item[1]
+                tokens.extend(cls._tokenize(cls._LITERAL_RE.sub(b'', prefix)))
+                tokens.append(('string', literal))
+            elif isinstance(item, bytes):
+                tokens.extend(cls._tokenize(item))
+
+        result, _ = cls._build(tokens, 0)
+        return result
+
+    @classmethod
+    def find_structure(cls, data: List[Any]) -> Optional[List[Any]]:
+        """从 FETCH 响应中取出 BODYSTRUCTURE 部分
+
+        Args:
+            data: imaplib fetch 返回的数据列表
+
+        Returns:
+            Optional[List[Any]]: BODYSTRUCTURE 嵌套列表，不存在时返回None
+        """
+        for element in cls.parse_response(data):
+            if not isinstance(element, list):
+                continue
+            for i, value in enumerate(element[:-1]):
+                if isinstance(value, str) and value.upper() == 'BODYSTRUCTURE':
+                    return element[i + 1]
+        return None
+
+    @classmethod
+    def _tokenize(cls, text: bytes) -> List[Any]:
+        """将响应文本切分为 (类型, 值) 形式的词法单元"""
+        tokens = []
+        i, length = 0, len(text)
+        while i < length:
+            ch = text[i:i + 1]
+            if ch in (b' ', b'\r', b'\n'):
+                i += 1
+            elif ch in (b'(', b')'):
+                tokens.append((ch.decode(), None))
+                i += 1
+            elif ch == b'"':
+                i += 1
+                value = bytearray()
+                while i < length and text[i:i + 1] != b'"':
+                    if text[i:i + 1] == b'\\' and i + 1 < length:
+                        i += 1
+                    value += text[i:i + 1]
+                    i += 1
+                tokens.append(('string', bytes(value)))
+                i += 1
+            else:
+                start = i
+                while i < length and text[i:i + 1] not in (b' ', b'(', b')', b'\r', b'\n', b'"'):
+                    i += 1
+                tokens.append(('atom', text[start:i]))
+        return tokens
+
+    @classmethod
+    def _build(cls, tokens: List[Any], pos: int):
+        """根据词法单元构造嵌套列表"""
+        result = []
+        while pos < len(tokens):
+            kind, value = tokens[pos]
+            pos += 1
+            if kind == '(':
+                child, pos = cls._build(tokens, pos)
+                result.append(child)
+            elif kind == ')':
+                return result, pos
+            elif kind == 'atom' and value.upper() == b'NIL':
+                result.append(None)
+            else:
+                result.append(cls._to_str(value))
+        return result, pos
+
+    @staticmethod
+    def _to_str(value: bytes) -> str:
+        try:
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            return value.decode('gbk', errors='replace')
+
+    @classmethod
+    def iter_parts(cls, structure: List[Any], prefix: str = '') -> List[Dict[str, Any]]:
+        """列出 BODYSTRUCTURE 中的所有叶子段落
+
+        Args:
+            structure: find_structure 返回的嵌套列表
+            prefix: 段落号前缀（用于递归）
+
+        Returns:
+            List[Dict[str, Any]]: 每个叶子段落一个字典，包含：
+                - section: 段落号，如 "2" 或 "1.3"
+                - type / subtype: 小写的 MIME 类型
+                - encoding: 小写的传输编码
+                - size: 编码后的字节数
+                - disposition: 小写的 Content-Disposition 类型，没有时为 None
+                - filename: 解码后的文件名，没有时为空字符串
+        """
+        if not structure:
+            return []
+
+        # 多段落：前若干个元素为子段落列表
+        if isinstance(structure[0], list):
+            parts = []
+            index = 0
+            for child in structure:
+                if not isinstance(child, list):
+                    break
+                index += 1
+                section = f"{prefix}.{index}" if prefix else str(index)
+                parts.extend(cls.iter_parts(child, section) if child and isinstance(child[0], list)
+                             else cls._leaf_parts(child, section))
+            return parts
+
+        return cls._leaf_parts(structure, prefix or '1')
+
+    @classmethod
+    def _leaf_parts(cls, body: List[Any], section: str) -> List[Dict[str, Any]]:
+        """解析单个非多段落的 body，message/rfc822 会继续展开内部结构"""
+        body_type = (body[0] or '').lower()
+        subtype = (body[1] or '').lower() if len(body) > 1 else ''
+
+        if body_type == 'message' and subtype == 'rfc822' and len(body) > 8 \
+                and isinstance(body[8], list):
+            inner = body[8]
+            if inner and isinstance(inner[0], list):
+                return cls.iter_parts(inner, section)
+            return cls._leaf_parts(inner, f"{section}.1")
+
+        params = cls._param_dict(body[2] if len(body) > 2 else None)
+        # 扩展数据中 Content-Disposition 的位置取决于类型
+        if body_type == 'text':
+            disposition_index = 9
+        elif body_type == 'message' and subtype == 'rfc822':
+            disposition_index = 11
+        else:
+            disposition_index = 8
+
+        disposition, disposition_params = None, {}
+        if len(body) > disposition_index and isinstance(body[disposition_index], list):
+            value = body[disposition_index]
+            disposition = (value[0] or '').lower() if value else None
+            disposition_params = cls._param_dict(value[1] if len(value) > 1 else None)
+
+        filename = cls._filename(disposition_params) or cls._filename(params, 'name')
+
+        try:
+            size = int(body[6]) if len(body) > 6 and body[6] is not None else 0
+        except (TypeError, ValueError):
+            size = 0
+
+        return [{
+            'section': section,
+            'type': body_type,
+            'subtype': subtype,
+            'encoding': (body[5] or '7bit').lower() if len(body) > 5 else '7bit',
+            'size': size,
+            'disposition': disposition,
+            'filename': filename
+        }]
+
+    @staticmethod
+    def _param_dict(values: Optional[List[Any]]) -> Dict[str, str]:
+        """将 ("KEY" "VALUE" ...) 形式的参数列表转换为小写键的字典"""
+        if not isinstance(values, list):
+            return {}
+        return {str(values[i]).lower(): values[i + 1] or ''
+                for i in range(0, len(values) - 1, 2)}
+
+    @classmethod
+    def _filename(cls, params: Dict[str, str], key: str = 'filename') -> str:
+        """从参数中提取文件名，支持 RFC 2231 续行和编码"""
+        if params.get(key):
+            return EmailDecoder.decode_filename(params[key])
+
+        # RFC 2231: filename*=charset''value 或 filename*0*=...; filename*1*=...
+        segments = []
+        for name, value in params.items():
+            match = re.match(r'^%s\*(\d*)(\*?)$' % key, name)
+            if match:
+                segments.append((int(match.group(1) or 0), bool(match.group(2)) or
+                                 not match.group(1), value))
+        if not segments:
+            return ''
+
+        segments.sort()
+        charset = 'utf-8'
+        result = b''
+        for index, encoded, value in segments:
+            if encoded and index == 0 and value.count("'") >= 2:
+                charset, _, value = value.split("'", 2)
+                charset = charset or 'utf-8'
+            result += unquote_to_bytes(value) if encoded \
+                else value.encode('latin-1', errors='replace')
+        try:
+            return result.decode(charset)
+        except (LookupError, UnicodeDecodeError):
+            return EmailDecoder.decode_filename(result)
@@ -1,99 +1,268 @@
+import codecs
 import email
+from collections import OrderedDict
 from email.header import decode_header
-from typing import Optional, Union
+from email.utils import parseaddr
+from functools import lru_cache
+from threading import Lock
+from typing import Optional, Union, Tuple, Dict, Any
 from utils.log_handler import LogHandler
 
 class EmailDecoder:
     """邮件解码工具类，用于处理邮件编码相关的问题
-    
+
     主要功能：
     1. 解码邮件主题、发件人、收件人等字符串
     2. 解码附件文件名
     3. 支持多种字符编码（utf-8, gbk, gb2312, iso-8859-1）
     4. 自动处理编码错误和替换字符
+    5. 不含编码字（=?charset?...?=）的字符串直接返回，解码结果按 LRU 缓存
+    6. 按发件人记住实际使用的字符集，未声明字符集的内容优先尝试该字符集（单字节兜底编码除外）
     """
-    
+
     logger = LogHandler().get_logger('EmailDecoder', file_level='DEBUG', console_level='WARNING')
-    
+
+    # 未声明字符集时依次尝试的编码
+    FALLBACK_CHARSETS = ('utf-8', 'gbk', 'gb2312', 'iso-8859-1')
+    # 字节串文件名依次尝试的编码，均失败时使用替换字符
+    FILENAME_CHARSETS = ('utf-8', 'gbk')
+    # 能“成功”解码任意字节的单字节兜底编码（codecs 规范名），不按发件人记住，也不提前尝试
+    CATCH_ALL_CHARSETS = frozenset(('iso8859-1', 'iso8859-15', 'cp1252', 'cp437', 'cp850', 'mac-roman'))
+    # 解码结果缓存的条目数
+    CACHE_SIZE = 4096
+    # 记住字符集的发件人数
+    SENDER_LIMIT = 1024
+
+    _sender_charsets: 'OrderedDict[str, str]' = OrderedDict()
+    _sender_lock = Lock()
+
     @classmethod
-    def decode_str(cls, text: Optional[str]) -> str:
+    def decode_str(cls, text: Optional[str], sender: Optional[str] = None) -> str:
         """解码邮件字符串
-        
+
         支持多种编码格式的自动识别和转换，包括：
         - UTF-8
         - GBK
         - GB2312
         - ISO-8859-1
-        
+
         Args:
             text: 需要解码的文本，可以是None
-            
+            sender: 发件人（From 头），用于记住和优先尝试该发件人使用的字符集
+
         Returns:
             str: 解码后的文本，如果输入为None则返回空字符串
         """
         if not text:
             return ''
-            
+        if isinstance(text, str) and '=?' not in text:
+            return text
+
+        key = cls._sender_key(str(sender)) if sender else ''
+        preferred = cls._sender_charsets.get(key) if key else None
+        if isinstance(text, str):
+            decoded, charset = cls._decode_cached(text, preferred)
+        else:
+            # 含 8 位原始字节的邮件头为 Header 对象，不可哈希，只缓存其中各段字节的解码结果
+            decoded, charset = cls._decode(text, preferred)
+        if key and charset:
+            cls._remember(key, charset)
+        return decoded
+
+    @classmethod
+    def _decode(cls, text: Any, preferred: Optional[str]) -> Tuple[str, Optional[str]]:
+        """解码邮件字符串
+
+        Args:
+            text: 字符串或 Header 对象
+            preferred: 未声明字符集时优先尝试的字符集
+
+        Returns:
+            Tuple[str, Optional[str]]: 解码后的文本，以及非 ASCII 内容实际使用的字符集
+        """
         try:
             decoded_list = decode_header(text)
             result = []
-            
+            used = None
+
             for content, charset in decoded_list:
                 if isinstance(content, bytes):
                     try:
                         # 尝试使用指定的字符集解码
-                        if charset:
-                            decoded = content.decode(charset)
+                        if charset and charset != 'unknown-8bit':
+                            try:
+                                decoded = content.decode(charset)
+                                if not content.isascii():
+                                    used = charset.lower()
+                            except (LookupError, UnicodeDecodeError):
+                                cls.logger.debug("声明的字符集 %s 无法解码，改为自动识别: %s", charset, content)
+                                decoded, guessed = cls._guess_cached(content, preferred, cls.FALLBACK_CHARSETS)
+                                used = used or guessed
                         else:
-                            # 如果没有指定字符集，尝试常用编码
-                            for encoding in ['utf-8', 'gbk', 'gb2312', 'iso-8859-1']:
-                                try:
-                                    decoded = content.decode(encoding)
-                                    break
-                                except UnicodeDecodeError:
-                                    continue
-                            else:
-                                # 如果所有编码都失败，使用 errors='replace'
-                                decoded = content.decode('utf-8', errors='replace')
-                                cls.logger.warning("无法确定编码，使用替换字符: %s", content)
+                            # 如果没有指定字符集（或为原始 8 位字节），尝试常用编码
+                            decoded, guessed = cls._guess_cached(content, preferred, cls.FALLBACK_CHARSETS)
+                            used = used or guessed
                     except Exception as e:
                         cls.logger.error("解码失败 [%s]: %s", content, LogHandler.format_error(e))
                         decoded = str(content)
                 else:
                     decoded = str(content)
-                    
+
                 result.append(decoded)
-                
-            return ''.join(result)
-            
+
+            return ''.join(result), used
+
         except Exception as e:
             cls.logger.error("字符串解码失败 [%s]: %s", text, LogHandler.format_error(e))
-            return str(text)
-    
+            return str(text), None
+
+    @classmethod
+    def _guess(cls, content: bytes, preferred: Optional[str],
+               charsets: Tuple[str, ...]) -> Tuple[str, Optional[str]]:
+        """按候选编码解码未声明字符集的字节串
+
+        UTF-8 始终最先尝试：它的校验严格，而 GBK 等编码能“成功”解码大部分 UTF-8 字节序列，
+        先尝试它们会得到乱码。发件人记住的字符集排在 UTF-8 之后、其余候选之前；
+        记住的若是 ISO-8859-1 等单字节兜底编码则忽略，否则它会抢在 GBK 之前解码出乱码。
+
+        Args:
+            content: 字节串
+            preferred: 优先尝试的字符集
+            charsets: 候选编码，均失败时使用 UTF-8 替换字符
+
+        Returns:
+            Tuple[str, Optional[str]]: 解码后的文本，以及非 ASCII 内容使用的字符集
+        """
+        if content.isascii():
+            return content.decode('ascii'), None
+        candidates = charsets
+        if preferred and preferred != charsets[0] and not cls.is_catch_all(preferred):
+            candidates = charsets[:1] + (preferred,) + tuple(c for c in charsets[1:] if c != preferred)
+        for encoding in candidates:
+            try:
+                return content.decode(encoding), encoding
+            except (LookupError, UnicodeDecodeError):
+                continue
+        # 如果所有编码都失败，使用 errors='replace'
+        cls.logger.warning("无法确定编码，使用替换字符: %s", content)
+        return content.decode('utf-8', errors='replace'), None
+
+    @staticmethod
+    @lru_cache(maxsize=CACHE_SIZE)
+    def _decode_cached(text: str, preferred: Optional[str]) -> Tuple[str, Optional[str]]:
+        return EmailDecoder._decode(text, preferred)
+
+    @staticmethod
+    @lru_cache(maxsize=CACHE_SIZE)
+    def _guess_cached(content: bytes, preferred: Optional[str],
+                      charsets: Tuple[str, ...]) -> Tuple[str, Optional[str]]:
+        return EmailDecoder._guess(content, preferred, charsets)
+
+    @staticmethod
+    @lru_cache(maxsize=SENDER_LIMIT)
+    def _sender_key(sender: str) -> str:
+        """返回发件人的小写邮箱地址"""
+        return parseaddr(sender)[1].lower()
+
+    @classmethod
+    def sender_charset(cls, sender: Optional[str]) -> Optional[str]:
+        """返回记住的发件人字符集
+
+        Args:
+            sender: 发件人（From 头），可以是None
+
+        Returns:
+            Optional[str]: 该发件人最近使用的字符集，没有记录时返回None
+        """
+        key = cls._sender_key(str(sender)) if sender else ''
+        return cls._sender_charsets.get(key) if key else None
+
+    @classmethod
+    def remember_charset(cls, sender: Optional[str], charset: Optional[str]):
+        """记住发件人使用的字符集，超过 SENDER_LIMIT 时淘汰记录最早的发件人
+
+        Args:
+            sender: 发件人（From 头）
+            charset: 字符集，为None时不记录
+        """
+        key = cls._sender_key(str(sender)) if sender and charset else ''
+        if key:
+            cls._remember(key, charset)
+
     @classmethod
-    def decode_filename(cls, filename: Optional[Union[str, bytes]]) -> str:
+    def is_catch_all(cls, charset: str) -> bool:
+        """判断字符集是否为能解码任意字节的单字节兜底编码
+
+        Args:
+            charset: 字符集名称，如 latin-1、ISO-8859-1、windows-1252
+
+        Returns:
+            bool: 是兜底编码时返回True，未知字符集返回False
+        """
+        try:
+            return codecs.lookup(charset).name in cls.CATCH_ALL_CHARSETS
+        except LookupError:
+            return False
+
+    @classmethod
+    def _remember(cls, key: str, charset: str):
+        # 兜底编码解码成功不代表发件人实际使用它，记住后会让之后的 GBK 内容解码成乱码
+        if cls._sender_charsets.get(key) == charset or cls.is_catch_all(charset):
+            return
+        with cls._sender_lock:
+            cls._sender_charsets[key] = charset
+            cls._sender_charsets.move_to_end(key)
+            while len(cls._sender_charsets) > cls.SENDER_LIMIT:
+                cls._sender_charsets.popitem(last=False)
+
+    @classmethod
+    def cache_info(cls) -> Dict[str, Any]:
+        """返回缓存统计
+
+        Returns:
+            Dict[str, Any]: 包含 headers、bytes（命中、未命中和条目数）和 senders（记住字符集的发件人数）
+        """
+        def info(cached) -> Dict[str, int]:
+            stats = cached.cache_info()
+            return {'hits': stats.hits, 'misses': stats.misses, 'size': stats.currsize}
+
+        return {
+            'headers': info(cls._decode_cached),
+            'bytes': info(cls._guess_cached),
+            'senders': len(cls._sender_charsets)
+        }
+
+    @classmethod
+    def cache_clear(cls):
+        """清空解码缓存和发件人字符集记录"""
+        cls._decode_cached.cache_clear()
+        cls._guess_cached.cache_clear()
+        with cls._sender_lock:
+            cls._sender_charsets.clear()
+
+    @classmethod
+    def decode_filename(cls, filename: Optional[Union[str, bytes]], sender: Optional[str] = None) -> str:
         """解码附件文件名
-        
+
         支持对字节串和字符串两种格式的文件名进行解码。
-        优先使用UTF-8编码，如果失败则尝试GBK编码。
-        
+        优先使用UTF-8编码，其次是发件人记住的字符集，再次是GBK编码。
+
         Args:
             filename: 需要解码的文件名，可以是字节串或字符串
-            
+            sender: 发件人（From 头），用于记住和优先尝试该发件人使用的字符集
+
         Returns:
             str: 解码后的文件名，如果输入为None则返回空字符串
         """
         if not filename:
             return ''
-            
+
         if isinstance(filename, bytes):
-            try:
-                return filename.decode()
-            except UnicodeDecodeError:
-                try:
-                    return filename.decode('gbk')
-                except UnicodeDecodeError:
-                    cls.logger.warning("文件名解码失败，使用替换字符: %s", filename)
-                    return filename.decode('utf-8', errors='replace')
-                    
-        return cls.decode_str(filename) 
\ No newline at end of file
+            key = cls._sender_key(str(sender)) if sender else ''
+            preferred = cls._sender_charsets.get(key) if key else None
+            decoded, charset = cls._guess_cached(filename, preferred, cls.FILENAME_CHARSETS)
+            if key and charset:
+                cls._remember(key, charset)
+            return decoded
+
+        return cls.decode_str(filename, sender)
@@ -1,7 +1,8 @@
 import os
 from datetime import datetime
-from typing import Union, BinaryIO
+from typing import Union, BinaryIO, Iterable, Optional, Any
 from utils.log_handler import LogHandler
+from utils.stream_decoder import StreamDecoder
 
 class FileHandler:
     """文件处理工具类，用于处理文件相关操作
@@ -97,6 +98,58 @@ class FileHandler:
             cls.logger.error("保存文件失败 [%s]: %s", filepath, LogHandler.format_error(e))
             raise
     
+    @classmethod
+    def save_stream(cls, chunks: Iterable[bytes], filepath: str, encoding: str = 'binary',
+                    hasher: Optional[Any] = None) -> int:
+        """边解码边保存分块输入的内容
+        
+        每块编码数据解码后立即写入与目标同目录的 .part 临时文件，
+        全部写完后再替换为目标文件，内存占用与分块大小相当，
+        中途失败不会留下不完整的目标文件。
+        
+        Args:
+            chunks: 编码数据分块
+            filepath: 保存的目标路径
+            encoding: 传输编码（base64、quoted-printable 等）
+            hasher: hashlib 哈希对象，提供时用解码后的内容更新
+            
+        Returns:
+            int: 解码后的文件大小（字节）
+            
+        Raises:
+            OSError: 文件保存失败时抛出
+            ValueError: 编码数据无法解码时抛出
+        """
+        tmp_path = filepath + '.part'
+        try:
+            # 确保目录存在
+            cls.ensure_dir(os.path.dirname(filepath))
+            
+            decoder = StreamDecoder(encoding)
+            file_size = 0
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    data = decoder.feed(chunk)
+                    f.write(data)
+                    file_size += len(data)
+                    if hasher is not None:
+                        hasher.update(data)
+                data = decoder.flush()
+                f.write(data)
+                file_size += len(data)
+                if hasher is not None:
+                    hasher.update(data)
+            
+            os.replace(tmp_path, filepath)
+            cls.logger.debug("已保存文件 [%s] - 大小: %d 字节", filepath, file_size)
+            return file_size
+            
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            cls.logger.error("保存文件失败 [%s]: %s", filepath, LogHandler.format_error(e))
+            raise
+    
     @classmethod
     def get_file_size(cls, filepath: str) -> int:
         """获取文件大小
@@ -0,0 +1,130 @@
+import zlib
+import imaplib
+from typing import Dict, Optional
+from utils.tls_sessions import TlsSessionCache, TlsResumeMixin
+
+class CompressMixin:
+    """IMAP COMPRESS=DEFLATE（RFC 4978）支持
+
+    与 imaplib.IMAP4 / IMAP4_SSL 组合使用。协商成功后，发送的数据经 raw deflate 压缩，
+    接收的数据直接从套接字读取并解压，不再经过 imaplib 的缓冲文件。
+
+    compress_stats 记录压缩前（raw_*）和线路上（wire_*）的收发字节数，
+    未启用压缩时两者相同；可替换为外部字典以便跨连接累计。
+    """
+
+    CAPABILITY = 'COMPRESS=DEFLATE'
+
+    def open(self, *args, **kwargs):
+        self.compressed = False
+        self._deflater = None
+        self._inflater = None
+        self._rbuf = b''
+        if not hasattr(self, 'compress_stats'):
+            self.compress_stats = self.new_stats()
+        super().open(*args, **kwargs)
+
+    @staticmethod
+    def new_stats() -> Dict[str, int]:
+        """返回清零的字节计数"""
+        return {'raw_sent': 0, 'wire_sent': 0, 'raw_received': 0, 'wire_received': 0}
+
+    def refresh_capabilities(self):
+        """登录后更新能力列表
+
+        优先使用 LOGIN 完成响应中的 [CAPABILITY ...]，没有时发送 CAPABILITY 命令。
+        """
+        _, data = self.response('CAPABILITY')
+        if not data or data[-1] is None:
+            _, data = self.capability()
+        if data and data[-1]:
+            self.capabilities = tuple(data[-1].decode('ascii', errors='replace').upper().split())
+
+    def enable_compression(self, level: int = zlib.Z_DEFAULT_COMPRESSION) -> bool:
+        """协商并启用 DEFLATE 压缩
+
+        Args:
+            level: zlib 压缩级别
+
+        Returns:
+            bool: 已启用返回True，服务器不支持或拒绝时返回False
+        """
+        if self.compressed:
+            return True
+        if self.CAPABILITY not in self.capabilities:
+            return False
+        typ, _ = self.xatom('COMPRESS', 'DEFLATE')
+        if typ != 'OK':
+            return False
+        self._deflater = zlib.compressobj(level, zlib.DEFLATED, -15)
+        self._inflater = zlib.decompressobj(-15)
+        self._rbuf = b''
+        self.compressed = True
+        return True
+
+    def send(self, data):
+        self.compress_stats['raw_sent'] += len(data)
+        if self.compressed:
+            data = self._deflater.compress(data) + self._deflater.flush(zlib.Z_SYNC_FLUSH)
+        self.compress_stats['wire_sent'] += len(data)
+        super().send(data)
+
+    def _fill(self):
+        """从套接字读取一块压缩数据并解压到缓冲区"""
+        data = self.sock.recv(65536)
+        if not data:
+            raise self.abort('socket error: EOF')
+        self.compress_stats['wire_received'] += len(data)
+        self._rbuf += self._inflater.decompress(data)
+
+    def read(self, size):
+        if not self.compressed:
+            data = super().read(size)
+            self.compress_stats['raw_received'] += len(data)
+            self.compress_stats['wire_received'] += len(data)
+            return data
+        while len(self._rbuf) < size:
+            self._fill()
+        data, self._rbuf = self._rbuf[:size], self._rbuf[size:]
+        self.compress_stats['raw_received'] += len(data)
+        return data
+
+    def readline(self):
+        if not self.compressed:
+            line = super().readline()
+            self.compress_stats['raw_received'] += len(line)
+            self.compress_stats['wire_received'] += len(line)
+            return line
+        while True:
+            pos = self._rbuf.find(b'\n')
+            if pos >= 0:
+                break
+            if len(self._rbuf) > imaplib._MAXLINE:
+                raise self.error("got more than %d bytes" % imaplib._MAXLINE)
+            self._fill()
+        line, self._rbuf = self._rbuf[:pos + 1], self._rbuf[pos + 1:]
+        self.compress_stats['raw_received'] += len(line)
+        return line
+
+
+class IMAP4Compress(CompressMixin, imaplib.IMAP4):
+    """支持 COMPRESS=DEFLATE 的 IMAP4 连接"""
+
+
+class IMAP4_SSLCompress(CompressMixin, TlsResumeMixin, imaplib.IMAP4_SSL):
+    """支持 COMPRESS=DEFLATE 和 TLS 会话复用的 IMAP4_SSL 连接"""
+
+    def __init__(self, host: str = '', port: int = imaplib.IMAP4_SSL_PORT,
+                 tls_sessions: Optional[TlsSessionCache] = None, **kwargs):
+        """初始化并建立连接
+
+        Args:
+            host: 服务器地址
+            port: 服务器端口
+            tls_sessions: TLS 会话缓存，提供时使用其 SSL 上下文并复用会话
+            **kwargs: 传给 imaplib.IMAP4_SSL 的其他参数
+        """
+        self.tls_sessions = tls_sessions
+        if tls_sessions is not None:
+            kwargs.setdefault('ssl_context', tls_sessions.context)
+        super().__init__(host, port, **kwargs)
@@ -0,0 +1,231 @@
+import re
+import base64
+from datetime import date
+from typing import Iterable, Iterator, List, Dict, Any, Optional, Union
+
+class ImapHelper:
+    """IMAP协议辅助工具类
+
+    主要功能：
+    1. 生成压缩的序号/UID集合（如 1:5,7,9:12）
+    2. 对序号列表进行分批
+    3. 解析 imaplib 返回的 FETCH、ESEARCH 响应
+    4. 生成 SEARCH 命令使用的日期格式
+    5. 将文件夹名称编码为修改版 UTF-7（RFC 3501 5.1.3）
+    """
+
+    _FETCH_SEQ_RE = re.compile(rb'^\s*(\d+)\s+\(')
+    _UID_RE = re.compile(rb'\bUID\s+(\d+)', re.IGNORECASE)
+    _ESEARCH_ITEM_RE = re.compile(rb'\b(MIN|MAX|COUNT|ALL)\s+([0-9:,]+)', re.IGNORECASE)
+    _MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+               'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+    @staticmethod
+    def build_sequence_set(ids: Iterable[Union[bytes, str, int]]) -> str:
+        """将序号或UID列表压缩为IMAP集合字符串
+
+        连续的编号会合并为区间，例如 [1, 2, 3, 5] -> "1:3,5"。
+
+        Args:
+            ids: 序号或UID列表
+
+        Returns:
+            str: IMAP集合字符串，列表为空时返回空字符串
+        """
+        numbers = sorted({int(i) for i in ids})
+        if not numbers:
+            return ''
+
+        ranges = []
+        start = prev = numbers[0]
+        for num in numbers[1:]:
+            if num == prev + 1:
+                prev = num
+                continue
+            ranges.append(f"{start}:{prev}" if start != prev else str(start))
+            start = prev = num
+        ranges.append(f"{start}:{prev}" if start != prev else str(start))
+        return ','.join(ranges)
+
+    @staticmethod
+    def expand_sequence_set(sequence_set: Union[bytes, str]) -> List[bytes]:
+        """将IMAP集合字符串展开为编号列表
+
+        例如 "1:3,5" -> [b'1', b'2', b'3', b'5']，不支持 "*"。
+
+        Args:
+            sequence_set: IMAP集合字符串
+
+        Returns:
+            List[bytes]: 展开后的编号列表
+        """
+        if isinstance(sequence_set, bytes):
+            sequence_set = sequence_set.decode('ascii')
+
+        result = []
+        for part in sequence_set.strip().split(','):
+            if not part:
+                continue
+            if ':' in part:
+                start, end = sorted(int(x) for x in part.split(':', 1))
+                result.extend(str(i).encode() for i in range(start, end + 1))
+            else:
+                result.append(part.encode())
+        return result
+
+    @classmethod
+    def format_date(cls, day: date) -> str:
+        """生成 SEARCH SINCE/BEFORE 使用的日期字符串
+
+        不依赖系统区域设置，例如 date(2025, 1, 7) -> "7-Jan-2025"。
+
+        Args:
+            day: 日期
+
+        Returns:
+            str: IMAP日期字符串
+        """
+        return f"{day.day}-{cls._MONTHS[day.month - 1]}-{day.year}"
+
+    @staticmethod
+    def encode_mailbox(name: str) -> str:
+        """将文件夹名称编码为 SELECT 等命令可用的参数
+
+        非 ASCII 字符使用修改版 UTF-7 编码，含空格或引号时加引号，
+        例如 "供应商" -> "&T5telFVG-"。
+
+        Args:
+            name: 文件夹名称
+
+        Returns:
+            str: 编码后的文件夹参数
+        """
+        result, pending = [], []
+
+        def flush():
+            if pending:
+                encoded = base64.b64encode(''.join(pending).encode('utf-16-be'))
+                result.append('&' + encoded.decode('ascii').rstrip('=').replace('/', ',') + '-')
+                pending.clear()
+
+        for ch in name:
+            if 0x20 <= ord(ch) <= 0x7e:
+                flush()
+                result.append('&-' if ch == '&' else ch)
+            else:
+                pending.append(ch)
+        flush()
+
+        encoded = ''.join(result)
+        if any(ch in encoded for ch in ' "\\(){%*'):
+            encoded = '"%s"' % encoded.replace('\\', '\\\\').replace('"', '\\"')
+        return encoded
+
+    @classmethod
+    def parse_uid(cls, meta: bytes) -> Optional[bytes]:
+        """从 FETCH 响应属性中提取UID
+
+        Args:
+            meta: parse_fetch_response 返回的 meta 字段
+
+        Returns:
+            Optional[bytes]: UID，不存在时返回None
+        """
+        match = cls._UID_RE.search(meta or b'')
+        return match.group(1) if match else None
+
+    @classmethod
+    def parse_esearch(cls, data: List[Any]) -> Dict[str, Any]:
+        """解析 ESEARCH 响应（RFC 4731）
+
+        例如 '(TAG "A3") UID MIN 4 MAX 90 COUNT 3 ALL 4,7:8'。
+
+        Args:
+            data: imaplib 返回的 ESEARCH 响应数据
+
+        Returns:
+            Dict[str, Any]: 包含 min/max/count（int 或 None）和 all（bytes 列表）
+        """
+        result = {'min': None, 'max': None, 'count': None, 'all': []}
+        for item in data or []:
+            if not isinstance(item, bytes):
+                continue
+            for key, value in cls._ESEARCH_ITEM_RE.findall(item):
+                key = key.decode().lower()
+                if key == 'all':
+                    result['all'].extend(cls.expand_sequence_set(value))
+                else:
+                    result[key] = int(value)
+        if result['count'] is None:
+            result['count'] = len(result['all'])
+        return result
+
+    @staticmethod
+    def chunked(items: List[Any], size: int) -> Iterator[List[Any]]:
+        """按固定大小对列表分批
+
+        Args:
+            items: 待分批的列表
+            size: 每批数量，小于等于0时不分批
+
+        Returns:
+            Iterator[List[Any]]: 分批后的列表迭代器
+        """
+        if size <= 0:
+            if items:
+                yield items
+            return
+        for i in range(0, len(items), size):
+            yield items[i:i + size]
+
+    @classmethod
+    def parse_fetch_response(cls, data: List[Any]) -> List[Dict[str, Any]]:
+        """解析 imaplib FETCH 命令的返回数据
+
+        imaplib 对带字面量的响应返回 (前缀, 内容) 元组，其后紧跟一个以 ")"
+        结尾的字节串（可能带有 UID、FLAGS 等附加属性）。
+
+        Args:
+            data: imaplib fetch 返回的数据列表
+
+        Returns:
+            List[Dict[str, Any]]: 每封邮件一个字典，包含：
+                - seq: 邮件序号（bytes）
+                - meta: 响应中除字面量外的属性文本（bytes）
+                - literal: 第一个字面量内容（bytes），无字面量时为 None
+                - literals: 所有 (前缀, 字面量) 元组，用于一次取多个段落
+        """
+        results = []
+        current = None
+
+        for item in data or []:
+            if isinstance(item, tuple):
+                prefix = item[0] if isinstance(item[0], bytes) else str(item[0]).encode()
+                match = cls._FETCH_SEQ_RE.match(prefix)
+                if match or current is None:
+                    current = {
+                        'seq': match.group(1) if match else b'',
+                        'meta': prefix,
+                        'literal': item[1],
+                        'literals': [(prefix, item[1])]
+                    }
+                    results.append(current)
+                else:
+                    # 同一封邮件的第二个字面量，附加到已有记录
+                    current['meta'] += b' ' + prefix
+                    current['literals'].append((prefix, item[1]))
+                continue
+
+            if not isinstance(item, bytes):
+                continue
+
+            match = cls._FETCH_SEQ_RE.match(item)
+            if match:
+                # 不含字面量的响应，如 "1 (UID 5 FLAGS (\\Seen))"
+                current = {'seq': match.group(1), 'meta': item, 'literal': None, 'literals': []}
+                results.append(current)
+            elif current is not None:
+                # 字面量之后的剩余部分
+                current['meta'] += item
+
+        return results
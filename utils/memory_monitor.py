@@ -0,0 +1,91 @@
+import os
+import sys
+import threading
+from typing import Optional
+
+class MemoryMonitor:
+    """进程内存（RSS）监控工具
+
+    作为上下文管理器使用时，在后台线程中定期采样当前 RSS，
+    退出时得到该代码块执行期间的峰值 RSS。RSS 是整个进程的，
+    代码块执行期间其他线程的内存占用也计算在内，应包住一整批工作而不是其中的单个任务。
+
+    用法：
+        with MemoryMonitor() as monitor:
+            download_batch()
+        print(monitor.peak_rss, monitor.peak_delta)
+    """
+
+    def __init__(self, interval: float = 0.05):
+        """初始化监控器
+
+        Args:
+            interval: 采样间隔秒数
+        """
+        self.interval = interval
+        self.start_rss = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def peak_delta(self) -> int:
+        """代码块执行期间峰值 RSS 相对开始时的增量（字节）"""
+        return max(self.peak_rss - self.start_rss, 0)
+
+    def __enter__(self) -> 'MemoryMonitor':
+        self.start_rss = self.peak_rss = self.current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.peak_rss = max(self.peak_rss, self.current_rss())
+        return False
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self.current_rss())
+
+    @staticmethod
+    def current_rss() -> int:
+        """获取当前进程的 RSS（字节），无法获取时返回0"""
+        try:
+            if sys.platform == 'win32':
+                import ctypes
+                from ctypes import wintypes
+
+                class ProcessMemoryCounters(ctypes.Structure):
+                    _fields_ = [
+                        ('cb', wintypes.DWORD),
+                        ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t),
+                        ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t),
+                        ('PeakPagefileUsage', ctypes.c_size_t),
+                    ]
+
+                counters = ProcessMemoryCounters()
+                counters.cb = ctypes.sizeof(counters)
+                handle = ctypes.windll.kernel32.GetCurrentProcess()
+                if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                    return counters.WorkingSetSize
+                return 0
+
+            if os.path.exists('/proc/self/statm'):
+                with open('/proc/self/statm') as f:
+                    return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+            import resource
+            # macOS 上 ru_maxrss 单位为字节，只能得到历史峰值
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        except Exception:
+            return 0
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import hashlib
+from typing import Dict, Any, Iterator
+from utils.log_handler import LogHandler
+
+class PartialDownload:
+    """一个附件段落的断点下载文件
+
+    编码后的段落内容按获取顺序追加到 <键>.partial 文件，每段写入并同步到磁盘后
+    才更新检查点 <键>.json 中的 offset，检查点记录的偏移之前的内容都已可靠保存。
+    """
+
+    def __init__(self, data_path: str, checkpoint_path: str, meta: Dict[str, Any], offset: int = 0):
+        """初始化断点下载文件
+
+        Args:
+            data_path: 段落内容文件路径（.partial）
+            checkpoint_path: 检查点文件路径
+            meta: 段落信息（邮件、段落号、声明大小等），写入检查点
+            offset: 已提交的字节数
+        """
+        self.data_path = data_path
+        self.checkpoint_path = checkpoint_path
+        self.meta = meta
+        self.offset = offset
+
+    @property
+    def size(self) -> int:
+        """BODYSTRUCTURE 中声明的段落大小（编码后字节数）"""
+        return self.meta['size']
+
+    def append(self, chunk: bytes):
+        """追加一段内容并提交检查点
+
+        Args:
+            chunk: 从 offset 处开始的段落内容
+        """
+        with open(self.data_path, 'ab') as f:
+            f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        self.offset += len(chunk)
+        self._save_checkpoint()
+
+    def _save_checkpoint(self):
+        """先写临时文件再替换，避免中途退出导致检查点损坏"""
+        state = dict(self.meta, offset=self.offset, updated=time.time())
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[bytes]:
+        """按块读取已下载的段落内容
+
+        Args:
+            chunk_size: 每块字节数
+
+        Returns:
+            Iterator[bytes]: 段落内容分块，只读取到 offset 为止
+        """
+        remaining = self.offset
+        with open(self.data_path, 'rb') as f:
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+    def discard(self):
+        """删除段落内容文件和检查点"""
+        for path in (self.data_path, self.checkpoint_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class PartialDownloadStore:
+    """大附件断点续传的段落文件存储
+
+    主要功能：
+    1. 按邮件来源、UID、Message-ID、段落号和声明大小确定段落的键，同一段落重新下载时找到之前的进度
+    2. 打开段落时按检查点截断内容文件，丢弃检查点之后未提交的内容，从检查点的偏移继续获取
+    3. 清理超过 max_age 秒未更新的段落文件（邮件已删除或规则已修改，不会再继续下载）
+    """
+
+    def __init__(self, directory: str, max_age: float = 7 * 86400):
+        """初始化段落文件存储
+
+        Args:
+            directory: 段落内容和检查点所在目录
+            max_age: 段落文件保留的秒数，超过时在初始化时删除
+        """
+        self.logger = LogHandler().get_logger('PartialDownloadStore', file_level='DEBUG', console_level='INFO')
+        self.directory = directory
+        self.max_age = max_age
+        self.purge_stale()
+
+    @staticmethod
+    def part_key(source: str, uid: bytes, message_id: str, section: str, size: int) -> str:
+        """返回段落的键"""
+        text = '\x00'.join((source, uid.decode() if isinstance(uid, bytes) else str(uid),
+                            message_id, section, str(size)))
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def open(self, email_msg, part: Dict[str, Any]) -> PartialDownload:
+        """打开段落的断点下载文件，有有效检查点时从其偏移继续
+
+        Args:
+            email_msg: 邮件对象
+            part: BodyStructureParser 返回的段落信息，需包含 section、size、filename 和 encoding
+
+        Returns:
+            PartialDownload: 断点下载文件，offset 为已提交的字节数
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        key = self.part_key(email_msg.source, email_msg.uid, email_msg.message_id,
+                            part['section'], part['size'])
+        meta = {'source': email_msg.source, 'uid': email_msg.uid.decode(),
+                'message_id': email_msg.message_id, 'section': part['section'],
+                'size': part['size'], 'filename': part['filename'], 'encoding': part['encoding']}
+        download = PartialDownload(os.path.join(self.directory, key + '.partial'),
+                                   os.path.join(self.directory, key + '.json'), meta)
+
+        checkpoint = self._load_checkpoint(download.checkpoint_path)
+        offset = checkpoint.get('offset', 0) if checkpoint.get('size') == part['size'] else 0
+        data_size = os.path.getsize(download.data_path) if os.path.exists(download.data_path) else 0
+        if offset > data_size:
+            self.logger.warning("段落文件短于检查点，重新下载: %s", part['filename'])
+            offset = 0
+        # 丢弃检查点之后未提交的内容
+        with open(download.data_path, 'ab') as f:
+            f.truncate(offset)
+        download.offset = offset
+        return download
+
+    def _load_checkpoint(self, path: str) -> Dict[str, Any]:
+        """读取检查点，文件不存在或损坏时返回空字典"""
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            self.logger.warning("读取下载检查点失败，重新下载: %s", LogHandler.format_error(e))
+            return {}
+
+    def purge_stale(self):
+        """删除超过 max_age 秒未更新的段落文件和检查点"""
+        if not os.path.isdir(self.directory):
+            return
+        cutoff = time.time() - self.max_age
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    self.logger.debug("已删除过期的段落文件: %s", name)
+            except OSError:
+                continue
@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from threading import Lock
+from typing import List, Dict, Any, Optional, Iterable
+from utils.log_handler import LogHandler
+
+class ProcessedLedger:
+    """已处理邮件台账，持久化记录下载完成的邮件
+
+    每封邮件以 Message-ID 为键（没有 Message-ID 时使用日期、发件人、收件人和主题的哈希），
+    同时记录附件内容的组合哈希（payload_hash）、匹配的规则和保存的文件。
+    台账保存在 SQLite 数据库中，启动时将全部键载入内存集合，查询不访问磁盘；
+    每条记录写入后立即提交，重启后仍然有效：
+    下载完成后、设置处理标志前程序中断时，下次运行不会再次下载这封邮件。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS processed (
+            key TEXT PRIMARY KEY,
+            message_id TEXT NOT NULL,
+            payload_hash TEXT NOT NULL,
+            subject TEXT,
+            source TEXT,
+            rule TEXT,
+            files TEXT,
+            processed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_processed_payload ON processed (payload_hash);
+    """
+
+    def __init__(self, path: str):
+        """初始化台账
+
+        Args:
+            path: SQLite 数据库文件路径
+        """
+        self.logger = LogHandler().get_logger('ProcessedLedger', file_level='DEBUG', console_level='INFO')
+        self.path = path
+        self._lock = Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(self._SCHEMA)
+        self._conn.commit()
+        self._keys = {row[0] for row in self._conn.execute('SELECT key FROM processed')}
+
+    @staticmethod
+    def message_key(email_msg) -> str:
+        """返回邮件在台账中的键
+
+        Args:
+            email_msg: 邮件对象
+
+        Returns:
+            str: Message-ID；没有 Message-ID 时为 "sha256:" 加邮件头字段的哈希
+        """
+        message_id = (email_msg.message_id or '').strip()
+        if message_id:
+            return message_id
+        fields = '\n'.join((email_msg.date or '', email_msg.sender or '',
+                            email_msg.to or '', email_msg.subject or ''))
+        return 'sha256:' + hashlib.sha256(fields.encode('utf-8', errors='replace')).hexdigest()
+
+    @staticmethod
+    def payload_hash(digests: Iterable[str]) -> str:
+        """将各附件内容的 SHA-256 组合为一个与附件顺序和重复无关的哈希"""
+        return hashlib.sha256('\n'.join(sorted(set(digests))).encode('ascii')).hexdigest()
+
+    def contains(self, key: str) -> bool:
+        """检查邮件是否已处理
+
+        Args:
+            key: message_key 返回的键
+
+        Returns:
+            bool: 已处理返回True
+        """
+        return key in self._keys
+
+    def find_payload(self, payload_hash: str) -> Optional[Dict[str, Any]]:
+        """查询附件内容相同的已处理邮件
+
+        Args:
+            payload_hash: payload_hash 返回的组合哈希
+
+        Returns:
+            Optional[Dict[str, Any]]: 最早处理的记录，不存在时返回None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT key, subject, source, processed_at FROM processed '
+                'WHERE payload_hash = ? ORDER BY processed_at LIMIT 1', (payload_hash,)).fetchone()
+        if row is None:
+            return None
+        return {'key': row[0], 'subject': row[1], 'source': row[2], 'processed_at': row[3]}
+
+    def record(self, email_msg, rule_name: str, files: List[str], digests: Iterable[str]):
+        """记录处理完成的邮件，写入后立即提交
+
+        Args:
+            email_msg: 邮件对象
+            rule_name: 匹配的规则名称
+            files: 保存的附件路径
+            digests: 各附件内容的 SHA-256
+        """
+        row = (self.message_key(email_msg), (email_msg.message_id or '').strip(),
+               self.payload_hash(digests), email_msg.subject, email_msg.source,
+               rule_name, json.dumps(files, ensure_ascii=False), time.time())
+        try:
+            with self._lock:
+                self._conn.execute('INSERT OR REPLACE INTO processed VALUES (?, ?, ?, ?, ?, ?, ?, ?)', row)
+                self._conn.commit()
+                self._keys.add(row[0])
+        except sqlite3.Error as e:
+            self.logger.error("写入处理台账失败 [%s]: %s", email_msg.subject, LogHandler.format_error(e))
+
+    def count(self) -> int:
+        """返回台账中的记录数"""
+        return len(self._keys)
+
+    def clear(self):
+        """清空台账"""
+        with self._lock:
+            self._conn.execute('DELETE FROM processed')
+            self._conn.commit()
+            self._keys.clear()
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
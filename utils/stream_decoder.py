@@ -0,0 +1,81 @@
+import base64
+import binascii
+import quopri
+
+class StreamDecoder:
+    """传输编码的增量解码器
+
+    按任意大小的分块输入 base64 或 quoted-printable 编码的数据，
+    每次只解码已完整的部分，其余保留到下一块，内存占用与分块大小相当。
+    其他编码（7bit、8bit、binary）原样输出。
+    base64 数据无法解码时抛出 ValueError，不输出被截断的内容。
+    """
+
+    _WHITESPACE = b' \t\r\n'
+
+    def __init__(self, encoding: str = '7bit'):
+        """初始化解码器
+
+        Args:
+            encoding: 传输编码，不区分大小写
+        """
+        self.encoding = (encoding or '7bit').lower()
+        self.pending = b''
+
+    def feed(self, data: bytes) -> bytes:
+        """输入一块编码数据
+
+        Args:
+            data: 编码数据
+
+        Returns:
+            bytes: 本块可以解码出的内容
+
+        Raises:
+            ValueError: base64 数据无法解码时抛出
+        """
+        if self.encoding == 'base64':
+            data = self.pending + data.translate(None, self._WHITESPACE)
+            usable = len(data) - len(data) % 4
+            self.pending = data[usable:]
+            return self._b64decode(data[:usable])
+
+        if self.encoding == 'quoted-printable':
+            data = self.pending + data
+            # 只解码完整的行，软换行 "=\r\n" 不会被拆开
+            end = data.rfind(b'\n') + 1
+            self.pending = data[end:]
+            return quopri.decodestring(data[:end]) if end else b''
+
+        return data
+
+    def flush(self) -> bytes:
+        """输出剩余内容
+
+        Returns:
+            bytes: 剩余可解码的内容
+
+        Raises:
+            ValueError: base64 数据无法解码时抛出
+        """
+        pending, self.pending = self.pending, b''
+        if not pending:
+            return b''
+        if self.encoding == 'base64':
+            return self._b64decode(pending + b'=' * (-len(pending) % 4))
+        if self.encoding == 'quoted-printable':
+            return quopri.decodestring(pending)
+        return pending
+
+    @staticmethod
+    def _b64decode(data: bytes) -> bytes:
+        if not data:
+            return b''
+        try:
+            return base64.b64decode(data)
+        except binascii.Error:
+            # 与 email 模块一致，容忍不规范的填充
+            try:
+                return binascii.a2b_base64(data + b'==')
+            except binascii.Error as e:
+                raise ValueError("无效的 base64 数据: %s" % e) from e
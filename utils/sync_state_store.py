@@ -0,0 +1,185 @@
+import os
+import json
+import sqlite3
+from threading import Lock
+from typing import List, Dict, Any
+from utils.imap_helper import ImapHelper
+from utils.log_handler import LogHandler
+
+class SyncStateStore:
+    """邮箱同步状态存储，负责持久化每个文件夹的同步水位和邮件头缓存
+
+    每个文件夹保存：
+    1. uidvalidity: 文件夹的 UIDVALIDITY
+    2. uidnext: 上次同步时的 UIDNEXT
+    3. highestmodseq: 上次同步时的 HIGHESTMODSEQ（服务器不支持 CONDSTORE 时为 None）
+    4. criteria: 上次同步使用的 SEARCH 条件
+    5. unread: 上次同步得到的候选邮件UID列表
+
+    状态以 JSON 文件保存，写入时先写临时文件再替换，避免中途退出导致文件损坏。
+    邮件头缓存（UID -> 邮件头字段）单独保存在 SQLite 数据库中，按UID读写，
+    不随状态文件整体重写，也不需要一次载入内存。
+    """
+
+    # 每条 SQL 语句中的UID数，低于 SQLite 的参数个数上限
+    _SQL_BATCH = 500
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS headers (
+            folder TEXT NOT NULL,
+            uid INTEGER NOT NULL,
+            fields TEXT NOT NULL,
+            PRIMARY KEY (folder, uid)
+        );
+    """
+
+    def __init__(self, path: str, header_path: str):
+        """初始化状态存储
+
+        Args:
+            path: 状态文件路径
+            header_path: 邮件头缓存的 SQLite 数据库文件路径
+        """
+        self.logger = LogHandler().get_logger('SyncStateStore', file_level='DEBUG', console_level='INFO')
+        self.path = path
+        self.header_path = header_path
+        self._lock = Lock()
+        self._state: Dict[str, Dict[str, Any]] = self._load()
+        directory = os.path.dirname(header_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(header_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(self._SCHEMA)
+        self._conn.commit()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """从文件加载状态
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 文件夹键到状态的映射，文件不存在或损坏时返回空字典
+        """
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            self.logger.warning("加载同步状态失败，将重新同步: %s", LogHandler.format_error(e))
+            return {}
+
+    def get(self, key: str) -> Dict[str, Any]:
+        """获取文件夹状态
+
+        Args:
+            key: 文件夹键，通常为 "账号/文件夹"
+
+        Returns:
+            Dict[str, Any]: 文件夹状态副本，不存在时返回空字典
+        """
+        with self._lock:
+            return dict(self._state.get(key, {}))
+
+    def put(self, key: str, state: Dict[str, Any]):
+        """更新文件夹状态并写入文件
+
+        Args:
+            key: 文件夹键
+            state: 文件夹状态
+        """
+        with self._lock:
+            self._state[key] = state
+            self._save()
+
+    def reset(self, key: str):
+        """清除文件夹状态和邮件头缓存
+
+        Args:
+            key: 文件夹键
+        """
+        with self._lock:
+            if self._state.pop(key, None) is not None:
+                self._save()
+        self.clear_headers(key)
+
+    def get_headers(self, key: str, uids: List[bytes]) -> Dict[bytes, Dict[str, Any]]:
+        """读取邮件头缓存
+
+        Args:
+            key: 文件夹键
+            uids: 邮件UID列表
+
+        Returns:
+            Dict[bytes, Dict[str, Any]]: 已缓存的 UID -> 邮件头字段
+        """
+        headers: Dict[bytes, Dict[str, Any]] = {}
+        try:
+            with self._lock:
+                for chunk in ImapHelper.chunked(uids, self._SQL_BATCH):
+                    rows = self._conn.execute(
+                        'SELECT uid, fields FROM headers WHERE folder = ? AND uid IN (%s)'
+                        % ','.join('?' * len(chunk)), [key] + [int(uid) for uid in chunk])
+                    for uid, fields in rows:
+                        headers[str(uid).encode()] = json.loads(fields)
+        except sqlite3.Error as e:
+            self.logger.error("读取邮件头缓存失败: %s", LogHandler.format_error(e))
+        return headers
+
+    def put_headers(self, key: str, headers: Dict[bytes, Dict[str, Any]]):
+        """写入邮件头缓存
+
+        Args:
+            key: 文件夹键
+            headers: UID -> 邮件头字段，字段值需可序列化为 JSON
+        """
+        rows = [(key, int(uid), json.dumps(fields, ensure_ascii=False)) for uid, fields in headers.items()]
+        try:
+            with self._lock:
+                self._conn.executemany('INSERT OR REPLACE INTO headers VALUES (?, ?, ?)', rows)
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self.logger.error("写入邮件头缓存失败: %s", LogHandler.format_error(e))
+
+    def prune_headers(self, key: str, uids: List[bytes]):
+        """只保留指定邮件的邮件头缓存，已读或已删除的邮件随之清除
+
+        Args:
+            key: 文件夹键
+            uids: 需要保留的邮件UID
+        """
+        keep = {int(uid) for uid in uids}
+        try:
+            with self._lock:
+                stale = [(key, uid) for (uid,) in self._conn.execute(
+                    'SELECT uid FROM headers WHERE folder = ?', (key,)) if uid not in keep]
+                if stale:
+                    self._conn.executemany('DELETE FROM headers WHERE folder = ? AND uid = ?', stale)
+                    self._conn.commit()
+        except sqlite3.Error as e:
+            self.logger.error("清理邮件头缓存失败: %s", LogHandler.format_error(e))
+
+    def clear_headers(self, key: str):
+        """清除文件夹的全部邮件头缓存
+
+        Args:
+            key: 文件夹键
+        """
+        try:
+            with self._lock:
+                self._conn.execute('DELETE FROM headers WHERE folder = ?', (key,))
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self.logger.error("清除邮件头缓存失败: %s", LogHandler.format_error(e))
+
+    def _save(self):
+        """将全部状态写入文件"""
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self.logger.error("保存同步状态失败 [%s]: %s", self.path, LogHandler.format_error(e))
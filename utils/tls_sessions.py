@@ -0,0 +1,146 @@
+import ssl
+import time
+import imaplib
+from threading import Lock
+from typing import Dict, Any, Optional, Tuple
+
+class TlsSessionCache:
+    """共享的 SSL 上下文和 TLS 会话缓存
+
+    主要功能：
+    1. 所有 IMAP 连接使用同一个 SSLContext（与 imaplib.IMAP4_SSL 的默认设置一致），
+       TLS 会话只能在创建它的上下文中复用
+    2. 按服务器地址和端口保存最近一次连接的 TLS 会话（会话 ID 或会话票据），
+       重连时提交给服务器，服务器接受时跳过证书交换和密钥协商（简短握手）
+    3. 统计握手次数、复用成功（命中）和完整握手（未命中）次数以及握手耗时
+
+    TLS 1.3 的会话票据在握手完成后才由服务器发送，需在读到服务器问候后调用 remember 保存。
+    同一进程中的邮件服务默认共用 shared() 返回的实例。
+    """
+
+    _shared: Optional['TlsSessionCache'] = None
+    _shared_lock = Lock()
+
+    def __init__(self, context: Optional[ssl.SSLContext] = None, resume: bool = True):
+        """初始化会话缓存
+
+        Args:
+            context: SSL 上下文，未提供时使用与 imaplib.IMAP4_SSL 相同的默认设置
+            resume: 是否复用 TLS 会话，为False时只共享上下文和统计握手
+        """
+        self.context = context or ssl._create_stdlib_context()
+        self.resume = resume
+        self._sessions: Dict[Tuple[str, int], ssl.SSLSession] = {}
+        self._lock = Lock()
+        self.stats = {'handshakes': 0, 'resumed': 0, 'full': 0,
+                      'resumed_seconds': 0.0, 'full_seconds': 0.0, 'last_seconds': 0.0}
+
+    @classmethod
+    def shared(cls, resume: bool = True) -> 'TlsSessionCache':
+        """返回进程内共用的会话缓存
+
+        Args:
+            resume: 首次调用创建实例时使用的 resume 设置
+
+        Returns:
+            TlsSessionCache: 共用的会话缓存
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(resume=resume)
+            return cls._shared
+
+    def wrap(self, sock, host: str, port: int) -> ssl.SSLSocket:
+        """完成 TLS 握手，有保存的会话时请求复用
+
+        Args:
+            sock: 已连接的 TCP 套接字
+            host: 服务器地址，用于 SNI 和会话查找
+            port: 服务器端口
+
+        Returns:
+            ssl.SSLSocket: 握手完成的套接字
+        """
+        with self._lock:
+            session = self._sessions.get((host, port)) if self.resume else None
+        start = time.perf_counter()
+        try:
+            ssl_sock = self.context.wrap_socket(sock, server_hostname=host, session=session)
+        except ssl.SSLError:
+            if session is None:
+                raise
+            # 保存的会话无法使用时丢弃，下次连接做完整握手
+            self.forget(host, port)
+            raise
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            reused = ssl_sock.session_reused
+            kind = 'resumed' if reused else 'full'
+            self.stats['handshakes'] += 1
+            self.stats[kind] += 1
+            self.stats[kind + '_seconds'] += elapsed
+            self.stats['last_seconds'] = elapsed
+        self.remember(ssl_sock, host, port)
+        return ssl_sock
+
+    def remember(self, ssl_sock, host: str, port: int):
+        """保存连接当前的 TLS 会话，供下次连接复用
+
+        Args:
+            ssl_sock: TLS 套接字，不是 TLS 连接时忽略
+            host: 服务器地址
+            port: 服务器端口
+        """
+        session = getattr(ssl_sock, 'session', None)
+        if session is None or not self.resume:
+            return
+        with self._lock:
+            self._sessions[(host, port)] = session
+
+    def forget(self, host: str, port: int):
+        """丢弃服务器的已保存会话"""
+        with self._lock:
+            self._sessions.pop((host, port), None)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """返回握手统计
+
+        Returns:
+            Dict[str, Any]: 包含 handshakes、resumed（命中）、full（未命中）、
+                resumed_ms 和 full_ms（平均握手毫秒数）以及 last_ms
+        """
+        with self._lock:
+            stats = dict(self.stats)
+
+        def average(kind: str) -> Optional[float]:
+            return round(stats[kind + '_seconds'] / stats[kind] * 1000, 2) if stats[kind] else None
+
+        return {
+            'handshakes': stats['handshakes'],
+            'resumed': stats['resumed'],
+            'full': stats['full'],
+            'resumed_ms': average('resumed'),
+            'full_ms': average('full'),
+            'last_ms': round(stats['last_seconds'] * 1000, 2)
+        }
+
+
+class TlsResumeMixin:
+    """与 imaplib.IMAP4_SSL 组合使用，通过 TlsSessionCache 建立 TLS 连接
+
+    tls_sessions 需在调用 IMAP4_SSL.__init__ 之前设置（构造时即建立连接）。
+    """
+
+    tls_sessions: Optional[TlsSessionCache] = None
+
+    def _create_socket(self, timeout):
+        if self.tls_sessions is None:
+            return super()._create_socket(timeout)
+        sock = imaplib.IMAP4._create_socket(self, timeout)
+        return self.tls_sessions.wrap(sock, self.host, self.port)
+
+    def remember_tls_session(self):
+        """读到服务器响应后保存 TLS 会话（TLS 1.3 的会话票据此时才到达）"""
+        if self.tls_sessions is not None:
+            self.tls_sessions.remember(self.sock, self.host, self.port)